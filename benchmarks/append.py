@@ -0,0 +1,67 @@
+from argparse import ArgumentParser
+from random import randint
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from core.binary import BinaryStorage
+from core.model import SSHData
+from core.sqlite import SQLiteStorage
+from core.storage import JsonStorage, LogStorage, StorageBackend
+
+
+def generate_history(size: int, start: int = 1704038400) -> list[SSHData]:
+    data: list[SSHData] = []
+    timestamp = start
+    for i in range(size):
+        timestamp += randint(3600, 16 * 3600)
+        data.append(SSHData(
+            type="WAKE_UP" if i % 2 == 0 else "SLEEP",
+            month=1 + i // 60,
+            day=1 + i // 2 % 30,
+            timestamp=timestamp,
+        ))
+    return data
+
+
+def time_appends(storage: StorageBackend, data: list[SSHData], rounds: int) -> float:
+    storage.write(0, data)
+    storage.read(0)
+    history = list(data)
+    elapsed = 0.0
+    for i in range(rounds):
+        history.append(SSHData(
+            type="WAKE_UP" if len(history) % 2 == 0 else "SLEEP",
+            timestamp=history[-1].timestamp + 3600,
+        ))
+        start = perf_counter()
+        storage.append(0, history)
+        elapsed += perf_counter() - start
+    return elapsed / rounds
+
+
+def main():
+    parser = ArgumentParser(description="Per-append cost against history length.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    backends = {
+        "json": JsonStorage,
+        "jsonl": LogStorage,
+        "sqlite": SQLiteStorage,
+        "binary": BinaryStorage,
+    }
+    print(f"{'records':>10}" + "".join(f"{name + ' (us)':>14}" for name in backends))
+    for size in args.sizes:
+        data = generate_history(size)
+        costs: list[float] = []
+        for backend in backends.values():
+            with TemporaryDirectory() as data_dir:
+                storage = backend(data_dir)
+                costs.append(time_appends(storage, data, args.rounds))
+                storage.close()
+        print(f"{size:>10}" + "".join(f"{cost * 1e6:>14.1f}" for cost in costs))
+
+
+if __name__ == "__main__":
+    main()
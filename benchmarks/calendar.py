@@ -0,0 +1,32 @@
+from argparse import ArgumentParser
+from random import randrange
+from time import perf_counter
+
+from core.calendar import from_ordinal, next_day, to_ordinal
+
+
+def main():
+    parser = ArgumentParser(description="Ordinal <-> (month, day) conversion throughput.")
+    parser.add_argument("--count", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    ordinals = [randrange(0, 10 ** 12) for _ in range(args.count)]
+    begin = perf_counter()
+    dates = list(map(from_ordinal, ordinals))
+    forward = perf_counter() - begin
+    begin = perf_counter()
+    back = [to_ordinal(month, day) for month, day in dates]
+    backward = perf_counter() - begin
+    assert back == ordinals
+
+    month, day = 1, 1
+    for ordinal in range(100_000):
+        assert (month, day) == from_ordinal(ordinal)
+        month, day = next_day(month, day)
+
+    print(f"from_ordinal: {args.count / forward:,.0f} conversions/s")
+    print(f"to_ordinal:   {args.count / backward:,.0f} conversions/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from argparse import ArgumentParser
+from orjson import dumps, loads
+
+from gc import collect
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+
+from core.history import SSHHistory, to_dicts
+from core.model import SSHData
+
+from .append import generate_history
+
+
+def measure(load, raw: bytes) -> tuple[float, int]:
+    collect()
+    start()
+    begin = perf_counter()
+    result = load(raw)
+    elapsed = perf_counter() - begin
+    memory = get_traced_memory()[0]
+    stop()
+    del result
+    return elapsed, memory
+
+
+def main():
+    parser = ArgumentParser(description="SSHHistory against list[SSHData]: load time and memory.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'records':>10} {'list (ms)':>12} {'history (ms)':>14} {'list (KiB)':>12} {'history (KiB)':>15}")
+    for size in args.sizes:
+        raw = dumps(to_dicts(generate_history(size)))
+        list_time, list_memory = measure(
+            lambda r: list(map(lambda d: SSHData(**d), loads(r))),
+            raw
+        )
+        history_time, history_memory = measure(
+            lambda r: SSHHistory.from_dicts(loads(r)),
+            raw
+        )
+        print(
+            f"{size:>10} {list_time * 1e3:>12.2f} {history_time * 1e3:>14.2f}"
+            f" {list_memory / 1024:>12.1f} {history_memory / 1024:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
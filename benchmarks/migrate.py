@@ -0,0 +1,59 @@
+from argparse import ArgumentParser
+from os import makedirs
+from os.path import join
+from random import choice, randint
+from tempfile import TemporaryDirectory
+
+from core.legacy import NAME_DIR, NAME_LIST, write_legacy
+from core.storage import get_storage
+from tools.migrate import migrate
+
+
+def main():
+    parser = ArgumentParser(description="Time the legacy migration on a synthetic corpus.")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=500)
+    parser.add_argument("--storage", default="json", choices=["json", "jsonl", "sqlite", "binary"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as root:
+        legacy_dir = join(root, "legacy")
+        makedirs(join(legacy_dir, NAME_DIR))
+        names = [f"user{i}" for i in range(args.users)]
+        for name in names:
+            awake = [randint(10 * 3600, 20 * 3600) for _ in range(randint(1, args.days * 2))]
+            write_legacy(legacy_dir, name, awake, choice((True, False)))
+        with open(join(legacy_dir, NAME_LIST), "w", encoding="utf-8") as f:
+            f.writelines(name + "\n" for name in names)
+        mapping = {name: 10 ** 17 + i for i, name in enumerate(names)}
+
+        for workers in args.workers:
+            data_dir = join(root, f"data-{workers}")
+            makedirs(data_dir)
+            storage = get_storage(args.storage, data_dir)
+            result = migrate(
+                legacy_dir,
+                storage,
+                mapping,
+                join(data_dir, "migrate.checkpoint"),
+                workers=workers,
+                progress=False,
+            )
+            # A second run finds everything in the checkpoint and does nothing.
+            assert migrate(
+                legacy_dir,
+                storage,
+                mapping,
+                join(data_dir, "migrate.checkpoint"),
+                progress=False,
+            )["users"] == 0
+            storage.close()
+            print(
+                f"{workers} workers: {result['users']} users, {result['records']} records, "
+                f"{result['seconds']:.2f}s, {result['records_per_second']:.0f} records/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from argparse import ArgumentParser
+from random import choice, randint, random
+from time import perf_counter
+
+from core.calendar import YEAR_STARTS, YEARS
+from core.history import SSHHistory
+from core.model import SSHData
+from core.rebuild import bulk_rebuild, rebuild, rebuild_history
+
+
+def random_history(size: int) -> SSHHistory:
+    history = SSHHistory()
+    timestamp = YEAR_STARTS[0] - randint(0, 10 ** 6)
+    for _ in range(size):
+        # Mostly increasing, with the occasional out-of-order entry.
+        timestamp += randint(600, 20 * 3600) if random() > 0.02 else -randint(0, 20 * 3600)
+        history.append(SSHData(
+            type=choice(("WAKE_UP", "SLEEP")),
+            year=choice(YEARS[:2]),
+            timestamp=timestamp,
+        ))
+    return history
+
+
+def reference(history: SSHHistory) -> SSHHistory:
+    return SSHHistory(rebuild(history.to_list()))
+
+
+def main():
+    # tests/test_rebuild.py checks the variants give the same result.
+    parser = ArgumentParser(description="Time the rebuild variants against the reference.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--max-size", type=int, default=3000)
+    args = parser.parse_args()
+
+    histories = [random_history(randint(0, args.max_size)) for _ in range(args.users)]
+    records = sum(map(len, histories))
+
+    begin = perf_counter()
+    expected = list(map(reference, histories))
+    reference_time = perf_counter() - begin
+
+    begin = perf_counter()
+    sequential = list(map(lambda h: h.copy(), histories))
+    for history in sequential:
+        rebuild_history(history)
+    sequential_time = perf_counter() - begin
+
+    bulk = list(map(lambda h: h.copy(), histories))
+    begin = perf_counter()
+    bulk_rebuild(bulk)
+    bulk_time = perf_counter() - begin
+
+    # Resume from a checkpoint taken part way through, then append the rest.
+    appended = 0
+    begin = perf_counter()
+    for history in expected:
+        if len(history) < 2:
+            continue
+        cut = randint(1, len(history) - 1)
+        partial = history[:cut]
+        resume = rebuild_history(partial)
+        partial.extend(history[cut:])
+        appended += len(history) - cut
+        rebuild_history(partial, resume)
+    incremental_time = perf_counter() - begin
+
+    print(f"{args.users} users, {records} records, {appended} appended")
+    print(f"reference:   {reference_time:.3f}s")
+    print(f"sequential:  {sequential_time:.3f}s")
+    print(f"bulk:        {bulk_time:.3f}s")
+    print(f"incremental: {incremental_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
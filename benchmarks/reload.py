@@ -0,0 +1,72 @@
+from orjson import dumps
+
+from argparse import ArgumentParser
+from os import chdir, getcwd
+from os.path import join
+from sys import modules
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from benchmarks.suite import fake_context
+
+
+def first_command(bot, user_id: int) -> float:
+    ssh = modules["cogs.ssh"]
+    ctx = fake_context(user_id)
+
+    async def command():
+        data = await ssh.read_user_data(ctx)
+        await ssh.read_stats(user_id, data)
+    begin = perf_counter()
+    bot.loop.run_until_complete(command())
+    return perf_counter() - begin
+
+
+def main():
+    parser = ArgumentParser(description="First-command latency after reloading cogs.ssh, with and without the state handoff.")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--storage", default="json", choices=["json", "jsonl", "sqlite", "binary"])
+    args = parser.parse_args()
+
+    cwd = getcwd()
+    with TemporaryDirectory() as root:
+        with open(join(root, "config.json"), "wb") as f:
+            f.write(dumps({"token": "", "data_dir": join(root, "data"), "storage": args.storage}))
+        chdir(root)
+        try:
+            from discord import Bot
+
+            from benchmarks.append import generate_history
+            from cogs.lazy import reload_extension
+            from core.history import SSHHistory
+
+            bot = Bot()
+            bot.load_extension("cogs.ssh")
+            ssh = modules["cogs.ssh"]
+            user_id = 1
+            bot.loop.run_until_complete(
+                ssh.write_user_data(fake_context(user_id), SSHHistory(generate_history(args.size)))
+            )
+            warm = first_command(bot, user_id)
+
+            bot.loop.run_until_complete(reload_extension(bot, "cogs.ssh"))
+            handed = first_command(bot, user_id)
+
+            # A plain unload hands nothing over.
+            cog = bot.get_cog("SleepSleepHistory")
+            bot.unload_extension("cogs.ssh")
+            bot.loop.run_until_complete(cog.shutdown())
+            bot.load_extension("cogs.ssh")
+            cold = first_command(bot, user_id)
+            modules["cogs.ssh"].storage.close()
+        finally:
+            chdir(cwd)
+
+    print(f"{args.storage}, {args.size} records")
+    print(f"before reload:        {warm * 1000:.2f} ms")
+    print(f"reload with handoff:  {handed * 1000:.2f} ms")
+    print(f"reload without:       {cold * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+from orjson import dumps, OPT_INDENT_2
+
+from argparse import ArgumentParser
+from asyncio import new_event_loop
+from os import chdir, getcwd, makedirs
+from os.path import abspath, dirname, join
+from platform import python_version
+from subprocess import PIPE, run as run_process
+from sys import path, stdout
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from tracemalloc import get_traced_memory, reset_peak, start, stop
+from types import SimpleNamespace
+from typing import Any, Callable
+
+ROOT = dirname(dirname(abspath(__file__)))
+path.insert(0, ROOT)
+
+
+def fake_context(user_id: int) -> Any:
+    return SimpleNamespace(author=SimpleNamespace(id=user_id))
+
+
+def git_commit() -> str:
+    result = run_process(["git", "rev-parse", "HEAD"], cwd=ROOT, stdout=PIPE, stderr=PIPE)
+    return result.stdout.decode().strip()
+
+
+def measure(func: Callable[[], Any], min_time: float = 0.2, max_ops: int = 100000) -> dict:
+    ops = 0
+    begin = perf_counter()
+    while ops < max_ops and (ops == 0 or perf_counter() - begin < min_time):
+        func()
+        ops += 1
+    elapsed = perf_counter() - begin
+    # Timing runs untraced, peak memory comes from one extra traced call.
+    start()
+    reset_peak()
+    func()
+    _, peak = get_traced_memory()
+    stop()
+    return {"ops": ops, "seconds_per_op": elapsed / ops, "peak_bytes": peak}
+
+
+def bench_core(sizes: list[int]) -> list[dict]:
+    from benchmarks.append import generate_history
+    from core.history import SSHHistory
+    from core.model import SSHData, get_fbnc_num, record_hash
+    from core.rebuild import rebuild, rebuild_history
+
+    results = []
+
+    def fbnc():
+        for n in range(1, 93):
+            get_fbnc_num(n)
+    results.append({"name": "get_fbnc_num", "size": 92, **measure(fbnc)})
+    results.append({"name": "SSHData", "size": 1, **measure(
+        lambda: SSHData(type="SLEEP", month=3, day=2, timestamp=1704038400)
+    )})
+    data = SSHData(type="SLEEP", month=3, day=2, timestamp=1704038400)
+
+    def cold_hash():
+        record_hash.cache_clear()
+        data.get_hash()
+    results.append({"name": "get_hash_cold", "size": 1, **measure(cold_hash)})
+    results.append({"name": "get_hash", "size": 1, **measure(data.get_hash)})
+
+    for size in sizes:
+        records = generate_history(size)
+        history = SSHHistory(records)
+        results.append({"name": "rebuild", "size": size, **measure(
+            lambda: rebuild(list(map(lambda d: d.model_copy(), records)))
+        )})
+        results.append({"name": "rebuild_history", "size": size, **measure(
+            lambda: rebuild_history(history.copy())
+        )})
+    return results
+
+
+def bench_cog(sizes: list[int], backends: list[str], data_dir: str) -> list[dict]:
+    import cogs.ssh as ssh
+    from benchmarks.append import generate_history
+    from core.cache import HistoryCache
+    from core.chain import ChainStore
+    from core.history import SSHHistory
+    from core.model import SSHData
+    from core.storage import get_storage
+    from core.writer import StorageWriter
+
+    loop = new_event_loop()
+    run = loop.run_until_complete
+    results = []
+    for backend in backends:
+        backend_dir = join(data_dir, backend)
+        makedirs(backend_dir)
+        ssh.storage = get_storage(backend, backend_dir)
+        ssh.chain = ChainStore(backend_dir)
+        ssh.writer = StorageWriter(ssh.storage, 0, ssh.chain)
+        ssh.cache = HistoryCache(0)
+        for size in sizes:
+            ctx = fake_context(size)
+            history = SSHHistory(generate_history(size))
+            run(ssh.write_user_data(ctx, history))
+
+            def append():
+                data = history.copy()
+                data.append(SSHData(type="SLEEP", timestamp=data[-1].timestamp + 60))
+                run(ssh.append_user_data(ctx, data))
+                run(ssh.pop_user_data(ctx, data[:-1]))
+            for name, func in (
+                ("read_user_data", lambda: run(ssh.read_user_data(ctx))),
+                ("write_user_data", lambda: run(ssh.write_user_data(ctx, history))),
+                ("append_pop_user_data", append),
+            ):
+                ssh.stats_cache.clear()
+                results.append({"name": name, "backend": backend, "size": size, **measure(func)})
+        ssh.storage.close()
+    loop.close()
+    return results
+
+
+def main():
+    parser = ArgumentParser(description="Offline benchmarks for the storage and calendar hot paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--backends", nargs="+", default=["json", "jsonl", "sqlite", "binary"])
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    output = abspath(args.output) if args.output else None
+
+    cwd = getcwd()
+    with TemporaryDirectory() as root:
+        # cogs.ssh reads config.json from the working directory on import.
+        with open(join(root, "config.json"), "wb") as f:
+            f.write(dumps({"token": "", "data_dir": join(root, "data"), "flush_interval": 0}))
+        chdir(root)
+        try:
+            results = bench_core(args.sizes) + bench_cog(args.sizes, args.backends, root)
+        finally:
+            chdir(cwd)
+
+    report = dumps({
+        "commit": git_commit(),
+        "python": python_version(),
+        "results": results,
+    }, option=OPT_INDENT_2)
+    if output is None:
+        stdout.buffer.write(report + b"\n")
+    else:
+        with open(output, "wb") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from core.binary import BinaryStorage
+from core.sqlite import SQLiteStorage
+from core.storage import JsonStorage, LogStorage
+
+from .append import generate_history
+
+
+def main():
+    parser = ArgumentParser(description="Cost of reading the latest record against history length.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    backends = {
+        "json": JsonStorage,
+        "jsonl": LogStorage,
+        "sqlite": SQLiteStorage,
+        "binary": BinaryStorage,
+    }
+    print(f"{'records':>10}" + "".join(f"{name + ' (us)':>14}" for name in backends))
+    for size in args.sizes:
+        data = generate_history(size)
+        costs: list[float] = []
+        for backend in backends.values():
+            with TemporaryDirectory() as data_dir:
+                storage = backend(data_dir)
+                storage.write(0, data)
+                begin = perf_counter()
+                for _ in range(args.rounds):
+                    storage.latest(0)
+                costs.append((perf_counter() - begin) / args.rounds)
+                storage.close()
+        print(f"{size:>10}" + "".join(f"{cost * 1e6:>14.1f}" for cost in costs))
+
+
+if __name__ == "__main__":
+    main()
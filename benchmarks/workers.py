@@ -0,0 +1,128 @@
+from orjson import dumps
+
+from argparse import ArgumentParser
+from asyncio import Queue, gather, new_event_loop, open_connection, sleep
+from os import chdir, environ, getcwd
+from os.path import join
+from signal import SIGINT, SIGTERM
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from benchmarks.suite import ROOT, fake_context
+from core.router import HOST, Router, spawn_workers, stop_workers
+
+PORT = 8570
+
+
+# One worker process: the cog's append path for whatever users it is sent.
+def serve_worker() -> None:
+    import cogs.ssh as ssh
+    from config import WORKER, WORKER_PORT
+    from core.model import SSHData
+    from core.router import serve
+
+    async def handle(request: dict) -> int:
+        ctx = fake_context(request["user_id"])
+        data = await ssh.read_user_data(ctx)
+        timestamp = data[-1].timestamp + 3600 if len(data) > 0 else 1704038400
+        data.append(SSHData(type="SLEEP" if len(data) % 2 else "WAKE_UP", timestamp=timestamp))
+        await ssh.append_user_data(ctx, data)
+        return len(data)
+
+    loop = new_event_loop()
+    loop.run_until_complete(serve(WORKER_PORT + WORKER, handle))
+    for signal in (SIGINT, SIGTERM):
+        loop.add_signal_handler(signal, loop.stop)
+    loop.run_forever()
+    loop.run_until_complete(ssh.writer.close())
+    ssh.storage.close()
+
+
+async def wait_ready(workers: int, timeout: float = 30) -> None:
+    begin = perf_counter()
+    for index in range(workers):
+        while True:
+            try:
+                _, writer = await open_connection(HOST, PORT + index)
+                writer.close()
+                break
+            except OSError:
+                if perf_counter() - begin > timeout:
+                    raise
+                await sleep(0.05)
+
+
+async def drive(workers: int, partitions: int, users: int, requests: int, concurrency: int) -> float:
+    await wait_ready(workers)
+    queue: Queue = Queue()
+    for i in range(requests):
+        queue.put_nowait(1000 + i % users)
+    # Each router keeps one request in flight per worker.
+    routers = [Router(workers, PORT, partitions) for _ in range(concurrency)]
+
+    async def client(router: Router) -> None:
+        while not queue.empty():
+            user_id = queue.get_nowait()
+            await router.forward(user_id, {"user_id": user_id})
+    begin = perf_counter()
+    await gather(*map(client, routers))
+    elapsed = perf_counter() - begin
+    for router in routers:
+        router.close()
+    return elapsed
+
+
+def run_workers(workers: int, args) -> float:
+    cwd = getcwd()
+    with TemporaryDirectory() as root:
+        with open(join(root, "config.json"), "wb") as f:
+            f.write(dumps({
+                "token": "",
+                "data_dir": join(root, "data"),
+                "storage": args.storage,
+                "partitions": args.partitions,
+                "workers": workers,
+                "worker_port": PORT,
+                "flush_interval": 0,
+                "loop_lag_threshold": 0,
+            }))
+        chdir(root)
+        processes = spawn_workers(workers, ["-m", "benchmarks.workers", "--serve"])
+        loop = new_event_loop()
+        try:
+            return loop.run_until_complete(
+                drive(workers, args.partitions, args.users, args.requests, args.concurrency * workers)
+            )
+        finally:
+            loop.close()
+            stop_workers(processes, 30)
+            chdir(cwd)
+
+
+def main():
+    parser = ArgumentParser(description="Append throughput through the router with 1..N worker processes.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--storage", default="jsonl", choices=["json", "jsonl", "sqlite", "binary"])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight per worker")
+    parser.add_argument("--serve", action="store_true", help="run as a worker, started by this script")
+    args = parser.parse_args()
+    if args.serve:
+        serve_worker()
+        return
+
+    # Workers are started with `python -m` from a temporary directory.
+    environ["PYTHONPATH"] = ROOT
+    base = None
+    print(f"{args.storage}, {args.partitions} partitions, {args.users} users, {args.requests} appends")
+    for workers in args.workers:
+        elapsed = run_workers(workers, args)
+        rate = args.requests / elapsed
+        base = base or rate
+        print(f"{workers} workers: {rate:8.0f} appends/s  ({rate / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,74 @@
-from discord import Bot, ApplicationContext
+from core.startup import report, timed
+
+with timed("import discord"):
+    from discord import ApplicationContext, Interaction
 
 from asyncio import AbstractEventLoop, open_connection
+from os import execv
+from os.path import join
+from sys import argv, executable
+from time import time
 from typing import Optional
 
-from config import TOKEN
+with timed("import config"):
+    from config import DATA_DIR, DRAIN_TIMEOUT, PARTITIONS, TOKEN, WORKER_PORT, WORKERS
+from cogs.base import DrainingBot
+from cogs.lazy import routed_names
+from core.drain import drain, load_restart
+from core.metrics import metrics
+from core.router import Router, routed_user, spawn_workers, stop_workers
+
+
+bot = DrainingBot()
+with timed("cog System"):
+    bot.load_extension("cogs.system")
+startup_reported = False
+restart = load_restart(join(DATA_DIR, "restart.json"))
+router = Router(WORKERS, WORKER_PORT, PARTITIONS) if WORKERS > 0 else None
+parse_interaction = bot._connection.parsers["INTERACTION_CREATE"]
+
+
+def route_interaction(data: dict) -> None:
+    user_id = routed_user(data, routed)
+    if user_id is None:
+        parse_interaction(data)
+    else:
+        bot.loop.create_task(forward_interaction(user_id, data))
 
-bot = Bot()
-bot.load_extension("cogs.system")
+
+async def forward_interaction(user_id: int, data: dict) -> None:
+    if not drain.enter():
+        await Interaction(data=data, state=bot._connection).response.send_message(
+            "Restarting, try again shortly.", ephemeral=True
+        )
+        return
+    try:
+        await router.forward(user_id, data)
+    except OSError:
+        print(f"Worker {router.worker_for(user_id)} unreachable.")
+        await Interaction(data=data, state=bot._connection).response.send_message(
+            "Worker unavailable, try again shortly.", ephemeral=True
+        )
+    finally:
+        drain.exit()
+
+
+if router is not None:
+    routed = routed_names()
+    bot._connection.parsers["INTERACTION_CREATE"] = route_interaction
 
 
 @bot.event
 async def on_ready():
+    global startup_reported
     print(f"{bot.user.display_name} has connected to discord.")
+    if not startup_reported:
+        startup_reported = True
+        print(report())
+        if restart is not None:
+            seconds = time() - restart["stopped"]
+            metrics.set_gauge("ssh_restart_seconds", seconds)
+            print(f"Back after {restart['reason']} in {seconds:.2f}s (stop to ready), {restart['abandoned']} commands abandoned.")
 
 
 @bot.slash_command(name="call")
@@ -28,4 +85,10 @@ async def call(ctx: ApplicationContext):
 def start(loop: Optional[AbstractEventLoop] = None):
     if loop is not None:
         bot.loop = loop
-    bot.run(token=TOKEN)
+    workers = spawn_workers(WORKERS, ["worker.py"]) if router is not None else []
+    try:
+        bot.run(token=TOKEN)
+    finally:
+        stop_workers(workers, DRAIN_TIMEOUT)
+    if drain.reason == "restart":
+        execv(executable, [executable] + argv)
@@ -1,16 +1,80 @@
-from discord import Bot, SlashCommandGroup
+from discord import ApplicationContext, Bot, Interaction, InteractionType, SlashCommandGroup
 from discord.ext.commands import Cog
 
-from typing import Optional
+from time import perf_counter
+from typing import Any, Optional
+
+from core.drain import drain
+from core.handoff import claim, reloading, stash
+from core.jobs import JobPool
+from core.metrics import metrics
+
+class DrainingBot(Bot):
+    async def process_application_commands(
+        self, interaction: Interaction, auto_sync: Optional[bool] = None
+    ) -> None:
+        if not drain.enter():
+            if interaction.type == InteractionType.application_command:
+                await interaction.response.send_message("Restarting, try again shortly.", ephemeral=True)
+            return
+        try:
+            await super().process_application_commands(interaction, auto_sync)
+        finally:
+            drain.exit()
+
 
 class GroupCog(Cog):
     bot: Optional[Bot] = None
     group: Optional[SlashCommandGroup] = None
+    jobs: Optional[JobPool] = None
+    # Bump when export_state changes shape, 0 opts out of the handoff.
+    state_version: int = 0
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
+        self.started: dict[int, float] = {}
         super().__init__()
+        if self.state_version > 0:
+            handed = claim(self.__module__)
+            if handed is not None:
+                version, state = handed
+                if version == self.state_version:
+                    self.adopt_state(state)
+                else:
+                    self.discard_state(state)
+
+    # Warm state handed from the unloading instance to the next one on reload.
+    def export_state(self) -> dict[str, Any]:
+        return {}
+
+    def adopt_state(self, state: dict[str, Any]) -> None:
+        pass
+
+    def discard_state(self, state: dict[str, Any]) -> None:
+        pass
+
+    # Called once the cog is done for good: before the process exits, after
+    # in-flight commands finished, or after a plain unload.
+    async def shutdown(self) -> None:
+        pass
+
+    async def cog_before_invoke(self, ctx: ApplicationContext) -> None:
+        self.started[ctx.interaction.id] = perf_counter()
+
+    async def cog_after_invoke(self, ctx: ApplicationContext) -> None:
+        begin = self.started.pop(ctx.interaction.id, None)
+        if begin is not None:
+            metrics.observe(
+                "ssh_command_seconds",
+                perf_counter() - begin,
+                command=ctx.command.qualified_name
+            )
     
+    # Plain unloads hand nothing over, the caller shuts the cog down instead.
     def cog_unload(self) -> None:
+        if self.state_version > 0 and self.__module__ in reloading:
+            stash(self.__module__, self.state_version, self.export_state())
+        if self.jobs is not None:
+            self.jobs.close()
         if self.group is not None:
             self.bot.remove_application_command(self.group)
         return super().cog_unload()
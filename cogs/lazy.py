@@ -0,0 +1,233 @@
+from discord import (
+    ApplicationContext,
+    AutocompleteContext,
+    Bot,
+    ExtensionAlreadyLoaded,
+    ExtensionFailed,
+    ExtensionNotFound,
+    ExtensionNotLoaded,
+    NoEntryPointError,
+    SlashCommandGroup,
+)
+from discord.commands import ApplicationCommand
+from orjson import dumps, loads
+
+from asyncio import Lock, get_running_loop
+from importlib.util import find_spec, module_from_spec
+from os.path import isfile, join
+from sys import modules
+from types import ModuleType
+from typing import Optional
+from zlib import crc32
+
+from config import DATA_DIR
+from core.handoff import reloading
+from core.storage import atomic_write
+
+from .base import GroupCog
+
+MANIFEST_PATH = join(DATA_DIR, "commands.json")
+
+
+def source_hash(path: str) -> int:
+    # Locating the module file does not execute it.
+    with open(find_spec(path).origin, "rb") as f:
+        return crc32(f.read())
+
+
+def read_manifest() -> dict[str, dict]:
+    if not isfile(MANIFEST_PATH):
+        return {}
+    try:
+        with open(MANIFEST_PATH, "rb") as f:
+            return loads(f.read())
+    except:
+        return {}
+
+
+# Remembers the slash command payloads of a loaded cog, keyed by its source hash.
+def update_manifest(bot: Bot, cog_name: str, path: str) -> None:
+    cog = bot.get_cog(cog_name)
+    if cog is None:
+        return
+    manifest = read_manifest()
+    entry = {
+        "source": source_hash(path),
+        "commands": [command.to_dict() for command in cog.get_commands()],
+    }
+    if manifest.get(cog_name) != entry:
+        manifest[cog_name] = entry
+        atomic_write(MANIFEST_PATH, dumps(manifest))
+
+
+def cached_commands(cog_name: str, path: str) -> Optional[list[dict]]:
+    entry = read_manifest().get(cog_name)
+    if entry is None or entry["source"] != source_hash(path):
+        return None
+    return entry["commands"]
+
+
+def drop_command(bot: Bot, command: ApplicationCommand) -> None:
+    bot.remove_application_command(command)
+    if command in bot._pending_application_commands:
+        bot._pending_application_commands.remove(command)
+
+
+# Runs the module body, so its imports and whatever files it opens, blocking.
+def exec_extension(path: str) -> ModuleType:
+    spec = find_spec(path)
+    if spec is None:
+        raise ExtensionNotFound(path)
+    lib = module_from_spec(spec)
+    try:
+        spec.loader.exec_module(lib)
+    except Exception as e:
+        raise ExtensionFailed(path, e) from e
+    if not hasattr(lib, "setup"):
+        raise NoEntryPointError(path)
+    return lib
+
+
+# The rest of Bot.load_extension once the module has run, cheap enough for the loop.
+def install_extension(bot: Bot, path: str, lib: ModuleType) -> None:
+    modules[path] = lib
+    try:
+        lib.setup(bot)
+    except Exception as e:
+        del modules[path]
+        bot._remove_module_references(lib.__name__)
+        bot._call_module_finalizers(lib, path)
+        raise ExtensionFailed(path, e) from e
+    # Bot.extensions is a read-only view of this.
+    bot._CogMixin__extensions[path] = lib
+
+
+# Bot.load_extension with the module body run in the executor.
+async def load_extension(bot: Bot, path: str) -> None:
+    if path in bot.extensions:
+        raise ExtensionAlreadyLoaded(path)
+    lib = await get_running_loop().run_in_executor(None, exec_extension, path)
+    if path in bot.extensions:
+        raise ExtensionAlreadyLoaded(path)
+    install_extension(bot, path, lib)
+
+
+# Bot.reload_extension, the old module keeps serving while the new one runs
+# in the executor and only the swap happens on the loop.
+async def reload_extension(bot: Bot, path: str) -> None:
+    old = bot.extensions.get(path)
+    if old is None:
+        raise ExtensionNotLoaded(path)
+    # The new module skips opening what the old cog is about to hand over.
+    reloading[path] = max(
+        (cog.state_version for cog in bot.cogs.values() if isinstance(cog, GroupCog) and cog.__module__ == path),
+        default=0,
+    )
+    try:
+        lib = await get_running_loop().run_in_executor(None, exec_extension, path)
+        if bot.extensions.get(path) is not old:
+            raise ExtensionNotLoaded(path)
+        previous = {
+            name: module for name, module in modules.items()
+            if name == path or name.startswith(f"{path}.")
+        }
+        bot.unload_extension(path)
+        try:
+            install_extension(bot, path, lib)
+        except:
+            # Put the old module back the way Bot.reload_extension does.
+            install_extension(bot, path, old)
+            modules.update(previous)
+            raise
+    finally:
+        del reloading[path]
+
+
+# Stands in for a cog's command group with the payload recorded last time, and
+# imports the cog the first time one of its commands is used.
+class LazyGroup(SlashCommandGroup):
+    def __init__(self, bot: Bot, cog_name: str, path: str, payload: dict) -> None:
+        super().__init__(name=payload["name"], description=payload["description"])
+        self.bot = bot
+        self.cog_name = cog_name
+        self.path = path
+        self.payload = payload
+        self.real: Optional[ApplicationCommand] = None
+        self.lock = Lock()
+        # Served by the worker processes, never imported here.
+        self.routed = False
+
+    @property
+    def loaded(self) -> bool:
+        return self.real is not None
+
+    def to_dict(self) -> dict:
+        return self.payload
+
+    async def load(self) -> ApplicationCommand:
+        if self.routed:
+            raise RuntimeError(f"{self.cog_name} is served by the worker processes")
+        async with self.lock:
+            if self.real is not None:
+                return self.real
+            drop_command(self.bot, self)
+            if self.cog_name not in self.bot.cogs:
+                await load_extension(self.bot, self.path)
+                await get_running_loop().run_in_executor(
+                    None, update_manifest, self.bot, self.cog_name, self.path
+                )
+            real = next(
+                command for command in self.bot.pending_application_commands
+                if command.name == self.name and command is not self
+            )
+            # Already registered with Discord under the stub's id.
+            if self.id is not None:
+                real.id = self.id
+                self.bot._application_commands[self.id] = real
+            self.real = real
+            return real
+
+    async def invoke(self, ctx: ApplicationContext) -> None:
+        ctx.command = await self.load()
+        await ctx.command.invoke(ctx)
+
+    async def invoke_autocomplete_callback(self, ctx: AutocompleteContext) -> None:
+        ctx.command = await self.load()
+        await ctx.command.invoke_autocomplete_callback(ctx)
+
+
+# Kept here rather than on the System cog so stubs outlive its reloads.
+registered: dict[str, list[LazyGroup]] = {}
+
+
+def register_lazy(bot: Bot, cog_name: str, path: str) -> list[LazyGroup]:
+    payloads = cached_commands(cog_name, path)
+    if payloads is None or any(payload.get("type", 1) != 1 or "options" not in payload for payload in payloads):
+        return []
+    groups = [LazyGroup(bot, cog_name, path, payload) for payload in payloads]
+    for group in groups:
+        bot.add_application_command(group)
+    registered[cog_name] = groups
+    return groups
+
+
+# The router only needs the payloads, a missing or stale manifest is rebuilt
+# by loading the cog once and unloading it again.
+def register_routed(bot: Bot, cog_name: str, path: str) -> list[LazyGroup]:
+    groups = register_lazy(bot, cog_name, path)
+    if not groups:
+        bot.load_extension(path)
+        update_manifest(bot, cog_name, path)
+        cog = bot.get_cog(cog_name)
+        bot.unload_extension(path)
+        # Startup, the loop is not running yet.
+        if isinstance(cog, GroupCog):
+            bot.loop.run_until_complete(cog.shutdown())
+        groups = register_lazy(bot, cog_name, path)
+    for group in groups:
+        group.routed = True
+    return groups
+
+
+def routed_names() -> set[str]:
+    return {group.name for groups in registered.values() for group in groups if group.routed}
@@ -1,17 +1,21 @@
-from aiofiles import open as async_open
 from discord import (
     ApplicationContext,
     Bot,
+    Button,
+    ButtonStyle,
     Embed,
     File,
+    Interaction,
     Member,
     Option,
+    OptionChoice,
     SlashCommand,
     SlashCommandGroup,
 )
-from orjson import dumps, loads, OPT_INDENT_2
-from pydantic import BaseModel, Field
+from discord.ext import tasks
+from discord.ui import View, button
 
+from asyncio import Lock, gather, get_running_loop
 from datetime import (
     date,
     datetime,
@@ -19,24 +23,104 @@ from datetime import (
     timedelta,
     timezone,
 )
-from hashlib import sha256
+from functools import partial, wraps
 from io import BytesIO
-from os.path import isfile, join
+from os.path import join
 from random import choice
-from typing import Literal, Optional, Union
-
-from config import DATA_DIR, TIMEZONE
+from typing import Any, Callable, Coroutine, Literal, Optional, Union
+
+from config import (
+    CACHE_BYTES,
+    CACHE_ENTRIES,
+    CHART_CACHE_BYTES,
+    CHART_WORKERS,
+    DATA_DIR,
+    FLUSH_INTERVAL,
+    JOB_PER_USER,
+    JOB_QUEUE,
+    JOB_WORKERS,
+    LEADERBOARD_FLUSH_INTERVAL,
+    MEMBER_CACHE_ENTRIES,
+    MEMBER_CACHE_TTL,
+    PARTITIONS,
+    STORAGE,
+    TIMEZONE,
+    WORKER,
+    WORKERS,
+)
+from core.cache import HistoryCache, TTLCache
+from core.calendar import YEARS, next_day
+from core.chain import ChainStore
+from core.chart import ChartCache, ChartRenderer, history_pairs
+from core.export import export_file, export_name
+from core.handoff import pending
+from core.history import TYPE_INDEX, History, SSHHistory
+from core.jobs import JobLimitError, JobPool
+from core.leaderboard import LeaderboardIndex, Summary, index_path, merge_indexes, scan_summaries
+from core.metrics import metrics
+from core.model import SSHData
+from core.partition import owned_partitions
+from core.stats import UserStats
+from core.storage import StorageBackend, get_storage
+from core.writer import StorageWriter
 
 from .base import GroupCog
 
-YEAR_DATA = {
-    "元": 1704038400,
-    "Co": 1708735983,
-    "高": 1709035411,
+STATE_VERSION = 1
+storage: Optional[StorageBackend] = None
+chain: Optional[ChainStore] = None
+writer: Optional[StorageWriter] = None
+cache: Optional[HistoryCache] = None
+stats_cache: Optional[dict[int, UserStats]] = None
+leaderboard_index: Optional[LeaderboardIndex] = None
+# Without the members intent no member events arrive, a renamed or departed
+# member shows as cached until member_cache_ttl runs out.
+members: Optional[TTLCache] = None
+charts: Optional[ChartRenderer] = None
+jobs = JobPool(JOB_WORKERS, JOB_PER_USER, JOB_QUEUE)
+leaderboard_lock = Lock()
+
+
+# Opens files and the chart cache directory, keep it off the loop.
+def open_state() -> dict[str, Any]:
+    storage = get_storage(STORAGE, DATA_DIR, PARTITIONS, owned_partitions(PARTITIONS, WORKERS, WORKER))
+    chain = ChainStore(DATA_DIR, PARTITIONS)
+    return {
+        "storage": storage,
+        "chain": chain,
+        "writer": StorageWriter(storage, FLUSH_INTERVAL, chain),
+        "cache": HistoryCache(CACHE_ENTRIES, CACHE_BYTES),
+        "stats_cache": {},
+        "leaderboard_index": LeaderboardIndex(index_path(DATA_DIR, WORKER)),
+        "members": TTLCache(MEMBER_CACHE_TTL, MEMBER_CACHE_ENTRIES),
+        "charts": ChartRenderer(
+            ChartCache(join(DATA_DIR, "charts" if WORKER < 0 else f"charts.{WORKER}"), CHART_CACHE_BYTES),
+            CHART_WORKERS,
+        ),
+    }
+
+
+def use_state(state: dict[str, Any]) -> None:
+    global storage, chain, writer, cache, stats_cache, leaderboard_index, members, charts
+    storage = state["storage"]
+    chain = state["chain"]
+    writer = state["writer"]
+    cache = state["cache"]
+    stats_cache = state["stats_cache"]
+    leaderboard_index = state["leaderboard_index"]
+    members = state["members"]
+    charts = state["charts"]
+
+
+# A reload hands over the running state, opening another would be wasted.
+if not pending(__name__, STATE_VERSION):
+    use_state(open_state())
+LEADERBOARD_SIZE = 10
+LOG_PAGE_SIZE = 10
+LOG_LABEL = {
+    "WAKE_UP": "起床",
+    "SLEEP": "睡覺",
 }
-YEARS = list(YEAR_DATA.keys())
-YEARS.sort(key=lambda k: YEAR_DATA[k])
-FBNC = [0, 1, 1]
 COLOR_MAP = {
     "SIGN_UP": 0xDC9FB4,  # https://nipponcolors.com/#nadeshiko
     "WAKE_UP": 0xFC9F4D,  # https://nipponcolors.com/#kanzo
@@ -67,77 +151,179 @@ RESPONSE_MESSAGE = {
 }
 
 
-class SSHData(BaseModel):
-    type: Literal["WAKE_UP", "SLEEP"]
-    year: str = YEARS[-1]
-    month: int = 1
-    day: int = 1
-    timestamp: int = Field(
-        default_factory=lambda: int(datetime.utcnow().timestamp())
-    )
+async def run_storage(func: Callable[..., Any], *args) -> Any:
+    def timed():
+        with metrics.timer("ssh_storage_seconds", op=func.__name__):
+            return func(*args)
+    return await get_running_loop().run_in_executor(None, timed)
 
-    def get_hash(self) -> str:
-        return sha256(dumps(self.model_dump())).hexdigest()
 
-    @property
-    def date(self) -> str:
-        return f"{self.year}年 {self.month} 月 {self.day} 日"
+async def read_user_data(ctx: ApplicationContext, member: Optional[Member] = None) -> SSHHistory:
+    user_id = member.id if member else ctx.author.id
+    data = cache.get(user_id)
+    if data is None:
+        data = writer.peek(user_id)
+    if data is None:
+        data = await run_storage(storage.read, user_id)
+        if len(data) > 0:
+            cache.put(user_id, data)
+    return data
 
 
-def get_fbnc_num(n: int) -> int:
-    if n < len(FBNC):
-        return FBNC[n]
-    result = get_fbnc_num(n - 2) + get_fbnc_num(n - 1)
-    FBNC.append(result)
-    return result
+async def read_latest(ctx: ApplicationContext, member: Optional[Member] = None) -> Optional[SSHData]:
+    user_id = member.id if member else ctx.author.id
+    data = cache.get(user_id)
+    if data is None:
+        data = writer.peek(user_id)
+    if data is None:
+        return await run_storage(storage.latest, user_id)
+    return data[-1] if len(data) > 0 else None
+
+
+# Returns the page's records oldest first, along with the total record count.
+async def read_page(user_id: int, page: int) -> tuple[SSHHistory, int]:
+    offset = LOG_PAGE_SIZE * (page - 1)
+    data = cache.get(user_id)
+    if data is None:
+        data = writer.peek(user_id)
+    if data is None and storage.seekable:
+        total, data = await gather(
+            run_storage(storage.count, user_id),
+            run_storage(storage.tail, user_id, offset, LOG_PAGE_SIZE),
+        )
+        return data, total
+    if data is None:
+        # count and tail would parse the whole file twice, one read serves
+        # this page and the cache serves the next ones.
+        data = await run_storage(storage.read, user_id)
+        if len(data) > 0:
+            cache.put(user_id, data)
+    return data[max(len(data) - offset - LOG_PAGE_SIZE, 0):max(len(data) - offset, 0)], len(data)
+
+
+async def read_range(user_id: int, start: int, stop: int) -> SSHHistory:
+    data = cache.get(user_id)
+    if data is None:
+        data = writer.peek(user_id)
+    if data is None:
+        return await run_storage(storage.range, user_id, start, stop)
+    return SSHHistory(filter(lambda d: start <= d.timestamp < stop, data))
+
+
+async def resolve_member(ctx: ApplicationContext, user_id: int) -> Optional[Member]:
+    if ctx.guild is None:
+        return None
+    guild = ctx.guild
+
+    async def fetch() -> Optional[Member]:
+        member = guild.get_member(user_id)
+        if member is None:
+            try:
+                member = await guild.fetch_member(user_id)
+            except:
+                return None
+        return member
+    return await members.get_or_fetch((guild.id, user_id), fetch)
+
+
+def remember_stats(user_id: int, stats: UserStats) -> None:
+    stats_cache.pop(user_id, None)
+    stats_cache[user_id] = stats
+    while len(stats_cache) > max(CACHE_ENTRIES, 0):
+        stats_cache.pop(next(iter(stats_cache)))
+
+
+# Read when /system metrics or the metrics file asks, not on every lookup.
+def publish_stats() -> None:
+    for name, stats in (
+        ("history", cache.stats()),
+        ("members", members.stats()),
+        ("charts", charts.cache.stats()),
+    ):
+        for key, value in stats.items():
+            metrics.set_gauge(f"ssh_cache_{key}", value, cache=name)
+
+
+async def read_stats(user_id: int, data: History, tail: int = 0) -> UserStats:
+    stats = stats_cache.get(user_id)
+    if stats is None:
+        stored = await run_storage(storage.read_meta, user_id, "stats")
+        stats = UserStats(**stored) if stored else None
+    if stats is None or not stats.matches(data, tail):
+        stats = await run_storage(UserStats.scan, data[:len(data) - tail])
+    remember_stats(user_id, stats)
+    return stats
+
+
+async def commit_user_data(ctx: ApplicationContext, op: str, data: History, *meta: tuple) -> None:
+    try:
+        await gather(
+            writer.submit(ctx.author.id, op, data),
+            *(writer.submit(ctx.author.id, *m) for m in meta)
+        )
+    except:
+        cache.invalidate(ctx.author.id)
+        stats_cache.pop(ctx.author.id, None)
+        raise
+    cache.put(ctx.author.id, data)
+    await update_leaderboard(ctx.author.id, data)
 
 
-def get_user_file(user_id: int) -> str:
-    return join(DATA_DIR, f"{user_id}.json")
+async def update_leaderboard(user_id: int, data: History) -> None:
+    stats = await read_stats(user_id, data)
+    # Only marks the index dirty, the cog rewrites the file on a timer.
+    leaderboard_index.update(user_id, Summary.build(user_id, data, stats))
 
 
-async def read_user_data(ctx: ApplicationContext, member: Optional[Member] = None) -> list[SSHData]:
-    file_path = get_user_file(member.id if member else ctx.author.id)
-    if not isfile(file_path):
-        return []
-    async with async_open(file_path, "rb") as f:
-        data: list[dict] = loads(await f.read())
-    return list(map(lambda d: SSHData(**d), data))
+async def run_job(ctx: ApplicationContext, name: str, func: Callable[..., Any], *args) -> Any:
+    try:
+        return await jobs.run(ctx.author.id, name, func, *args)
+    except JobLimitError:
+        await ctx.respond(embed=generate_embed(
+            ctx=ctx,
+            color="WARN",
+            title="目前太忙了",
+            description="你或其他人的工作還在進行中，請稍後再試。"
+        ))
+        raise
 
 
-async def write_user_data(ctx: ApplicationContext, data: list[SSHData]) -> None:
-    file_path = get_user_file(ctx.author.id)
-    async with async_open(file_path, "wb") as f:
-        await f.write(dumps(
-            data,
-            default=lambda d: d.model_dump(),
-            option=OPT_INDENT_2
-        ))
+async def ensure_leaderboard(ctx: ApplicationContext) -> None:
+    async with leaderboard_lock:
+        if leaderboard_index.complete:
+            return
+        user_ids = await run_storage(storage.users)
+        summaries = await run_job(
+            ctx, "leaderboard", partial(scan_summaries, partitions=PARTITIONS), STORAGE, DATA_DIR, user_ids
+        )
+        # Anything written while the scan ran is newer than what the scan saw.
+        summaries = [s for s in summaries if s.user_id not in leaderboard_index.entries]
+        leaderboard_index.replace(list(leaderboard_index.entries.values()) + summaries)
+        await run_storage(leaderboard_index.save)
 
 
-def rebuild(data: list[SSHData]) -> list[SSHData]:
-    if len(data) == 0:
-        return []
-    data.sort(key=lambda d: d.timestamp)
-    day = 1
-    month = 1
-    year_index = YEARS.index(data[0].year)
-    for i in range(len(data)):
-        data[i].day = day
-        data[i].month = month
-        data[i].year = YEARS[year_index]
-        if data[i].type == "WAKE_UP":
-            if year_index + 1 >= len(YEARS):
-                continue
-            if data[i].timestamp >= YEAR_DATA[YEARS[year_index + 1]]:
-                year_index += 1
-                data[i].year = YEARS[year_index]
-            continue
-        day += 1
-        if day > get_fbnc_num(month):
-            day = 1
-            month += 1
-    return data
+async def write_user_data(ctx: ApplicationContext, data: History) -> None:
+    stats_cache.pop(ctx.author.id, None)
+    await commit_user_data(ctx, "write", data, ("delete_meta", "stats"))
+
+
+async def append_user_data(ctx: ApplicationContext, data: History) -> None:
+    stats = await read_stats(ctx.author.id, data, tail=1)
+    stats.add(TYPE_INDEX[data[-1].type], data[-1].timestamp)
+    await commit_user_data(ctx, "append", data, ("write_meta", "stats", stats.to_dict()))
+
+
+async def pop_user_data(ctx: ApplicationContext, data: History) -> None:
+    stats_cache.pop(ctx.author.id, None)
+    await commit_user_data(ctx, "pop", data, ("delete_meta", "stats"))
+
+
+def serialized(func: Callable[..., Coroutine]) -> Callable[..., Coroutine]:
+    @wraps(func)
+    async def wrap(self, ctx: ApplicationContext, *args, **kwargs):
+        async with writer.lock(ctx.author.id):
+            return await func(self, ctx, *args, **kwargs)
+    return wrap
 
 
 def format_delta_time(delta: int) -> tuple[str, str, str]:
@@ -150,7 +336,7 @@ def format_delta_time(delta: int) -> tuple[str, str, str]:
 
 def check_signed(sign_up_command: SlashCommand) -> bool:
     async def wrap(ctx: ApplicationContext) -> bool:
-        if isfile(get_user_file(ctx.author.id)):
+        if ctx.author.id in cache or await run_storage(storage.exists, ctx.author.id):
             return True
         await ctx.respond(f"請先使用{sign_up_command.mention}進行註冊。")
         return False
@@ -171,12 +357,76 @@ def generate_embed(
         description=description,
         timestamp=datetime.now(timezone.utc)
     )
-    embed.set_thumbnail(url=member.display_avatar if member else ctx.author.display_avatar.url)
+    embed.set_thumbnail(url=(member or ctx.author).display_avatar.url)
     for key, value in fields.items():
         embed.add_field(name=key, value=value, inline=False)
     return embed
 
 
+def generate_log_embed(
+    ctx: ApplicationContext,
+    data: SSHHistory,
+    page: int,
+    pages: int
+) -> Embed:
+    tz = timezone(timedelta(hours=TIMEZONE))
+
+    def context_generator(data: SSHData) -> str:
+        result = [
+            "```",
+            f"Hash: {data.get_hash()[:6]}",
+            f"Time: {datetime.fromtimestamp(data.timestamp, tz=tz).isoformat()}",
+            "```",
+        ]
+        return "\n".join(result)
+    return generate_embed(
+        ctx=ctx,
+        color="INFO",
+        title="你的睡覺歷",
+        description=f"第 {page} / {pages} 頁",
+        fields={
+            f"{d.date} {LOG_LABEL[d.type]}": context_generator(d)
+            for d in reversed(data.to_list())
+        }
+    )
+
+
+class LogView(View):
+    def __init__(self, ctx: ApplicationContext, page: int, pages: int) -> None:
+        super().__init__(timeout=180)
+        self.ctx = ctx
+        self.page = page
+        self.pages = pages
+        self.update_buttons()
+
+    def update_buttons(self) -> None:
+        self.previous_page.disabled = self.page <= 1
+        self.next_page.disabled = self.page >= self.pages
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        return interaction.user.id == self.ctx.author.id
+
+    async def show(self, interaction: Interaction, page: int) -> None:
+        data, total = await read_page(self.ctx.author.id, page)
+        self.pages = max((total + LOG_PAGE_SIZE - 1) // LOG_PAGE_SIZE, 1)
+        self.page = min(page, self.pages)
+        if len(data) == 0 and total > 0:
+            data, total = await read_page(self.ctx.author.id, self.page)
+        self.update_buttons()
+        await interaction.response.edit_message(
+            embed=generate_log_embed(self.ctx, data, self.page, self.pages),
+            view=self
+        )
+
+    @button(emoji="◀", style=ButtonStyle.secondary)
+    async def previous_page(self, button: Button, interaction: Interaction):
+        await self.show(interaction, self.page - 1)
+
+    @button(emoji="▶", style=ButtonStyle.secondary)
+    async def next_page(self, button: Button, interaction: Interaction):
+        await self.show(interaction, self.page + 1)
+
+
 async def get_utc_datetime(
     ctx: ApplicationContext,
     latest_datetime: datetime,
@@ -223,20 +473,76 @@ class SleepSleepHistory(GroupCog):
         name="ssh",
         description="Sleep Sleep History"
     )
+    jobs = jobs
+    state_version = STATE_VERSION
+
+    def __init__(self, bot: Bot) -> None:
+        super().__init__(bot)
+        # A reload was expected to hand state over and nothing came.
+        if storage is None:
+            use_state(open_state())
+        self.storage = storage
+        self.chain = chain
+        self.writer = writer
+        metrics.add_collector("ssh", publish_stats)
+        self.save_leaderboard.change_interval(seconds=LEADERBOARD_FLUSH_INTERVAL)
+        self.save_leaderboard.start()
+
+    def cog_unload(self) -> None:
+        self.save_leaderboard.cancel()
+        return super().cog_unload()
+
+    # Other workers rank with this file, so they see changes up to an interval late.
+    @tasks.loop(seconds=10)
+    async def save_leaderboard(self):
+        if leaderboard_index.complete:
+            await run_storage(leaderboard_index.save)
+
+    def export_state(self) -> dict[str, Any]:
+        return {
+            "storage": storage,
+            "chain": chain,
+            "writer": writer,
+            "cache": cache,
+            "stats_cache": stats_cache,
+            "leaderboard_index": leaderboard_index,
+            "members": members,
+            "charts": charts,
+        }
+
+    # The writer keeps its queue and flusher.
+    def adopt_state(self, state: dict[str, Any]) -> None:
+        use_state(state)
+
+    def discard_state(self, state: dict[str, Any]) -> None:
+        async def retire():
+            await state["writer"].close()
+            await run_storage(state["storage"].close)
+            state["charts"].close()
+        self.bot.loop.create_task(retire())
+
+    async def shutdown(self) -> None:
+        metrics.remove_collector("ssh")
+        await writer.close()
+        if leaderboard_index.complete:
+            await run_storage(leaderboard_index.save)
+        await run_storage(storage.close)
+        charts.close()
 
     @group.command(
         name="sign_up",
         description="將今天註冊為起始日。"
     )
+    @serialized
     async def sign_up(self, ctx: ApplicationContext):
-        if isfile(get_user_file(ctx.author.id)):
+        if await run_storage(storage.exists, ctx.author.id):
             await ctx.respond("你已經註冊過了。")
             return
 
         new_data = SSHData(type="WAKE_UP")
         await write_user_data(
             ctx=ctx,
-            data=[new_data.model_dump()]
+            data=SSHHistory([new_data])
         )
         await ctx.respond(embed=generate_embed(
             ctx=ctx,
@@ -250,6 +556,7 @@ class SleepSleepHistory(GroupCog):
         description="開始新的一天。",
         checks=[check_signed(sign_up)],
     )
+    @serialized
     async def ohiyo(
         self,
         ctx: ApplicationContext,
@@ -282,11 +589,7 @@ class SleepSleepHistory(GroupCog):
             ))
             return
 
-        n_month = latest.month if latest.year == YEARS[-1] else 1
-        n_day = latest.day + 1 if latest.year == YEARS[-1] else 1
-        if n_day > get_fbnc_num(n_month):
-            n_month += 1
-            n_day = 1
+        n_month, n_day = next_day(latest.month, latest.day) if latest.year == YEARS[-1] else (1, 1)
         new_data = SSHData(
             type="WAKE_UP",
             month=n_month,
@@ -294,7 +597,7 @@ class SleepSleepHistory(GroupCog):
             timestamp=int(utc_datetime.timestamp())
         )
         data.append(new_data)
-        await write_user_data(ctx=ctx, data=data)
+        await append_user_data(ctx=ctx, data=data)
         await ctx.respond(embed=generate_embed(
             ctx=ctx,
             color="WAKE_UP",
@@ -310,6 +613,7 @@ class SleepSleepHistory(GroupCog):
         description="登出舊的一天。",
         checks=[check_signed(sign_up)],
     )
+    @serialized
     async def oyasumi(
         self,
         ctx: ApplicationContext,
@@ -349,7 +653,7 @@ class SleepSleepHistory(GroupCog):
             day=latest.day,
             timestamp=int(utc_datetime.timestamp())
         ))
-        await write_user_data(ctx=ctx, data=data)
+        await append_user_data(ctx=ctx, data=data)
         await ctx.respond(embed=generate_embed(
             ctx=ctx,
             color="SLEEP",
@@ -372,9 +676,8 @@ class SleepSleepHistory(GroupCog):
     ):
         author = ctx.author
         if user is not None:
-            author = ctx.guild.get_member(int(user)) or await ctx.guild.fetch_member(int(user)) or ctx.author
-        data = await read_user_data(ctx, author)
-        latest = data[-1]
+            author = await resolve_member(ctx, int(user)) or ctx.author
+        latest = await read_latest(ctx, author)
         time_delta = datetime.utcnow() - datetime.fromtimestamp(latest.timestamp)
         hours, minutes, seconds = format_delta_time(
             int(time_delta.total_seconds()))
@@ -402,47 +705,118 @@ class SleepSleepHistory(GroupCog):
         description="取消上一筆紀錄。",
         checks=[check_signed(sign_up)],
     )
+    @serialized
     async def cancel(
         self,
         ctx: ApplicationContext
     ):
         data = await read_user_data(ctx)
-        await write_user_data(ctx=ctx, data=data[:-1])
+        await pop_user_data(ctx=ctx, data=data[:-1])
         await ctx.respond(embed=generate_embed(
             ctx=ctx,
             color="INFO",
             title="已取消上一筆紀錄",
         ))
 
-    # @group.command(
-    #     name="log",
-    #     description="查看記錄檔",
-    #     checks=[check_signed(sign_up)],
-    # )
-    # async def get_logs(
-    #     self,
-    #     ctx: ApplicationContext,
-    #     page: Option(int, name="頁碼", description="頁碼", default=1, min_value=1),
-    # ):
-    #     def context_generator(data: SSHData) -> str:
-    #         delta = timedelta(hours=TIMEZONE)
-    #         result = [
-    #             "```",
-    #             f"Hash: {data.get_hash()[:6]}",
-    #             f"Time: {(datetime.fromtimestamp(data.timestamp, tz=timezone(delta)) + delta).isoformat()}",
-    #             "```",
-    #         ]
-    #         return "\n".join(result)
-    #     data = await read_user_data(ctx=ctx)
-    #     page = 10 * (page - 1)
-    #     await ctx.respond(embed=generate_embed(
-    #         ctx=ctx,
-    #         color="INFO",
-    #         title="你的睡覺歷",
-    #         fields={
-    #             d.date: context_generator(d) for d in data[-1 - page:-11 - page:-1]
-    #         }
-    #     ))
+    @group.command(
+        name="stats",
+        description="查看睡覺統計。",
+        checks=[check_signed(sign_up)],
+    )
+    async def stats(
+        self,
+        ctx: ApplicationContext
+    ):
+        await ctx.defer()
+        data = await read_user_data(ctx)
+        stats = await read_stats(ctx.author.id, data)
+
+        def duration(seconds: float) -> str:
+            hours, minutes, seconds = format_delta_time(int(seconds))
+            return f"{hours} 小時 {minutes} 分 {seconds} 秒"
+
+        await ctx.respond(embed=generate_embed(
+            ctx=ctx,
+            color="INFO",
+            title="你的睡覺統計",
+            description=f"共 {stats.day.count} 天的紀錄。",
+            fields={
+                "平均一天": f"{duration(stats.day.mean)}（標準差 {duration(stats.day.stdev)}）",
+                "最長的一天": duration(stats.day.maximum or 0),
+                "平均睡眠": f"{duration(stats.sleep.mean)}（標準差 {duration(stats.sleep.stdev)}）",
+                "最長睡眠": duration(stats.sleep.maximum or 0),
+                "連續規律天數": f"{stats.streak} 天（最長 {stats.best_streak} 天）",
+            },
+        ))
+
+    @group.command(
+        name="leaderboard",
+        description="查看排行榜。",
+    )
+    async def leaderboard(
+        self,
+        ctx: ApplicationContext,
+        rank_by: Option(
+            str,
+            name="排序",
+            description="排序方式",
+            choices=[
+                OptionChoice("目前日期", "date"),
+                OptionChoice("總天數", "days"),
+                OptionChoice("平均睡眠", "sleep"),
+            ],
+            default="date"
+        ),
+    ):
+        await ctx.defer()
+        try:
+            await ensure_leaderboard(ctx)
+        except JobLimitError:
+            return
+
+        def value(summary: Summary) -> str:
+            if rank_by == "days":
+                return f"{summary.days} 天"
+            if rank_by == "sleep":
+                hours, minutes, seconds = format_delta_time(int(summary.sleep_mean))
+                return f"{hours} 小時 {minutes} 分 {seconds} 秒"
+            return summary.date
+
+        board = leaderboard_index
+        if WORKERS > 0:
+            peers = [index_path(DATA_DIR, worker) for worker in range(WORKERS) if worker != WORKER]
+            board = await run_storage(merge_indexes, leaderboard_index, peers)
+        top = board.top(LEADERBOARD_SIZE, rank_by)
+        rank = board.rank(ctx.author.id, rank_by)
+        await ctx.respond(embed=generate_embed(
+            ctx=ctx,
+            color="INFO",
+            title="排行榜",
+            description="\n".join(
+                [f"{i}. <@{s.user_id}> {value(s)}" for i, s in enumerate(top, 1)]
+                + ([f"\n你的排名：第 {rank} 名"] if rank is not None else [])
+            ) or "還沒有人註冊。",
+        ))
+
+    @group.command(
+        name="log",
+        description="查看記錄檔",
+        checks=[check_signed(sign_up)],
+    )
+    async def log(
+        self,
+        ctx: ApplicationContext,
+        page: Option(int, name="頁碼", description="頁碼", default=1, min_value=1),
+    ):
+        data, total = await read_page(ctx.author.id, page)
+        pages = max((total + LOG_PAGE_SIZE - 1) // LOG_PAGE_SIZE, 1)
+        if page > pages:
+            page = pages
+            data, total = await read_page(ctx.author.id, page)
+        await ctx.respond(
+            embed=generate_log_embed(ctx, data, page, pages),
+            view=LogView(ctx, page, pages)
+        )
 
     @group.command(
         name="dump",
@@ -451,13 +825,76 @@ class SleepSleepHistory(GroupCog):
     )
     async def dump(
         self,
-        ctx: ApplicationContext
+        ctx: ApplicationContext,
+        format_: Option(
+            str,
+            name="格式",
+            description="匯出格式",
+            choices=["json", "jsonl", "csv"],
+            default="json"
+        ),
+        compression: Option(
+            str,
+            name="壓縮",
+            description="壓縮方式",
+            choices=["none", "gzip", "lzma"],
+            default="none"
+        ),
+    ):
+        await ctx.defer()
+        data = await read_user_data(ctx)
+        try:
+            f = await run_job(ctx, "dump", export_file, data, format_, compression)
+        except JobLimitError:
+            return
+        try:
+            await ctx.respond(file=File(f, export_name(ctx.author.display_name, format_, compression)))
+        finally:
+            f.close()
+
+    @group.command(
+        name="chart",
+        description="查看最近的起床與睡覺時間圖表",
+        checks=[check_signed(sign_up)],
+    )
+    async def chart(
+        self,
+        ctx: ApplicationContext,
+        days: Option(
+            int,
+            name="天數",
+            description="顯示最近幾天",
+            default=30,
+            min_value=7,
+            max_value=120,
+        ),
     ):
-        file_path = get_user_file(ctx.author.id)
-        async with async_open(file_path, "rb") as f:
-            context = await f.read()
-        await ctx.respond(file=File(BytesIO(context), f"{ctx.author.display_name}.json"))
-    
+        await ctx.defer()
+        offset = int(TIMEZONE * 3600)
+        today = (int(datetime.now(timezone.utc).timestamp()) + offset) // 86400
+        first_day = today - days + 1
+        data = await read_range(ctx.author.id, first_day * 86400 - offset, (today + 1) * 86400 - offset)
+        if len(data) == 0:
+            await ctx.respond(embed=generate_embed(
+                ctx=ctx,
+                color="WARN",
+                title="沒有資料",
+                description=f"最近 {days} 天沒有任何紀錄。",
+            ))
+            return
+        try:
+            content = await run_job(ctx, "chart", charts.render, history_pairs(data), days, first_day, TIMEZONE)
+        except JobLimitError:
+            return
+        embed = generate_embed(
+            ctx=ctx,
+            color="INFO",
+            title=f"最近 {days} 天的紀錄",
+            description="上：起床（橘）與睡覺（藍）的時間\n下：每天的長度（小時）",
+        )
+        embed.set_image(url="attachment://chart.png")
+        await ctx.respond(embed=embed, file=File(BytesIO(content), "chart.png"))
+
     @group.command(
         name="modify",
         description="修改記錄",
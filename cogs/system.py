@@ -1,11 +1,28 @@
 from aiofiles import open as async_open
-from discord import ApplicationContext, Bot, Option, SlashCommandGroup
+from discord import ApplicationContext, Bot, File, Option, SlashCommandGroup
+from discord.ext import tasks
 from orjson import loads
 
+from io import BytesIO
+from os.path import join
+from signal import SIGINT, SIGTERM
 from subprocess import run, PIPE
-from config import MANAGERS
+from time import perf_counter
+from config import DATA_DIR, DRAIN_TIMEOUT, LOOP_LAG_THRESHOLD, MANAGERS, METRICS_FILE, METRICS_INTERVAL, WORKERS
+from core.chain import verify_users
+from core.drain import drain, save_restart
+from core.metrics import metrics
+from core.monitor import LoopMonitor
+from core.profiler import MAX_DURATION, LiveProfiler
+from core.startup import timed
+from core.storage import atomic_write
 
 from .base import GroupCog
+from .lazy import load_extension, register_lazy, register_routed, registered, reload_extension, update_manifest
+
+profiler = LiveProfiler()
+monitor = LoopMonitor(LOOP_LAG_THRESHOLD)
+RESTART_PATH = join(DATA_DIR, "restart.json")
 
 
 async def check_is_manager(ctx: ApplicationContext) -> bool:
@@ -21,20 +38,78 @@ class System(GroupCog):
         description="System commands.",
         checks=[check_is_manager],
     )
+    profile = group.create_subgroup(
+        name="profile",
+        description="Profile the running bot.",
+        checks=[check_is_manager],
+    )
     cogs_data: dict[str] = {}
 
     def __init__(self, bot: Bot) -> None:
         super().__init__(bot)
-        with open("cogs/cogs.json", "rb") as cogs_file:
-            self.cogs_data: dict[str] = loads(cogs_file.read())
-        for cog_path in map(
-            lambda data: data["path"],
-            filter(
-                lambda data: data["load_on_start"],
-                self.cogs_data.values()
-            )
-        ):
-            self.bot.load_extension(cog_path)
+        if self.bot.loop.is_running():
+            # Reloaded from a command, the other cogs are loaded already.
+            self.bot.loop.create_task(self.update_cogs_data())
+        else:
+            # Startup, nothing is waiting on the loop yet.
+            with open("cogs/cogs.json", "rb") as cogs_file:
+                self.cogs_data: dict[str] = loads(cogs_file.read())
+            for cog_name, data in self.cogs_data.items():
+                if not data["load_on_start"]:
+                    continue
+                with timed(f"cog {cog_name}"):
+                    if WORKERS > 0 and data.get("routed", False):
+                        register_routed(self.bot, cog_name, data["path"])
+                        continue
+                    # Only the recorded command metadata until first use.
+                    if data.get("lazy", False):
+                        if register_lazy(self.bot, cog_name, data["path"]):
+                            continue
+                    self.bot.load_extension(data["path"])
+                    update_manifest(self.bot, cog_name, data["path"])
+        if METRICS_FILE:
+            self.export_metrics.change_interval(seconds=METRICS_INTERVAL)
+            self.export_metrics.start()
+        if LOOP_LAG_THRESHOLD > 0:
+            # Runs on the loop thread once the loop is going.
+            self.bot.loop.call_soon_threadsafe(monitor.start, self.bot.loop)
+        # Bot.run points the signals at loop.stop before the loop starts.
+        self.bot.loop.call_soon_threadsafe(self.handle_signals)
+
+    def cog_unload(self) -> None:
+        self.export_metrics.cancel()
+        monitor.stop()
+        return super().cog_unload()
+
+    def handle_signals(self) -> None:
+        for signal in (SIGINT, SIGTERM):
+            try:
+                self.bot.loop.add_signal_handler(signal, self.request_stop, "shutdown")
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    def request_stop(self, reason: str) -> bool:
+        if not drain.close(reason):
+            return False
+        self.bot.loop.create_task(self.stop_bot())
+        return True
+
+    # Bot.run returns once the bot is closed, bot.start re-executes on restart.
+    async def stop_bot(self) -> None:
+        begin = perf_counter()
+        cogs = [cog for cog in self.bot.cogs.values() if isinstance(cog, GroupCog)]
+        abandoned = await drain.shutdown(DRAIN_TIMEOUT, [cog.shutdown for cog in cogs])
+        seconds = perf_counter() - begin
+        print(f"Stopped in {seconds:.2f}s, {abandoned} commands abandoned.")
+        await self.bot.loop.run_in_executor(
+            None, save_restart, RESTART_PATH, drain.reason, abandoned, seconds
+        )
+        await self.bot.close()
+
+    @tasks.loop(seconds=15)
+    async def export_metrics(self):
+        content = metrics.to_prometheus().encode()
+        await self.bot.loop.run_in_executor(None, atomic_write, METRICS_FILE, content)
 
     async def update_cogs_data(self):
         async with async_open("cogs/cogs.json", "rb") as cogs_file:
@@ -51,6 +126,18 @@ class System(GroupCog):
     def _loaded_cogs(self, *args) -> list[str]:
         return list(filter(lambda cog_name: cog_name != "System", self.bot.cogs.keys()))
 
+    def cog_status(self, cog_name: str) -> str:
+        if cog_name in self.loaded_cogs:
+            return "loaded"
+        if self.is_routed(cog_name):
+            return f"routed to {WORKERS} workers"
+        if any(not group.loaded for group in registered.get(cog_name, [])):
+            return "lazy"
+        return "unload"
+
+    def is_routed(self, cog_name: str) -> bool:
+        return any(group.routed for group in registered.get(cog_name, []))
+
     @property
     def unload_cogs(self) -> list[str]:
         return self._unload_cogs()
@@ -74,7 +161,7 @@ class System(GroupCog):
             return "\n".join([
                 cog_name,
                 f"  - path: {self.cogs_data[cog_name]['path']}",
-                f"  - status: {'loaded' if cog_name in self.loaded_cogs else 'unload'}",
+                f"  - status: {self.cog_status(cog_name)}",
                 f"  - description: {self.cogs_data[cog_name]['description']}",
                 ""
             ])
@@ -95,8 +182,15 @@ class System(GroupCog):
             autocomplete=_unload_cogs,
         )
     ):
-        if cog_name in self.unload_cogs:
-            self.bot.load_extension(self.cogs_data[cog_name]["path"])
+        if self.is_routed(cog_name):
+            await ctx.respond(f"Load failed, `{cog_name}` is served by the worker processes.")
+        elif cog_name in self.unload_cogs:
+            groups = [group for group in registered.pop(cog_name, []) if not group.loaded]
+            if groups:
+                for group in groups:
+                    await group.load()
+            else:
+                await load_extension(self.bot, self.cogs_data[cog_name]["path"])
             await ctx.respond(f"`{cog_name}` loaded successfully.")
         elif cog_name in self.all_cogs: await ctx.respond(f"Load failed, `{cog_name}` has loaded.")
         else: await ctx.respond(f"Load failed, `{cog_name}` not found.")
@@ -116,7 +210,7 @@ class System(GroupCog):
         )
     ):
         if cog_name in self.loaded_cogs:
-            self.bot.reload_extension(self.cogs_data[cog_name]["path"])
+            await reload_extension(self.bot, self.cogs_data[cog_name]["path"])
             await ctx.respond(f"`{cog_name}` reload successfully.")
         elif cog_name in self.all_cogs: await ctx.respond(f"Reload failed, `{cog_name}` not loaded.")
         else: await ctx.respond(f"Reload failed, `{cog_name}` not found.")
@@ -136,11 +230,109 @@ class System(GroupCog):
         )
     ):
         if cog_name in self.loaded_cogs:
+            cog = self.bot.get_cog(cog_name)
             self.bot.unload_extension(self.cogs_data[cog_name]["path"])
+            if isinstance(cog, GroupCog):
+                await cog.shutdown()
             await ctx.respond(f"`{cog_name}` unloaded successfully.")
         elif cog_name in self.all_cogs: await ctx.respond(f"Unload failed, `{cog_name}` not loaded.")
         else: await ctx.respond(f"Unload failed, `{cog_name}` not found.")
 
+    @group.command(
+        name="verify",
+        description="verify history hash chains",
+    )
+    async def verify(
+        self,
+        ctx: ApplicationContext,
+        user: Option(str, name="user_id", description="user id, all users if omitted", required=False),
+    ):
+        ssh = self.bot.get_cog("SleepSleepHistory")
+        if ssh is None:
+            await ctx.respond("Verify failed, `SleepSleepHistory` not loaded.")
+            return
+        await ctx.defer()
+        # Let queued writes land first so the chain and the history agree.
+        await ssh.writer.close()
+        if user is None:
+            user_ids = await self.bot.loop.run_in_executor(None, ssh.storage.users)
+        else:
+            user_ids = [int(user)]
+        results = await self.bot.loop.run_in_executor(
+            None, verify_users, ssh.storage, ssh.chain, user_ids
+        )
+        unchained = [user_id for user_id, index in results.items() if index == -1]
+        broken = [(user_id, index) for user_id, index in results.items() if index is not None and index >= 0]
+        lines = [f"Verified {len(results)} users, {len(broken)} broken, {len(unchained)} without chain."]
+        lines += [f"  - {user_id}: first broken link at record {index}" for user_id, index in broken[:20]]
+        if len(broken) > 20:
+            lines.append(f"  ... {len(broken) - 20} more")
+        await ctx.respond("```\n" + "\n".join(lines) + "\n```")
+
+    @group.command(
+        name="metrics",
+        description="show command and storage latency",
+    )
+    async def show_metrics(
+        self,
+        ctx: ApplicationContext,
+        reset: Option(bool, description="clear after showing", default=False),
+    ):
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.1f}"
+
+        lines = [f"{'name':<40}{'count':>8}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)"]
+        for entry in metrics.summary():
+            label = ",".join(entry["labels"].values())
+            name = entry["name"].removeprefix("ssh_").removesuffix("_seconds")
+            lines.append(
+                f"{(name + (f'[{label}]' if label else ''))[:39]:<40}{entry['count']:>8}"
+                f"{ms(entry['p50']):>9}{ms(entry['p95']):>9}{ms(entry['p99']):>9}"
+            )
+        for entry in metrics.gauge_summary():
+            label = ",".join(entry["labels"].values())
+            name = entry["name"].removeprefix("ssh_")
+            lines.append(f"{(name + (f'[{label}]' if label else ''))[:39]:<40}{entry['value']:>8g}")
+        if reset:
+            metrics.clear()
+        content = "\n".join(lines)
+        if len(content) > 1900:
+            content = content[:1900].rsplit("\n", 1)[0] + "\n..."
+        await ctx.respond("```\n" + content + "\n```")
+
+    @profile.command(
+        name="start",
+        description="start cProfile and tracemalloc on the event loop",
+    )
+    async def profile_start(
+        self,
+        ctx: ApplicationContext,
+        duration: Option(int, description="stop automatically after seconds", default=60, min_value=1, max_value=MAX_DURATION),
+    ):
+        if profiler.running:
+            await ctx.respond("Profile failed, profiler is already running.")
+            return
+        profiler.start(duration)
+        await ctx.respond(f"Profiling for up to {duration}s.")
+
+    @profile.command(
+        name="stop",
+        description="stop profiling and upload the results",
+    )
+    async def profile_stop(self, ctx: ApplicationContext):
+        await ctx.defer()
+        result = profiler.stop()
+        if result is None:
+            await ctx.respond("Profile failed, profiler is not running.")
+            return
+        await ctx.respond(
+            f"Profiled {result.seconds:.1f}s.",
+            files=[
+                File(BytesIO(result.stats), "profile.pstats"),
+                File(BytesIO(result.report.encode()), "profile.txt"),
+            ]
+        )
+
     @group.command(
         name="fetch",
         description="fetch update from github"
@@ -164,9 +356,23 @@ class System(GroupCog):
         self,
         ctx: ApplicationContext
     ):
-        run(["cmd", "/c", "start start.cmd"])
+        if not self.request_stop("restart"):
+            await ctx.respond("Restart failed, already stopping.")
+            return
         await ctx.respond("Restart...")
-        exit(0)
+
+    @group.command(
+        name="shutdown",
+        description="stop bot after in-flight commands finish"
+    )
+    async def shutdown_bot(
+        self,
+        ctx: ApplicationContext
+    ):
+        if not self.request_stop("shutdown"):
+            await ctx.respond("Shutdown failed, already stopping.")
+            return
+        await ctx.respond("Shutdown...")
 
 
 def setup(bot: Bot):
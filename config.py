@@ -2,8 +2,10 @@ from orjson import loads, dumps, OPT_INDENT_2
 from pydantic import BaseModel, ConfigDict, field_validator
 
 from datetime import timedelta, timezone
-from os import makedirs
+from os import environ, makedirs
 from os.path import isdir, isfile
+from sys import stdin
+from typing import Literal
 
 class Config(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -11,27 +13,98 @@ class Config(BaseModel):
     data_dir: str = "data"
     managers: list[int] = []
     tz: float = 8
+    storage: Literal["json", "jsonl", "sqlite", "binary"] = "json"
+    cache_entries: int = 1024
+    cache_bytes: int = 0
+    flush_interval: float = 0.05
+    metrics_file: str = ""
+    metrics_interval: float = 15
+    loop_lag_threshold: float = 0.25
+    job_workers: int = 2
+    job_per_user: int = 1
+    job_queue: int = 16
+    member_cache_ttl: float = 300
+    member_cache_entries: int = 1024
+    drain_timeout: float = 30
+    partitions: int = 0
+    workers: int = 0
+    worker_port: int = 8470
+    chart_cache_bytes: int = 64 << 20
+    chart_workers: int = 1
+    leaderboard_flush_interval: float = 10
 
-if not isfile("config.json"):
-    token = input("Discord Token: ")
-    with open("config.json", "wb") as config_file:
+# SSH_CONFIG points at another config file, SSH_TOKEN creates a missing one
+# without prompting, e.g. under a service manager with no terminal.
+CONFIG_PATH = environ.get("SSH_CONFIG", "config.json")
+
+if not isfile(CONFIG_PATH):
+    if "SSH_TOKEN" in environ:
+        token = environ["SSH_TOKEN"]
+    elif stdin is not None and stdin.isatty():
+        token = input("Discord Token: ")
+    else:
+        raise RuntimeError(f"{CONFIG_PATH} not found, set SSH_TOKEN to create it")
+    with open(CONFIG_PATH, "wb") as config_file:
         config_file.write(dumps(Config(**{
             "token": token,
             "data_dir": "data",
             "managers": [],
             "tz": 8,
+            "storage": "json",
+            "cache_entries": 1024,
+            "cache_bytes": 0,
+            "flush_interval": 0.05,
+            "metrics_file": "",
+            "metrics_interval": 15,
+            "loop_lag_threshold": 0.25,
+            "job_workers": 2,
+            "job_per_user": 1,
+            "job_queue": 16,
+            "member_cache_ttl": 300,
+            "member_cache_entries": 1024,
+            "drain_timeout": 30,
+            "partitions": 0,
+            "workers": 0,
+            "worker_port": 8470,
+            "chart_cache_bytes": 64 << 20,
+            "chart_workers": 1,
+            "leaderboard_flush_interval": 10,
         }).model_dump(), option=OPT_INDENT_2))
 
-with open("config.json", "rb") as config_file:
+with open(CONFIG_PATH, "rb") as config_file:
     config: Config = Config(**loads(config_file.read()))
 
 TOKEN = config.token
 DATA_DIR = config.data_dir
 MANAGERS = config.managers
 TIMEZONE = config.tz
+STORAGE = config.storage
+CACHE_ENTRIES = config.cache_entries
+CACHE_BYTES = config.cache_bytes
+FLUSH_INTERVAL = config.flush_interval
+METRICS_FILE = config.metrics_file
+METRICS_INTERVAL = config.metrics_interval
+LOOP_LAG_THRESHOLD = config.loop_lag_threshold
+JOB_WORKERS = config.job_workers
+JOB_PER_USER = config.job_per_user
+JOB_QUEUE = config.job_queue
+MEMBER_CACHE_TTL = config.member_cache_ttl
+MEMBER_CACHE_ENTRIES = config.member_cache_entries
+DRAIN_TIMEOUT = config.drain_timeout
+PARTITIONS = config.partitions
+WORKERS = config.workers
+WORKER_PORT = config.worker_port
+CHART_CACHE_BYTES = config.chart_cache_bytes
+CHART_WORKERS = config.chart_workers
+LEADERBOARD_FLUSH_INTERVAL = config.leaderboard_flush_interval
+# Set by the router for the worker processes it starts, -1 everywhere else.
+WORKER = int(environ.get("SSH_WORKER", "-1"))
 
 if TOKEN is None:
     raise RuntimeError("Token not found")
 
+if WORKERS > 0 and PARTITIONS < WORKERS:
+    raise RuntimeError("partitions must be at least workers")
+
 if not isdir(DATA_DIR):
     makedirs(DATA_DIR)
@@ -0,0 +1,235 @@
+from orjson import dumps, loads, OPT_INDENT_2
+
+from mmap import ACCESS_READ, mmap
+from os import remove, truncate
+from os.path import getsize, isfile
+from struct import Struct
+from threading import Lock
+from typing import Optional
+
+from .calendar import YEAR_INDEX, YEARS
+from .history import TYPES, TYPE_INDEX, History, SSHHistory, to_dicts
+from .model import SSHData
+from .storage import JsonStorage, atomic_write
+
+MAGIC = b"SSHB"
+VERSION = 1
+# magic, version, record size
+HEADER = Struct("<4sHH")
+# type, year index, month, day, timestamp
+RECORD = Struct("<BBHIq")
+
+
+def pack_header() -> bytes:
+    return HEADER.pack(MAGIC, VERSION, RECORD.size)
+
+
+def check_header(content: bytes) -> None:
+    magic, version, record_size = HEADER.unpack_from(content)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError(f"Unsupported record file: {magic!r} v{version} ({record_size} bytes)")
+
+
+def pack_record(data: dict) -> bytes:
+    return RECORD.pack(
+        TYPE_INDEX[data["type"]],
+        YEAR_INDEX[data["year"]],
+        data["month"],
+        data["day"],
+        data["timestamp"],
+    )
+
+
+def unpack_record(content: bytes, offset: int) -> SSHData:
+    type_, year, month, day, timestamp = RECORD.unpack_from(content, offset)
+    return SSHData.model_construct(
+        type=TYPES[type_],
+        year=YEARS[year],
+        month=month,
+        day=day,
+        timestamp=timestamp,
+    )
+
+
+def dump_binary(data: History) -> bytes:
+    return pack_header() + b"".join(map(pack_record, to_dicts(data)))
+
+
+def load_binary(content: bytes) -> SSHHistory:
+    check_header(content)
+    history = SSHHistory()
+    end = len(content) - (len(content) - HEADER.size) % RECORD.size
+    for type_, year, month, day, timestamp in RECORD.iter_unpack(content[HEADER.size:end]):
+        history.types.append(type_)
+        history.years.append(year)
+        history.months.append(month)
+        history.days.append(day)
+        history.timestamps.append(timestamp)
+    return history
+
+
+def json_to_binary(json_path: str, binary_path: str) -> None:
+    with open(json_path, "rb") as f:
+        data: list[dict] = loads(f.read())
+    atomic_write(binary_path, dump_binary(data))
+
+
+def binary_to_json(binary_path: str, json_path: str) -> None:
+    with open(binary_path, "rb") as f:
+        data = load_binary(f.read())
+    atomic_write(json_path, dumps(data.to_dicts(), option=OPT_INDENT_2))
+
+
+class BinaryStorage(JsonStorage):
+    suffix = ".bin"
+    appendable = True
+    seekable = True
+
+    def __init__(self, data_dir: str) -> None:
+        super().__init__(data_dir)
+        self.legacy = JsonStorage(data_dir)
+        self.locks: dict[int, Lock] = {}
+
+    def get_lock(self, user_id: int) -> Lock:
+        return self.locks.setdefault(user_id, Lock())
+
+    def exists(self, user_id: int) -> bool:
+        return isfile(self.get_path(user_id)) or self.legacy.exists(user_id)
+
+    def users(self) -> list[int]:
+        return list(set(super().users() + self.legacy.users()))
+
+    def migrate(self, user_id: int) -> bool:
+        if self.readonly or isfile(self.get_path(user_id)) or not self.legacy.exists(user_id):
+            return False
+        json_to_binary(self.legacy.get_path(user_id), self.get_path(user_id))
+        remove(self.legacy.get_path(user_id))
+        return True
+
+    # Read-only backends leave unmigrated users in the legacy json file.
+    def _unmigrated(self, user_id: int) -> bool:
+        return self.readonly and not isfile(self.get_path(user_id))
+
+    def _size(self, user_id: int) -> int:
+        self.migrate(user_id)
+        file_path = self.get_path(user_id)
+        if not isfile(file_path):
+            return 0
+        return (getsize(file_path) - HEADER.size) // RECORD.size
+
+    def _map(self, user_id: int) -> Optional[mmap]:
+        if self._size(user_id) == 0:
+            return None
+        with open(self.get_path(user_id), "rb") as f:
+            content = mmap(f.fileno(), 0, access=ACCESS_READ)
+        try:
+            check_header(content)
+        except:
+            content.close()
+            raise
+        return content
+
+    def read(self, user_id: int) -> SSHHistory:
+        with self.get_lock(user_id):
+            self.migrate(user_id)
+            file_path = self.get_path(user_id)
+            if not isfile(file_path):
+                return self.legacy.read(user_id)
+            with open(file_path, "rb") as f:
+                return load_binary(f.read())
+
+    def write(self, user_id: int, data: History) -> None:
+        with self.get_lock(user_id):
+            atomic_write(self.get_path(user_id), dump_binary(data))
+
+    def append(self, user_id: int, data: History) -> None:
+        record = pack_record(to_dicts(data[-1:])[0])
+        with self.get_lock(user_id):
+            size = self._size(user_id)
+            file_path = self.get_path(user_id)
+            if not isfile(file_path):
+                atomic_write(file_path, pack_header())
+            # Drop a torn record left behind by an interrupted append.
+            truncate(file_path, HEADER.size + size * RECORD.size)
+            with open(file_path, "ab") as f:
+                f.write(record)
+
+    def pop(self, user_id: int, data: History) -> None:
+        with self.get_lock(user_id):
+            size = self._size(user_id)
+            if size > 0:
+                truncate(self.get_path(user_id), HEADER.size + (size - 1) * RECORD.size)
+
+    def count(self, user_id: int) -> int:
+        if self._unmigrated(user_id):
+            return self.legacy.count(user_id)
+        with self.get_lock(user_id):
+            return self._size(user_id)
+
+    def get(self, user_id: int, index: int) -> SSHData:
+        with self.get_lock(user_id):
+            size = self._size(user_id)
+            if index < 0:
+                index += size
+            if not 0 <= index < size:
+                raise IndexError("record index out of range")
+            content = self._map(user_id)
+            try:
+                return unpack_record(content, HEADER.size + index * RECORD.size)
+            finally:
+                content.close()
+
+    def tail(self, user_id: int, offset: int, count: int) -> SSHHistory:
+        if self._unmigrated(user_id):
+            return self.legacy.tail(user_id, offset, count)
+        with self.get_lock(user_id):
+            size = self._size(user_id)
+            first, last = max(size - offset - count, 0), max(size - offset, 0)
+            if first >= last:
+                return SSHHistory()
+            content = self._map(user_id)
+            if content is None:
+                return SSHHistory()
+            try:
+                return load_binary(
+                    pack_header()
+                    + content[HEADER.size + first * RECORD.size:HEADER.size + last * RECORD.size]
+                )
+            finally:
+                content.close()
+
+    def latest(self, user_id: int) -> Optional[SSHData]:
+        if self._unmigrated(user_id):
+            return self.legacy.latest(user_id)
+        try:
+            return self.get(user_id, -1)
+        except IndexError:
+            return None
+
+    def range(self, user_id: int, start: int, stop: int) -> SSHHistory:
+        if self._unmigrated(user_id):
+            return self.legacy.range(user_id, start, stop)
+        with self.get_lock(user_id):
+            size = self._size(user_id)
+            content = self._map(user_id)
+            if content is None:
+                return SSHHistory()
+            try:
+                # Records are appended in time order, so bisect on the timestamp column.
+                def lower_bound(timestamp: int) -> int:
+                    lo, hi = 0, size
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        offset = HEADER.size + mid * RECORD.size + RECORD.size - 8
+                        if int.from_bytes(content[offset:offset + 8], "little", signed=True) < timestamp:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    return lo
+                first, last = lower_bound(start), lower_bound(stop)
+                return load_binary(
+                    pack_header()
+                    + content[HEADER.size + first * RECORD.size:HEADER.size + last * RECORD.size]
+                )
+            finally:
+                content.close()
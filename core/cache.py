@@ -0,0 +1,146 @@
+from asyncio import Task, current_task, get_running_loop, shield
+from collections import OrderedDict
+from copy import copy
+from time import monotonic
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from .history import History, SSHHistory
+
+# Measured with tracemalloc for one SSHData plus its list slot.
+RECORD_BYTES = 528
+
+
+def estimate_size(data: History) -> int:
+    if isinstance(data, SSHHistory):
+        return 360 + data.nbytes
+    return 56 + len(data) * RECORD_BYTES
+
+
+class HistoryCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 0) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[int, tuple[History, int]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, user_id: int) -> Optional[History]:
+        entry = self.entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(user_id)
+        return copy(entry[0])
+
+    def put(self, user_id: int, data: History) -> None:
+        if self.max_entries <= 0:
+            return
+        self.invalidate(user_id)
+        size = estimate_size(data)
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return
+        self.entries[user_id] = (copy(data), size)
+        self.size += size
+        while len(self.entries) > self.max_entries or (
+            self.max_bytes > 0 and self.size > self.max_bytes
+        ):
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        entry = self.entries.pop(user_id, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class TTLCache:
+    def __init__(self, ttl: float = 300, max_entries: int = 1024) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.inflight: dict[Hashable, Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        self.entries.pop(key, None)
+        self.entries[key] = (monotonic() + self.ttl, value)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # Callers asking for the same key while a fetch is running share its result.
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        value = self.get(key)
+        if value is not None:
+            return value
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = get_running_loop().create_task(self._fetch(key, fetch))
+        return await shield(task)
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        self.fetches += 1
+        try:
+            value = await fetch()
+            # An invalidation while fetching means the value may already be stale.
+            if value is not None and self.inflight.get(key) is current_task():
+                self.put(key, value)
+            return value
+        finally:
+            if self.inflight.get(key) is current_task():
+                del self.inflight[key]
+
+    def invalidate(self, key: Hashable) -> None:
+        self.entries.pop(key, None)
+        self.inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "fetches": self.fetches,
+        }
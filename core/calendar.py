@@ -0,0 +1,60 @@
+from bisect import bisect_right
+
+YEAR_DATA = {
+    "元": 1704038400,
+    "Co": 1708735983,
+    "高": 1709035411,
+}
+YEARS = list(YEAR_DATA.keys())
+YEARS.sort(key=lambda k: YEAR_DATA[k])
+YEAR_INDEX = {y: i for i, y in enumerate(YEARS)}
+YEAR_STARTS = [YEAR_DATA[y] for y in YEARS]
+
+# Month m has FBNC[m] days, MONTH_STARTS[m] is the ordinal of its first day.
+FBNC = [0, 1, 1]
+MONTH_STARTS = [0, 0, 1]
+
+
+def extend(month: int) -> None:
+    while len(FBNC) <= month:
+        FBNC.append(FBNC[-1] + FBNC[-2])
+    while len(MONTH_STARTS) <= month + 1:
+        m = len(MONTH_STARTS) - 1
+        MONTH_STARTS.append(MONTH_STARTS[m] + FBNC[m])
+
+
+# Everything a 64-bit day counter can reach.
+extend(92)
+
+
+def get_fbnc_num(n: int) -> int:
+    if n >= len(FBNC):
+        extend(n)
+    return FBNC[n]
+
+
+def to_ordinal(month: int, day: int) -> int:
+    if month + 1 >= len(MONTH_STARTS):
+        extend(month)
+    return MONTH_STARTS[month] + day - 1
+
+
+def from_ordinal(ordinal: int) -> tuple[int, int]:
+    while MONTH_STARTS[-1] <= ordinal:
+        extend(len(FBNC) * 2)
+    month = bisect_right(MONTH_STARTS, ordinal) - 1
+    return month, ordinal - MONTH_STARTS[month] + 1
+
+
+def next_day(month: int, day: int) -> tuple[int, int]:
+    if day + 1 > get_fbnc_num(month):
+        return month + 1, 1
+    return month, day + 1
+
+
+def year_index(timestamp: int) -> int:
+    return max(bisect_right(YEAR_STARTS, timestamp) - 1, 0)
+
+
+def year_of(timestamp: int) -> str:
+    return YEARS[year_index(timestamp)]
@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from os import makedirs, remove, truncate
+from os.path import dirname, getsize, isfile, join
+from threading import Lock
+from typing import Optional
+
+from .calendar import YEARS
+from .history import TYPES, History, SSHHistory
+from .model import record_bytes
+from .partition import user_dir
+from .storage import StorageBackend, atomic_write
+
+DIGEST_SIZE = 32
+GENESIS = bytes(DIGEST_SIZE)
+
+
+def iter_record_bytes(data: History, start: int = 0):
+    if isinstance(data, SSHHistory):
+        for i in range(start, len(data)):
+            yield record_bytes(
+                TYPES[data.types[i]],
+                YEARS[data.years[i]],
+                data.months[i],
+                data.days[i],
+                data.timestamps[i],
+            )
+    else:
+        for d in data[start:]:
+            yield record_bytes(d.type, d.year, d.month, d.day, d.timestamp)
+
+
+def link(previous: bytes, record: bytes) -> bytes:
+    return sha256(previous + record).digest()
+
+
+def build_chain(data: History, previous: bytes = GENESIS, start: int = 0) -> bytes:
+    digests = []
+    for record in iter_record_bytes(data, start):
+        previous = link(previous, record)
+        digests.append(previous)
+    return b"".join(digests)
+
+
+# `<user_id>.chain` holds one sha256(previous digest + record) per stored record.
+class ChainStore:
+    suffix = ".chain"
+
+    def __init__(self, data_dir: str, partitions: int = 0) -> None:
+        self.data_dir = data_dir
+        # Chains sit next to the history in the same partition directory.
+        self.partitions = partitions
+        self.locks: dict[int, Lock] = {}
+        # user id -> (chain length, tail digest)
+        self.tails: dict[int, tuple[int, bytes]] = {}
+
+    def get_lock(self, user_id: int) -> Lock:
+        return self.locks.setdefault(user_id, Lock())
+
+    def get_path(self, user_id: int) -> str:
+        return join(user_dir(self.data_dir, self.partitions, user_id), f"{user_id}{self.suffix}")
+
+    def make_dir(self, user_id: int) -> None:
+        if self.partitions > 0:
+            makedirs(dirname(self.get_path(user_id)), exist_ok=True)
+
+    def exists(self, user_id: int) -> bool:
+        return isfile(self.get_path(user_id))
+
+    def _tail(self, user_id: int) -> tuple[int, bytes]:
+        if user_id in self.tails:
+            return self.tails[user_id]
+        file_path = self.get_path(user_id)
+        if not isfile(file_path):
+            return 0, GENESIS
+        size = getsize(file_path) // DIGEST_SIZE
+        if size == 0:
+            return 0, GENESIS
+        with open(file_path, "rb") as f:
+            f.seek((size - 1) * DIGEST_SIZE)
+            tail = f.read(DIGEST_SIZE)
+        self.tails[user_id] = (size, tail)
+        return size, tail
+
+    def tail(self, user_id: int) -> Optional[bytes]:
+        with self.get_lock(user_id):
+            size, tail = self._tail(user_id)
+            return tail if size > 0 else None
+
+    def read(self, user_id: int) -> list[bytes]:
+        file_path = self.get_path(user_id)
+        if not isfile(file_path):
+            return []
+        with self.get_lock(user_id):
+            with open(file_path, "rb") as f:
+                content = f.read()
+        return [
+            content[i:i + DIGEST_SIZE]
+            for i in range(0, len(content) - DIGEST_SIZE + 1, DIGEST_SIZE)
+        ]
+
+    def write(self, user_id: int, data: History) -> None:
+        content = build_chain(data)
+        self.make_dir(user_id)
+        with self.get_lock(user_id):
+            atomic_write(self.get_path(user_id), content)
+            self.tails[user_id] = (len(data), content[-DIGEST_SIZE:] if content else GENESIS)
+
+    def append(self, user_id: int, data: History) -> None:
+        self.make_dir(user_id)
+        with self.get_lock(user_id):
+            size, tail = self._tail(user_id)
+            if size == 0 and len(data) > 1:
+                # Histories stored before chaining get their whole chain once.
+                content = build_chain(data)
+                atomic_write(self.get_path(user_id), content)
+                self.tails[user_id] = (len(data), content[-DIGEST_SIZE:])
+                return
+            digest = build_chain(data, tail, len(data) - 1)
+            file_path = self.get_path(user_id)
+            # Drop a torn digest left behind by an interrupted append.
+            if isfile(file_path):
+                truncate(file_path, size * DIGEST_SIZE)
+            with open(file_path, "ab") as f:
+                f.write(digest)
+            self.tails[user_id] = (size + 1, digest)
+
+    def pop(self, user_id: int, data: History) -> None:
+        with self.get_lock(user_id):
+            size, _ = self._tail(user_id)
+            self.tails.pop(user_id, None)
+            if size > 0:
+                truncate(self.get_path(user_id), (size - 1) * DIGEST_SIZE)
+
+    def delete(self, user_id: int) -> None:
+        with self.get_lock(user_id):
+            self.tails.pop(user_id, None)
+            if isfile(self.get_path(user_id)):
+                remove(self.get_path(user_id))
+
+    # Index of the first record whose link does not match, None if all do.
+    def verify(self, user_id: int, data: History) -> Optional[int]:
+        digests = self.read(user_id)
+        previous = GENESIS
+        for i, record in enumerate(iter_record_bytes(data)):
+            previous = link(previous, record)
+            if i >= len(digests) or digests[i] != previous:
+                return i
+        return len(data) if len(digests) > len(data) else None
+
+
+# user id -> first broken record index, -1 for users that have no chain yet.
+def verify_users(
+    storage: StorageBackend,
+    chain: ChainStore,
+    user_ids: list[int],
+    workers: Optional[int] = None
+) -> dict[int, Optional[int]]:
+    def verify_user(user_id: int) -> Optional[int]:
+        if not chain.exists(user_id):
+            return -1
+        return chain.verify(user_id, storage.read(user_id))
+    with ThreadPoolExecutor(workers, thread_name_prefix="ssh-verify") as pool:
+        return dict(zip(user_ids, pool.map(verify_user, user_ids)))
@@ -0,0 +1,249 @@
+import numpy as np
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from os import listdir, makedirs, remove, stat, utime
+from os.path import join
+from struct import pack
+from threading import Lock
+from typing import Optional
+from zlib import compress, crc32
+
+from .history import TYPE_INDEX, SSHHistory
+from .storage import atomic_write
+
+# Bump when the drawing changes so old images stop matching.
+CHART_VERSION = 1
+WIDTH = 800
+HEIGHT = 460
+LEFT = 44
+RIGHT = 12
+TOP = 12
+# Times of day on top, day lengths below.
+TIMES_HEIGHT = 260
+GAP = 28
+LENGTHS_HEIGHT = HEIGHT - TOP - TIMES_HEIGHT - GAP - 20
+LENGTH_SCALE = 36 * 3600
+
+BACKGROUND = (43, 45, 49)
+GRID = (70, 73, 79)
+AXIS = (181, 186, 193)
+WAKE_COLOR = (250, 166, 26)
+SLEEP_COLOR = (88, 101, 242)
+LENGTH_COLOR = (87, 242, 135)
+
+# 3x5 digits, one row per string.
+DIGITS = {
+    "0": ("111", "101", "101", "101", "111"),
+    "1": ("010", "110", "010", "010", "111"),
+    "2": ("111", "001", "111", "100", "111"),
+    "3": ("111", "001", "111", "001", "111"),
+    "4": ("101", "101", "111", "001", "001"),
+    "5": ("111", "100", "111", "001", "111"),
+    "6": ("111", "100", "111", "101", "111"),
+    "7": ("111", "001", "001", "001", "001"),
+    "8": ("111", "101", "111", "101", "111"),
+    "9": ("111", "101", "111", "001", "111"),
+}
+GLYPHS = {
+    digit: np.array([[c == "1" for c in row] for row in rows])
+    for digit, rows in DIGITS.items()
+}
+
+
+# (timestamp, type index) rows, the only thing the renderer needs.
+def history_pairs(data: SSHHistory) -> np.ndarray:
+    pairs = np.empty((len(data), 2), dtype=np.int64)
+    pairs[:, 0] = np.frombuffer(data.timestamps, dtype=np.int64)
+    pairs[:, 1] = np.frombuffer(data.types, dtype=np.uint8)
+    return pairs
+
+
+def chart_key(pairs: np.ndarray, days: int, first_day: int, tz: float) -> str:
+    digest = sha256(pack("<iiid", CHART_VERSION, days, first_day, tz))
+    digest.update(np.ascontiguousarray(pairs, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def draw_text(image: np.ndarray, text: str, x: int, y: int, color: tuple, scale: int = 2) -> None:
+    for i, char in enumerate(text):
+        glyph = np.kron(GLYPHS[char], np.ones((scale, scale), dtype=bool))
+        left = x + i * 4 * scale
+        region = image[y:y + glyph.shape[0], left:left + glyph.shape[1]]
+        region[glyph[:region.shape[0], :region.shape[1]]] = color
+
+
+def draw_points(image: np.ndarray, xs: np.ndarray, ys: np.ndarray, color: tuple, radius: int = 2) -> None:
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            image[
+                np.clip(ys + dy, 0, image.shape[0] - 1),
+                np.clip(xs + dx, 0, image.shape[1] - 1),
+            ] = color
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    height, width, _ = image.shape
+    # Filter type 0 in front of every scanline.
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, -1)
+
+    def chunk(tag: bytes, body: bytes) -> bytes:
+        return pack(">I", len(body)) + tag + body + pack(">I", crc32(tag + body))
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        chunk(b"IDAT", compress(raw.tobytes(), 6)),
+        chunk(b"IEND", b""),
+    ))
+
+
+# Runs in a worker process, everything below is vectorised over the records.
+def render_chart(pairs: np.ndarray, days: int, first_day: int, tz: float) -> bytes:
+    image = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    image[:] = BACKGROUND
+    plot_width = WIDTH - LEFT - RIGHT
+    lengths_top = TOP + TIMES_HEIGHT + GAP
+    lengths_bottom = lengths_top + LENGTHS_HEIGHT
+
+    for hour in range(0, 25, 6):
+        y = TOP + hour * (TIMES_HEIGHT - 1) // 24
+        image[y, LEFT:LEFT + plot_width] = GRID
+        draw_text(image, str(hour), 4, max(y - 5, 0), AXIS)
+    for hours in range(0, LENGTH_SCALE // 3600 + 1, 12):
+        y = lengths_bottom - hours * 3600 * LENGTHS_HEIGHT // LENGTH_SCALE
+        image[y, LEFT:LEFT + plot_width] = GRID
+        draw_text(image, str(hours), 4, y - 5, AXIS)
+    image[TOP:lengths_bottom + 1, LEFT - 1] = AXIS
+
+    local = pairs[:, 0] + int(tz * 3600)
+    day_index = local // 86400 - first_day
+    visible = (day_index >= 0) & (day_index < days)
+    xs = LEFT + ((day_index * 2 + 1) * plot_width // (days * 2))
+    ys = TOP + (local % 86400) * (TIMES_HEIGHT - 1) // 86400
+    for type_name, color in (("WAKE_UP", WAKE_COLOR), ("SLEEP", SLEEP_COLOR)):
+        mask = visible & (pairs[:, 1] == TYPE_INDEX[type_name])
+        draw_points(image, xs[mask], ys[mask], color)
+
+    # A day runs from one wake-up to the next and is drawn on the day it began.
+    wakes = np.sort(pairs[pairs[:, 1] == TYPE_INDEX["WAKE_UP"], 0])
+    heights = np.zeros(days, dtype=np.int64)
+    if len(wakes) > 1:
+        lengths = np.minimum(np.diff(wakes), LENGTH_SCALE)
+        starts = (wakes[:-1] + int(tz * 3600)) // 86400 - first_day
+        inside = (starts >= 0) & (starts < days)
+        heights[starts[inside]] = lengths[inside] * LENGTHS_HEIGHT // LENGTH_SCALE
+    columns = np.arange(plot_width)
+    column_day = columns * days // plot_width
+    # Leave a gap between neighbouring bars.
+    in_bar = (columns * days % plot_width) < plot_width * 3 // 4
+    rows = np.arange(lengths_top, lengths_bottom)[:, None]
+    bars = in_bar[None, :] & (rows >= lengths_bottom - heights[column_day][None, :])
+    image[lengths_top:lengths_bottom, LEFT:LEFT + plot_width][bars] = LENGTH_COLOR
+    image[lengths_bottom, LEFT:LEFT + plot_width] = AXIS
+    return encode_png(image)
+
+
+# Rendered PNGs on disk, keyed by chart_key and evicted least recently used
+# first once they pass `max_bytes`.
+class ChartCache:
+    suffix = ".png"
+
+    def __init__(self, directory: str, max_bytes: int = 64 << 20) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.entries: OrderedDict[str, int] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        makedirs(directory, exist_ok=True)
+        found = []
+        for file_name in listdir(directory):
+            if file_name.endswith(self.suffix):
+                info = stat(join(directory, file_name))
+                found.append((info.st_mtime, file_name[:-len(self.suffix)], info.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.size += size
+
+    def get_path(self, key: str) -> str:
+        return join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        try:
+            with open(self.get_path(key), "rb") as f:
+                content = f.read()
+            # The mtime keeps the recency order across restarts.
+            utime(self.get_path(key))
+        except FileNotFoundError:
+            with self.lock:
+                self.size -= self.entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return content
+
+    def put(self, key: str, content: bytes) -> None:
+        if self.max_bytes <= 0 or len(content) > self.max_bytes:
+            return
+        atomic_write(self.get_path(key), content)
+        with self.lock:
+            self.size -= self.entries.pop(key, 0)
+            self.entries[key] = len(content)
+            self.size += len(content)
+            evicted = []
+            while self.size > self.max_bytes:
+                old_key, old_size = self.entries.popitem(last=False)
+                self.size -= old_size
+                self.evictions += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                remove(self.get_path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ChartRenderer:
+    def __init__(self, cache: ChartCache, workers: int = 1) -> None:
+        self.cache = cache
+        self.workers = workers
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.lock = Lock()
+
+    # Blocking, call it from a job thread. Cache hits never reach the pool.
+    def render(self, pairs: np.ndarray, days: int, first_day: int, tz: float) -> bytes:
+        key = chart_key(pairs, days, first_day, tz)
+        content = self.cache.get(key)
+        if content is None:
+            with self.lock:
+                if self.pool is None:
+                    self.pool = ProcessPoolExecutor(self.workers)
+                pool = self.pool
+            content = pool.submit(render_chart, pairs, days, first_day, tz).result()
+            self.cache.put(key, content)
+        return content
+
+    def close(self) -> None:
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
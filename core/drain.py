@@ -0,0 +1,84 @@
+from orjson import dumps, loads
+
+from asyncio import Event, TimeoutError, wait_for
+from os import remove
+from os.path import isfile
+from time import time
+from traceback import print_exc
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from .storage import atomic_write
+
+
+# Counts interactions being handled so a shutdown can wait for them. Nothing
+# here touches discord, any asyncio loop can drive it.
+class Drain:
+    def __init__(self) -> None:
+        self.accepting = True
+        self.reason: Optional[str] = None
+        self.inflight = 0
+        self.idle = Event()
+        self.idle.set()
+
+    def enter(self) -> bool:
+        if not self.accepting:
+            return False
+        self.inflight += 1
+        self.idle.clear()
+        return True
+
+    def exit(self) -> None:
+        self.inflight -= 1
+        if self.inflight == 0:
+            self.idle.set()
+
+    # False if a shutdown has started already.
+    def close(self, reason: str) -> bool:
+        if not self.accepting:
+            return False
+        self.accepting = False
+        self.reason = reason
+        return True
+
+    async def wait(self, timeout: float) -> int:
+        try:
+            await wait_for(self.idle.wait(), timeout)
+        except TimeoutError:
+            pass
+        return self.inflight
+
+    # Returns how many interactions were still running at the deadline.
+    async def shutdown(self, timeout: float, flushers: Iterable[Callable[[], Awaitable[Any]]]) -> int:
+        self.close("shutdown")
+        abandoned = await self.wait(timeout)
+        for flush in flushers:
+            try:
+                await flush()
+            except:
+                print_exc()
+        return abandoned
+
+
+drain = Drain()
+
+
+def save_restart(file_path: str, reason: str, abandoned: int, seconds: float) -> None:
+    atomic_write(file_path, dumps({
+        "reason": reason,
+        "stopped": time(),
+        "abandoned": abandoned,
+        "drain_seconds": seconds,
+    }))
+
+
+# Read once by the next process, a stale file would misreport later starts.
+def load_restart(file_path: str) -> Optional[dict[str, Any]]:
+    if not isfile(file_path):
+        return None
+    try:
+        with open(file_path, "rb") as f:
+            return loads(f.read())
+    except:
+        return None
+    finally:
+        remove(file_path)
@@ -0,0 +1,103 @@
+from orjson import dumps
+
+from csv import writer
+from io import StringIO
+from lzma import LZMACompressor
+from tempfile import SpooledTemporaryFile
+from typing import IO, Iterator, Literal
+from zlib import Z_DEFAULT_COMPRESSION, compressobj
+
+from .calendar import YEARS
+from .history import TYPES, SSHHistory
+
+FIELDS = ("type", "year", "month", "day", "timestamp")
+FORMAT = Literal["json", "jsonl", "csv"]
+COMPRESSION = Literal["none", "gzip", "lzma"]
+EXTENSIONS = {
+    "json": ".json",
+    "jsonl": ".jsonl",
+    "csv": ".csv",
+    "none": "",
+    "gzip": ".gz",
+    "lzma": ".xz",
+}
+CHUNK_RECORDS = 1024
+# Exports stay in memory up to this size before spilling to a temporary file.
+SPOOL_BYTES = 1 << 20
+
+
+def iter_rows(data: SSHHistory, chunk_records: int = CHUNK_RECORDS) -> Iterator[list[tuple]]:
+    for start in range(0, len(data), chunk_records):
+        part = slice(start, start + chunk_records)
+        yield [
+            (TYPES[t], YEARS[y], m, d, ts)
+            for t, y, m, d, ts in zip(
+                data.types[part],
+                data.years[part],
+                data.months[part],
+                data.days[part],
+                data.timestamps[part],
+            )
+        ]
+
+
+def iter_json(data: SSHHistory, lines: bool = False) -> Iterator[bytes]:
+    separator = b"\n" if lines else b","
+    first = True
+    if not lines:
+        yield b"["
+    for rows in iter_rows(data):
+        chunk = separator.join(dumps(dict(zip(FIELDS, row))) for row in rows)
+        if lines:
+            yield chunk + b"\n"
+        else:
+            yield chunk if first else separator + chunk
+        first = False
+    if not lines:
+        yield b"]"
+
+
+def iter_csv(data: SSHHistory) -> Iterator[bytes]:
+    buffer = StringIO()
+    csv_writer = writer(buffer, lineterminator="\n")
+    csv_writer.writerow(FIELDS)
+    for rows in iter_rows(data):
+        csv_writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell() > 0:
+        yield buffer.getvalue().encode()
+
+
+def iter_export(data: SSHHistory, format_: FORMAT) -> Iterator[bytes]:
+    if format_ == "csv":
+        return iter_csv(data)
+    return iter_json(data, lines=format_ == "jsonl")
+
+
+def compress(chunks: Iterator[bytes], compression: COMPRESSION) -> Iterator[bytes]:
+    if compression == "none":
+        yield from chunks
+        return
+    if compression == "gzip":
+        compressor = compressobj(Z_DEFAULT_COMPRESSION, wbits=31)
+    else:
+        compressor = LZMACompressor()
+    for chunk in chunks:
+        output = compressor.compress(chunk)
+        if output:
+            yield output
+    yield compressor.flush()
+
+
+def export_name(name: str, format_: FORMAT, compression: COMPRESSION) -> str:
+    return name + EXTENSIONS[format_] + EXTENSIONS[compression]
+
+
+def export_file(data: SSHHistory, format_: FORMAT, compression: COMPRESSION) -> IO[bytes]:
+    f = SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    for chunk in compress(iter_export(data, format_), compression):
+        f.write(chunk)
+    f.seek(0)
+    return f
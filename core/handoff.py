@@ -0,0 +1,21 @@
+from typing import Any, Optional
+
+# Outlives extension reloads, since only the cog modules are re-imported.
+# Keyed by module path.
+stashed: dict[str, tuple[int, dict[str, Any]]] = {}
+# Modules being reloaded, with the state version their cog will hand over.
+reloading: dict[str, int] = {}
+
+
+def stash(name: str, version: int, state: dict[str, Any]) -> None:
+    stashed[name] = (version, state)
+
+
+def claim(name: str) -> Optional[tuple[int, dict[str, Any]]]:
+    return stashed.pop(name, None)
+
+
+# Whether the module being imported will be handed the running state, so it
+# need not open its own.
+def pending(name: str, version: int) -> bool:
+    return version > 0 and reloading.get(name) == version
@@ -0,0 +1,150 @@
+from array import array
+from typing import Iterable, Iterator, Optional, Union, overload
+
+from .calendar import YEAR_INDEX, YEARS
+from .model import SSHData
+
+TYPES = ("WAKE_UP", "SLEEP")
+TYPE_INDEX = {t: i for i, t in enumerate(TYPES)}
+
+
+class SSHHistory:
+    __slots__ = ("types", "years", "months", "days", "timestamps")
+
+    def __init__(self, records: Iterable[Union[SSHData, dict]] = ()) -> None:
+        self.types = array("B")
+        self.years = array("B")
+        self.months = array("H")
+        self.days = array("I")
+        self.timestamps = array("q")
+        for record in records:
+            self.append(record)
+
+    @classmethod
+    def from_dicts(cls, records: Iterable[dict]) -> "SSHHistory":
+        history = cls()
+        for record in records:
+            history.append_values(
+                record["type"],
+                record["year"],
+                record["month"],
+                record["day"],
+                record["timestamp"],
+            )
+        return history
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[str, str, int, int, int]]) -> "SSHHistory":
+        history = cls()
+        for row in rows:
+            history.append_values(*row)
+        return history
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __bool__(self) -> bool:
+        return len(self.timestamps) > 0
+
+    @overload
+    def __getitem__(self, index: int) -> SSHData: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "SSHHistory": ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            history = SSHHistory()
+            history.types = self.types[index]
+            history.years = self.years[index]
+            history.months = self.months[index]
+            history.days = self.days[index]
+            history.timestamps = self.timestamps[index]
+            return history
+        # Records come from our own storage, skip re-validating them.
+        return SSHData.model_construct(
+            type=TYPES[self.types[index]],
+            year=YEARS[self.years[index]],
+            month=self.months[index],
+            day=self.days[index],
+            timestamp=self.timestamps[index],
+        )
+
+    def __iter__(self) -> Iterator[SSHData]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __copy__(self) -> "SSHHistory":
+        return self[:]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SSHHistory):
+            return NotImplemented
+        return all(
+            getattr(self, field) == getattr(other, field)
+            for field in self.__slots__
+        )
+
+    @property
+    def latest(self) -> Optional[SSHData]:
+        return self[-1] if len(self) > 0 else None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            len(column) * column.itemsize
+            for column in map(lambda field: getattr(self, field), self.__slots__)
+        )
+
+    def append(self, data: Union[SSHData, dict]) -> None:
+        if isinstance(data, dict):
+            data = SSHData(**data)
+        self.append_values(data.type, data.year, data.month, data.day, data.timestamp)
+
+    def append_values(self, type_: str, year: str, month: int, day: int, timestamp: int) -> None:
+        self.types.append(TYPE_INDEX[type_])
+        self.years.append(YEAR_INDEX[year])
+        self.months.append(month)
+        self.days.append(day)
+        self.timestamps.append(timestamp)
+
+    def extend(self, records: Iterable[Union[SSHData, dict]]) -> None:
+        for record in records:
+            self.append(record)
+
+    def truncate(self, size: int) -> None:
+        for field in self.__slots__:
+            del getattr(self, field)[size:]
+
+    def copy(self) -> "SSHHistory":
+        return self[:]
+
+    def to_list(self) -> list[SSHData]:
+        return list(self)
+
+    def to_dicts(self) -> list[dict]:
+        return [
+            {
+                "type": TYPES[t],
+                "year": YEARS[y],
+                "month": m,
+                "day": d,
+                "timestamp": ts,
+            }
+            for t, y, m, d, ts in zip(
+                self.types,
+                self.years,
+                self.months,
+                self.days,
+                self.timestamps,
+            )
+        ]
+
+
+History = Union[list[SSHData], SSHHistory]
+
+
+def to_dicts(data: History) -> list[dict]:
+    if isinstance(data, SSHHistory):
+        return data.to_dicts()
+    return [d if isinstance(d, dict) else d.model_dump() for d in data]
@@ -0,0 +1,60 @@
+from asyncio import wrap_future
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable
+
+from .metrics import metrics
+
+
+class JobLimitError(Exception):
+    pass
+
+
+class JobPool:
+    def __init__(self, workers: int = 2, per_user: int = 1, max_jobs: int = 16) -> None:
+        self.workers = workers
+        self.per_user = per_user
+        self.max_jobs = max_jobs
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="ssh-job")
+        self.active: dict[int, int] = {}
+        self.futures: set[Future] = set()
+        self.closed = False
+
+    # Jobs accepted and not finished yet, running or waiting for a worker.
+    @property
+    def depth(self) -> int:
+        return len(self.futures)
+
+    async def run(self, user_id: int, name: str, func: Callable[..., Any], *args: Any) -> Any:
+        if self.closed:
+            raise JobLimitError("job pool is closed")
+        if self.active.get(user_id, 0) >= self.per_user:
+            raise JobLimitError("too many jobs for this user")
+        if len(self.futures) >= self.max_jobs:
+            raise JobLimitError("too many jobs")
+        submitted = perf_counter()
+
+        def job():
+            metrics.observe("ssh_job_wait_seconds", perf_counter() - submitted, job=name)
+            with metrics.timer("ssh_job_seconds", job=name):
+                return func(*args)
+        future = self.executor.submit(job)
+        self.futures.add(future)
+        self.active[user_id] = self.active.get(user_id, 0) + 1
+        metrics.set_gauge("ssh_job_depth", len(self.futures))
+        try:
+            return await wrap_future(future)
+        finally:
+            self.futures.discard(future)
+            self.active[user_id] -= 1
+            if self.active[user_id] == 0:
+                del self.active[user_id]
+            metrics.set_gauge("ssh_job_depth", len(self.futures))
+
+    # Waiting jobs are dropped and their callers get CancelledError, running
+    # ones finish in the background and their results are discarded.
+    def close(self) -> None:
+        self.closed = True
+        for future in list(self.futures):
+            future.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,186 @@
+from concurrent.futures import ProcessPoolExecutor
+from heapq import nlargest
+from os.path import isfile, join
+from struct import Struct
+from threading import Lock
+from typing import Callable, Literal, NamedTuple, Optional
+
+from .calendar import YEAR_INDEX, YEARS, to_ordinal
+from .history import TYPES, TYPE_INDEX, History
+from .stats import UserStats
+from .storage import StorageBackend, atomic_write, get_storage
+
+MAGIC = b"SSHL"
+VERSION = 1
+# magic, version, entry size
+HEADER = Struct("<4sHH")
+# user id, type, year index, month, day, timestamp, days, sleep count, sleep total
+ENTRY = Struct("<qBBHIqIIq")
+RANK_BY = Literal["date", "days", "sleep"]
+
+
+class Summary(NamedTuple):
+    user_id: int
+    type: int
+    year_index: int
+    month: int
+    day: int
+    timestamp: int
+    days: int
+    sleep_count: int
+    sleep_total: int
+
+    @classmethod
+    def build(cls, user_id: int, data: History, stats: UserStats) -> Optional["Summary"]:
+        if len(data) == 0:
+            return None
+        latest = data[-1]
+        return cls(
+            user_id,
+            TYPE_INDEX[latest.type],
+            YEAR_INDEX[latest.year],
+            latest.month,
+            latest.day,
+            latest.timestamp,
+            stats.day.count,
+            stats.sleep.count,
+            stats.sleep.total,
+        )
+
+    @property
+    def date(self) -> str:
+        return f"{YEARS[self.year_index]}年 {self.month} 月 {self.day} 日"
+
+    @property
+    def type_name(self) -> str:
+        return TYPES[self.type]
+
+    @property
+    def sleep_mean(self) -> float:
+        return self.sleep_total / self.sleep_count if self.sleep_count > 0 else 0
+
+
+RANK_KEYS: dict[str, Callable[[Summary], tuple]] = {
+    "date": lambda s: (s.year_index, to_ordinal(s.month, s.day), -s.timestamp),
+    "days": lambda s: (s.days, -s.timestamp),
+    "sleep": lambda s: (s.sleep_mean, s.sleep_count),
+}
+
+
+class LeaderboardIndex:
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.entries: dict[int, Summary] = {}
+        self.lock = Lock()
+        self.dirty = False
+        # False until the index holds every user, either loaded or rebuilt.
+        self.complete = self.load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self) -> bool:
+        if not isfile(self.file_path):
+            return False
+        with open(self.file_path, "rb") as f:
+            content = f.read()
+        magic, version, entry_size = HEADER.unpack_from(content)
+        if magic != MAGIC or version != VERSION or entry_size != ENTRY.size:
+            return False
+        end = len(content) - (len(content) - HEADER.size) % ENTRY.size
+        self.entries = {
+            entry[0]: Summary(*entry)
+            for entry in ENTRY.iter_unpack(content[HEADER.size:end])
+        }
+        return True
+
+    def update(self, user_id: int, summary: Optional[Summary]) -> None:
+        if summary is None:
+            self.entries.pop(user_id, None)
+        else:
+            self.entries[user_id] = summary
+        self.dirty = True
+
+    def replace(self, summaries: list[Summary]) -> None:
+        self.entries = {summary.user_id: summary for summary in summaries}
+        self.dirty = True
+        self.complete = True
+
+    # Saves that pile up behind a running one find nothing left to write.
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            entries = list(self.entries.values())
+            atomic_write(
+                self.file_path,
+                HEADER.pack(MAGIC, VERSION, ENTRY.size)
+                + b"".join(ENTRY.pack(*entry) for entry in entries)
+            )
+
+    def top(
+        self,
+        k: int,
+        rank_by: RANK_BY = "date",
+        include: Optional[Callable[[int], bool]] = None
+    ) -> list[Summary]:
+        entries = self.entries.values()
+        if include is not None:
+            entries = filter(lambda s: include(s.user_id), entries)
+        return nlargest(k, entries, key=RANK_KEYS[rank_by])
+
+    def rank(self, user_id: int, rank_by: RANK_BY = "date") -> Optional[int]:
+        summary = self.entries.get(user_id)
+        if summary is None:
+            return None
+        key = RANK_KEYS[rank_by]
+        target = key(summary)
+        return 1 + sum(1 for s in self.entries.values() if key(s) > target)
+
+
+def index_path(data_dir: str, worker: int = -1) -> str:
+    if worker < 0:
+        return join(data_dir, "leaderboard.idx")
+    return join(data_dir, f"leaderboard.{worker}.idx")
+
+
+# Every bot worker writes only the index of the users it owns, rankings read
+# the others' files as they were last saved.
+def merge_indexes(index: LeaderboardIndex, file_paths: list[str]) -> LeaderboardIndex:
+    merged = LeaderboardIndex("")
+    for file_path in file_paths:
+        merged.entries.update(LeaderboardIndex(file_path).entries)
+    merged.entries.update(index.entries)
+    return merged
+
+
+# Each scan worker opens the storage once and keeps it for every user it gets.
+worker_storage: Optional[StorageBackend] = None
+
+
+def open_worker_storage(mode: str, data_dir: str, partitions: int = 0) -> None:
+    global worker_storage
+    worker_storage = get_storage(mode, data_dir, partitions)
+
+
+def summarize_user(user_id: int) -> Optional[Summary]:
+    data = worker_storage.read(user_id)
+    return Summary.build(user_id, data, UserStats.scan(data))
+
+
+def scan_summaries(
+    mode: str,
+    data_dir: str,
+    user_ids: list[int],
+    workers: Optional[int] = None,
+    chunk_size: int = 32,
+    partitions: int = 0,
+) -> list[Summary]:
+    with ProcessPoolExecutor(
+        workers,
+        initializer=open_worker_storage,
+        initargs=(mode, data_dir, partitions)
+    ) as pool:
+        results = pool.map(summarize_user, user_ids, chunksize=chunk_size)
+        return [summary for summary in results if summary is not None]
@@ -0,0 +1,134 @@
+from os import listdir, utime
+from os.path import basename, getmtime, isfile, join
+from typing import NamedTuple, Optional
+
+from .calendar import YEAR_INDEX, next_day, year_of
+from .history import SSHHistory
+from .rebuild import Checkpoint, rebuild_history
+
+# notokenhere.py kept `name/<who>.txt` with one line per day:
+#   S/元年/1/1/            the day started (WAKE_UP)
+#   E/元年/1/1// 5:3:2     the day ended (SLEEP) after h:m:s awake
+NAME_DIR = "name"
+NAME_LIST = "namelist.txt"
+DEFAULT_DAY = 16 * 3600
+DEFAULT_SLEEP = 8 * 3600
+
+
+class LegacyLine(NamedTuple):
+    type: str
+    year: str
+    month: int
+    day: int
+    # Seconds awake, only known on E lines.
+    duration: Optional[int]
+
+
+class LegacyResult(NamedTuple):
+    name: str
+    history: SSHHistory
+    checkpoint: Optional[Checkpoint]
+    skipped: int
+
+
+def read_names(legacy_dir: str) -> list[str]:
+    list_path = join(legacy_dir, NAME_LIST)
+    if isfile(list_path):
+        with open(list_path, "r", encoding="utf-8") as f:
+            names = [line.rstrip("\n") for line in f]
+    else:
+        names = [
+            file_name[:-4]
+            for file_name in listdir(join(legacy_dir, NAME_DIR))
+            if file_name.endswith(".txt")
+        ]
+    return [name for name in names if name and isfile(get_legacy_path(legacy_dir, name))]
+
+
+def get_legacy_path(legacy_dir: str, name: str) -> str:
+    return join(legacy_dir, NAME_DIR, f"{name}.txt")
+
+
+def parse_duration(text: str) -> Optional[int]:
+    try:
+        hours, minutes, seconds = map(int, text.strip().split(":"))
+    except:
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def parse_line(line: str) -> Optional[LegacyLine]:
+    parts = line.rstrip("\n").split("/")
+    if len(parts) < 4 or parts[0] not in ("S", "E"):
+        return None
+    try:
+        month, day = int(parts[2]), int(parts[3])
+    except:
+        return None
+    duration = parse_duration(parts[-1]) if parts[0] == "E" and len(parts) >= 6 else None
+    return LegacyLine(
+        "WAKE_UP" if parts[0] == "S" else "SLEEP",
+        parts[1].removesuffix("年"),
+        month,
+        day,
+        duration,
+    )
+
+
+# Only awake spans were recorded, so timestamps are laid out backwards from
+# `anchor` (the last write), guessing `sleep` seconds for every night.
+def parse_legacy(
+    lines: list[str],
+    anchor: int,
+    sleep: int = DEFAULT_SLEEP
+) -> tuple[SSHHistory, int]:
+    records = list(filter(None, map(parse_line, lines)))
+    timestamps = [0] * len(records)
+    timestamp = anchor
+    for i in range(len(records) - 1, -1, -1):
+        timestamps[i] = timestamp
+        if records[i].type == "SLEEP":
+            timestamp -= records[i].duration if records[i].duration is not None else DEFAULT_DAY
+        else:
+            timestamp -= sleep
+    history = SSHHistory()
+    for record, timestamp in zip(records, timestamps):
+        history.append_values(
+            record.type,
+            record.year if record.year in YEAR_INDEX else year_of(timestamp),
+            record.month,
+            record.day,
+            timestamp,
+        )
+    return history, len(lines) - len(records)
+
+
+def load_legacy(path: str, sleep: int = DEFAULT_SLEEP) -> LegacyResult:
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    history, skipped = parse_legacy(lines, int(getmtime(path)), sleep)
+    checkpoint = rebuild_history(history)
+    return LegacyResult(basename(path)[:-4], history, checkpoint, skipped)
+
+
+# The reverse of load_legacy, for building fixtures. `awake` holds the seconds
+# awake of each finished day, `started` adds a day with no end yet.
+def write_legacy(
+    legacy_dir: str,
+    name: str,
+    awake: list[int],
+    started: bool = False,
+    mtime: int = 1708000000,
+) -> None:
+    lines = []
+    month, day = 1, 1
+    for seconds in awake:
+        lines.append(f"S/元年/{month}/{day}/\n")
+        lines.append(f"E/元年/{month}/{day}// {seconds // 3600}:{seconds % 3600 // 60}:{seconds % 60}\n")
+        month, day = next_day(month, day)
+    if started:
+        lines.append(f"S/元年/{month}/{day}/\n")
+    path = get_legacy_path(legacy_dir, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    utime(path, (mtime, mtime))
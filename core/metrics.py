@@ -0,0 +1,147 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Iterator
+
+# Upper bounds in seconds, the last bucket catches everything above.
+BUCKETS = (
+    0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5,
+    1, 2.5, 5,
+    10, float("inf"),
+)
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    # Interpolated inside the bucket, like Prometheus' histogram_quantile.
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count > 0:
+                lower = BUCKETS[i - 1] if i > 0 else 0
+                upper = BUCKETS[i] if BUCKETS[i] != float("inf") else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-2]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+        self.gauges: dict[str, dict[Labels, float]] = {}
+        # Refresh gauges that are cheaper to read on demand than to keep current.
+        self.collectors: dict[str, Callable[[], None]] = {}
+        self.lock = Lock()
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self.lock:
+            self.gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def add_collector(self, name: str, collect: Callable[[], None]) -> None:
+        self.collectors[name] = collect
+
+    def remove_collector(self, name: str) -> None:
+        self.collectors.pop(name, None)
+
+    def collect(self) -> None:
+        for collect in list(self.collectors.values()):
+            collect()
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        begin = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - begin, **labels)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.histograms.clear()
+
+    def summary(self) -> list[dict]:
+        with self.lock:
+            return [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                }
+                for name, series in sorted(self.histograms.items())
+                for labels, histogram in sorted(series.items())
+            ]
+
+    def gauge_summary(self) -> list[dict]:
+        self.collect()
+        with self.lock:
+            return [
+                {"name": name, "labels": dict(labels), "value": value}
+                for name, series in sorted(self.gauges.items())
+                for labels, value in sorted(series.items())
+            ]
+
+    def to_prometheus(self) -> str:
+        self.collect()
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.total}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+# Lives outside the cogs so the numbers survive a reload.
+metrics = Registry()
@@ -0,0 +1,41 @@
+from orjson import dumps
+from pydantic import BaseModel, Field
+
+from datetime import datetime
+from functools import lru_cache
+from hashlib import sha256
+from typing import Literal
+
+from .calendar import FBNC, YEAR_DATA, YEARS, get_fbnc_num
+
+
+class SSHData(BaseModel):
+    type: Literal["WAKE_UP", "SLEEP"]
+    year: str = YEARS[-1]
+    month: int = 1
+    day: int = 1
+    timestamp: int = Field(
+        default_factory=lambda: int(datetime.utcnow().timestamp())
+    )
+
+    def get_hash(self) -> str:
+        return record_hash(self.type, self.year, self.month, self.day, self.timestamp)
+
+    @property
+    def date(self) -> str:
+        return f"{self.year}年 {self.month} 月 {self.day} 日"
+
+
+def record_bytes(type_: str, year: str, month: int, day: int, timestamp: int) -> bytes:
+    return dumps({
+        "type": type_,
+        "year": year,
+        "month": month,
+        "day": day,
+        "timestamp": timestamp,
+    })
+
+
+@lru_cache(maxsize=1 << 16)
+def record_hash(type_: str, year: str, month: int, day: int, timestamp: int) -> str:
+    return sha256(record_bytes(type_, year, month, day, timestamp)).hexdigest()
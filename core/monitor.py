@@ -0,0 +1,71 @@
+from asyncio import AbstractEventLoop, TimerHandle
+from sys import _current_frames, stderr
+from threading import Event, Thread, get_ident
+from time import monotonic
+from traceback import format_stack
+from typing import Optional
+
+from .metrics import metrics
+
+
+# A heartbeat scheduled on the loop and a watchdog thread that dumps the loop
+# thread's stack when the heartbeat has been late for longer than `threshold`.
+class LoopMonitor:
+    def __init__(self, threshold: float = 0.25, interval: Optional[float] = None) -> None:
+        self.threshold = threshold
+        self.interval = interval or threshold / 4
+        self.loop: Optional[AbstractEventLoop] = None
+        self.loop_thread = 0
+        self.beat = monotonic()
+        self.reported = False
+        self.stalls = 0
+        self.handle: Optional[TimerHandle] = None
+        self.stopped = Event()
+        self.watchdog: Optional[Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self.watchdog is not None
+
+    # Call from the loop thread.
+    def start(self, loop: AbstractEventLoop) -> None:
+        if self.running:
+            return
+        self.loop = loop
+        self.loop_thread = get_ident()
+        self.stopped.clear()
+        self.beat = monotonic()
+        self.handle = loop.call_later(self.interval, self._heartbeat, self.beat + self.interval)
+        self.watchdog = Thread(target=self._watch, name="ssh-loop-monitor", daemon=True)
+        self.watchdog.start()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.stopped.set()
+        if self.handle is not None:
+            self.handle.cancel()
+        self.watchdog.join()
+        self.watchdog = self.handle = None
+
+    def _heartbeat(self, expected: float) -> None:
+        now = monotonic()
+        metrics.observe("ssh_loop_lag_seconds", max(now - expected, 0))
+        self.beat = now
+        self.reported = False
+        self.handle = self.loop.call_later(self.interval, self._heartbeat, now + self.interval)
+
+    def _watch(self) -> None:
+        while not self.stopped.wait(self.interval):
+            lag = monotonic() - self.beat - self.interval
+            if lag < self.threshold or self.reported:
+                continue
+            self.reported = True
+            self.stalls += 1
+            frame = _current_frames().get(self.loop_thread)
+            stack = "".join(format_stack(frame)) if frame is not None else "  <no frame>\n"
+            print(
+                f"Event loop blocked for {lag:.3f}s (threshold {self.threshold:.3f}s):\n{stack}",
+                file=stderr,
+            )
+
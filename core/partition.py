@@ -0,0 +1,132 @@
+from os import makedirs
+from os.path import join
+from threading import Lock
+from typing import Iterable, Optional
+from zlib import crc32
+
+from .history import History, SSHHistory
+from .model import SSHData
+from .storage import StorageBackend
+
+PARTITION_DIR = "partitions"
+
+
+class PartitionError(Exception):
+    pass
+
+
+# Snowflakes are mostly timestamp, hashing spreads neighbouring ids evenly.
+def partition_of(user_id: int, partitions: int) -> int:
+    return crc32(user_id.to_bytes(8, "little")) % partitions
+
+
+def partition_dir(data_dir: str, index: int) -> str:
+    return join(data_dir, PARTITION_DIR, f"{index:03d}")
+
+
+def user_dir(data_dir: str, partitions: int, user_id: int) -> str:
+    if partitions <= 0:
+        return data_dir
+    return partition_dir(data_dir, partition_of(user_id, partitions))
+
+
+# Worker `worker` of `workers` owns every partition congruent to it, None is
+# every partition (single process) and -1 is none (the router).
+def owned_partitions(partitions: int, workers: int, worker: int) -> Optional[frozenset[int]]:
+    if workers <= 0:
+        return None
+    return frozenset(index for index in range(partitions) if index % workers == worker)
+
+
+def worker_of(user_id: int, partitions: int, workers: int) -> int:
+    return partition_of(user_id, partitions) % workers
+
+
+# One backend per partition directory, opened on first use. Users outside
+# `owned` are refused, so two processes never write the same files.
+class PartitionedStorage(StorageBackend):
+    def __init__(
+        self,
+        backend_type: type[StorageBackend],
+        data_dir: str,
+        partitions: int,
+        owned: Optional[Iterable[int]] = None,
+    ) -> None:
+        self.backend_type = backend_type
+        self.appendable = backend_type.appendable
+        self.seekable = backend_type.seekable
+        self.data_dir = data_dir
+        self.partitions = partitions
+        self.owned = frozenset(range(partitions) if owned is None else owned)
+        self.backends: dict[int, StorageBackend] = {}
+        self.lock = Lock()
+
+    # Reads may open any partition, read-only outside `owned`. Writes may not.
+    def backend(self, index: int, write: bool = False) -> StorageBackend:
+        if write and index not in self.owned:
+            raise PartitionError(f"partition {index} is owned by another worker")
+        backend = self.backends.get(index)
+        if backend is None:
+            with self.lock:
+                backend = self.backends.get(index)
+                if backend is None:
+                    makedirs(partition_dir(self.data_dir, index), exist_ok=True)
+                    backend = self.backend_type(partition_dir(self.data_dir, index))
+                    backend.readonly = index not in self.owned
+                    self.backends[index] = backend
+        return backend
+
+    def owns(self, user_id: int) -> bool:
+        return partition_of(user_id, self.partitions) in self.owned
+
+    def get(self, user_id: int, write: bool = False) -> StorageBackend:
+        return self.backend(partition_of(user_id, self.partitions), write)
+
+    def exists(self, user_id: int) -> bool:
+        return self.get(user_id).exists(user_id)
+
+    def users(self) -> list[int]:
+        return [
+            user_id
+            for index in sorted(self.owned)
+            for user_id in self.backend(index).users()
+        ]
+
+    def read(self, user_id: int) -> SSHHistory:
+        return self.get(user_id).read(user_id)
+
+    def write(self, user_id: int, data: History) -> None:
+        self.get(user_id, True).write(user_id, data)
+
+    def append(self, user_id: int, data: History) -> None:
+        self.get(user_id, True).append(user_id, data)
+
+    def pop(self, user_id: int, data: History) -> None:
+        self.get(user_id, True).pop(user_id, data)
+
+    def latest(self, user_id: int) -> Optional[SSHData]:
+        return self.get(user_id).latest(user_id)
+
+    def count(self, user_id: int) -> int:
+        return self.get(user_id).count(user_id)
+
+    def tail(self, user_id: int, offset: int, count: int) -> SSHHistory:
+        return self.get(user_id).tail(user_id, offset, count)
+
+    def range(self, user_id: int, start: int, stop: int) -> SSHHistory:
+        return self.get(user_id).range(user_id, start, stop)
+
+    def read_meta(self, user_id: int, name: str) -> Optional[dict]:
+        return self.get(user_id).read_meta(user_id, name)
+
+    def write_meta(self, user_id: int, name: str, value: dict) -> None:
+        self.get(user_id, True).write_meta(user_id, name, value)
+
+    def delete_meta(self, user_id: int, name: str) -> None:
+        self.get(user_id, True).delete_meta(user_id, name)
+
+    def close(self) -> None:
+        with self.lock:
+            backends, self.backends = self.backends, {}
+        for backend in backends.values():
+            backend.close()
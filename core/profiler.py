@@ -0,0 +1,73 @@
+from asyncio import TimerHandle, get_running_loop
+from cProfile import Profile
+from io import StringIO
+from marshal import dumps as marshal_dumps
+from pstats import Stats
+from time import perf_counter
+from tracemalloc import Filter, Snapshot, is_tracing, start, stop, take_snapshot
+from typing import Optional
+
+MAX_DURATION = 600
+
+
+class ProfileResult:
+    def __init__(self, stats: bytes, report: str, seconds: float) -> None:
+        self.stats = stats
+        self.report = report
+        self.seconds = seconds
+
+
+# Nothing is hooked in until start(), so an idle profiler costs nothing.
+class LiveProfiler:
+    def __init__(self) -> None:
+        self.profile: Optional[Profile] = None
+        self.snapshot: Optional[Snapshot] = None
+        self.started = 0.0
+        self.timeout: Optional[TimerHandle] = None
+        self.result: Optional[ProfileResult] = None
+        self.own_tracemalloc = False
+
+    @property
+    def running(self) -> bool:
+        return self.profile is not None
+
+    # Profiles the thread running the event loop, call it from a coroutine.
+    def start(self, duration: float) -> None:
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        self.result = None
+        self.own_tracemalloc = not is_tracing()
+        if self.own_tracemalloc:
+            start()
+        self.snapshot = take_snapshot()
+        self.started = perf_counter()
+        self.profile = Profile()
+        self.profile.enable()
+        self.timeout = get_running_loop().call_later(min(duration, MAX_DURATION), self.stop)
+
+    def stop(self) -> Optional[ProfileResult]:
+        if not self.running:
+            return self.result
+        self.profile.disable()
+        seconds = perf_counter() - self.started
+        after = take_snapshot()
+        if self.own_tracemalloc:
+            stop()
+        if self.timeout is not None:
+            self.timeout.cancel()
+        self.result = build_result(self.profile, self.snapshot, after, seconds)
+        self.profile = self.snapshot = self.timeout = None
+        return self.result
+
+
+def build_result(profile: Profile, before: Snapshot, after: Snapshot, seconds: float) -> ProfileResult:
+    report = StringIO()
+    report.write(f"Profiled {seconds:.1f}s of the event loop thread.\n\n")
+    stats = Stats(profile, stream=report)
+    stats.sort_stats("cumulative").print_stats(40)
+    report.write("\nAllocation growth by line:\n")
+    ignore = (Filter(False, "*/tracemalloc.py"), Filter(False, __file__))
+    for diff in after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")[:30]:
+        report.write(f"{diff}\n")
+    # Same bytes pstats.Stats.dump_stats writes, loadable with pstats/snakeviz.
+    return ProfileResult(marshal_dumps(stats.stats), report.getvalue(), seconds)
@@ -0,0 +1,226 @@
+from array import array
+from typing import NamedTuple, Optional
+from zlib import crc32
+
+from .calendar import (
+    MONTH_STARTS,
+    YEAR_INDEX,
+    YEAR_STARTS,
+    YEARS,
+    from_ordinal,
+    next_day,
+)
+from .history import TYPE_INDEX, SSHHistory
+from .model import SSHData
+from .storage import StorageBackend
+
+SLEEP = TYPE_INDEX["SLEEP"]
+# Past this many changed records one full write beats a pop and an append each.
+DELTA_LIMIT = 256
+
+
+class Checkpoint(NamedTuple):
+    index: int
+    day: int
+    month: int
+    year_index: int
+    # Timestamp of record `index - 1`, used to notice a rewritten prefix.
+    timestamp: int
+    calendar: int
+
+
+def calendar_fingerprint() -> int:
+    return crc32(array("q", YEAR_STARTS).tobytes())
+
+
+def rebuild(data: list[SSHData]) -> list[SSHData]:
+    if len(data) == 0:
+        return []
+    data.sort(key=lambda d: d.timestamp)
+    day = 1
+    month = 1
+    year_index = YEAR_INDEX[data[0].year]
+    for i in range(len(data)):
+        data[i].day = day
+        data[i].month = month
+        data[i].year = YEARS[year_index]
+        if data[i].type == "WAKE_UP":
+            if year_index + 1 >= len(YEARS):
+                continue
+            if data[i].timestamp >= YEAR_STARTS[year_index + 1]:
+                year_index += 1
+                data[i].year = YEARS[year_index]
+            continue
+        month, day = next_day(month, day)
+    return data
+
+
+def is_sorted(values: array, start: int = 0) -> bool:
+    return all(values[i] <= values[i + 1] for i in range(max(start - 1, 0), len(values) - 1))
+
+
+def sort_history(history: SSHHistory) -> None:
+    order = sorted(range(len(history)), key=history.timestamps.__getitem__)
+    for field in history.__slots__:
+        column = getattr(history, field)
+        setattr(history, field, array(column.typecode, map(column.__getitem__, order)))
+
+
+def can_resume(history: SSHHistory, checkpoint: Optional[Checkpoint]) -> bool:
+    if checkpoint is None or checkpoint.calendar != calendar_fingerprint():
+        return False
+    if checkpoint.index == 0 or checkpoint.index > len(history):
+        return False
+    if history.timestamps[checkpoint.index - 1] != checkpoint.timestamp:
+        return False
+    return is_sorted(history.timestamps, checkpoint.index)
+
+
+def rebuild_history(
+    history: SSHHistory,
+    checkpoint: Optional[Checkpoint] = None
+) -> Optional[Checkpoint]:
+    if len(history) == 0:
+        return None
+    if can_resume(history, checkpoint):
+        start, day, month, year_index = checkpoint[:4]
+    else:
+        if not is_sorted(history.timestamps):
+            sort_history(history)
+        start, day, month, year_index = 0, 1, 1, history.years[0]
+    types, years, timestamps = history.types, history.years, history.timestamps
+    for i in range(start, len(history)):
+        history.days[i] = day
+        history.months[i] = month
+        years[i] = year_index
+        if types[i] != SLEEP:
+            if year_index + 1 < len(YEARS) and timestamps[i] >= YEAR_STARTS[year_index + 1]:
+                year_index += 1
+                years[i] = year_index
+            continue
+        month, day = next_day(month, day)
+    return Checkpoint(
+        len(history),
+        day,
+        month,
+        year_index,
+        timestamps[-1],
+        calendar_fingerprint(),
+    )
+
+
+# Index of the first record that differs, `len(after)` when none does.
+def first_change(before: SSHHistory, after: SSHHistory) -> int:
+    first = len(after)
+    for field in after.__slots__:
+        old, new = getattr(before, field), getattr(after, field)
+        if old != new:
+            first = min(first, next((i for i in range(first) if old[i] != new[i]), first))
+    return first
+
+
+def rebuild_user(storage: StorageBackend, user_id: int) -> SSHHistory:
+    history = storage.read(user_id)
+    stored = storage.read_meta(user_id, "rebuild")
+    before = history.copy()
+    checkpoint = rebuild_history(history, Checkpoint(**stored) if stored else None)
+    start = first_change(before, history)
+    if start < len(history):
+        if storage.appendable and len(history) - start <= DELTA_LIMIT:
+            # Only the records from `start` on changed, replace just those.
+            for size in range(len(before) - 1, start - 1, -1):
+                before.truncate(size)
+                storage.pop(user_id, before)
+            for i in range(start, len(history)):
+                before.append(history[i])
+                storage.append(user_id, before)
+        else:
+            storage.write(user_id, history)
+    if checkpoint is not None and checkpoint._asdict() != stored:
+        storage.write_meta(user_id, "rebuild", checkpoint._asdict())
+    return history
+
+
+def bulk_rebuild(histories: list[SSHHistory]) -> list[Optional[Checkpoint]]:
+    import numpy as np
+
+    lengths = np.array(list(map(len, histories)), dtype=np.int64)
+    if lengths.sum() == 0:
+        return [None] * len(histories)
+    nonempty = lengths > 0
+    group = np.repeat(np.arange(len(histories), dtype=np.int64), lengths)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))[nonempty]
+
+    def column(field: str, dtype: type) -> np.ndarray:
+        return np.concatenate([
+            np.frombuffer(getattr(h, field), dtype=dtype) for h in histories
+        ])
+
+    timestamps = column("timestamps", np.int64)
+    order = np.lexsort((timestamps, group))
+    timestamps = timestamps[order]
+    types = column("types", np.uint8)[order]
+    first_years = np.zeros(len(histories), dtype=np.int64)
+    first_years[nonempty] = column("years", np.uint8)[order][starts]
+    start_years = np.repeat(first_years, lengths)
+
+    # Day ordinal of a record is the number of SLEEPs before it in its own history.
+    sleep = (types == SLEEP).astype(np.int64)
+    before = np.cumsum(sleep) - sleep
+    ordinals = before - np.repeat(before[starts], lengths[nonempty])
+    month_starts = np.array(
+        MONTH_STARTS[:from_ordinal(int(ordinals.max()))[0] + 2],
+        dtype=np.int64
+    )
+    months = np.searchsorted(month_starts, ordinals, side="right") - 1
+    days = ordinals - month_starts[months] + 1
+
+    # The year only moves forward, on a WAKE_UP past the next boundary. Offsetting
+    # every history by `width` keeps the running maximum from leaking between them.
+    width = len(YEARS) + 1
+    targets = np.searchsorted(np.array(YEAR_STARTS, dtype=np.int64), timestamps, side="right") - 1
+    targets = np.where(types != SLEEP, np.maximum(targets, start_years), start_years)
+    years = np.maximum.accumulate(targets + group * width) - group * width
+
+    # The sequential rebuild advances at most one year per WAKE_UP, histories
+    # where a record skipped several boundaries are redone the slow way.
+    previous = np.empty_like(years)
+    previous[1:] = years[:-1]
+    previous[starts] = start_years[starts]
+    exact = np.ones(len(histories), dtype=bool)
+    exact[group[years - previous > 1]] = False
+
+    checkpoints: list[Optional[Checkpoint]] = []
+    fingerprint = calendar_fingerprint()
+    offset = 0
+    for i, history in enumerate(histories):
+        part = slice(offset, offset + int(lengths[i]))
+        offset += int(lengths[i])
+        if lengths[i] == 0:
+            checkpoints.append(None)
+            continue
+        if not exact[i]:
+            checkpoints.append(rebuild_history(history))
+            continue
+        for field, values in (
+            ("types", types[part]),
+            ("years", years[part]),
+            ("months", months[part]),
+            ("days", days[part]),
+            ("timestamps", timestamps[part]),
+        ):
+            typecode = getattr(history, field).typecode
+            setattr(history, field, array(typecode, values.astype(typecode).tobytes()))
+        last = part.stop - 1
+        month, day = int(months[last]), int(days[last])
+        if types[last] == SLEEP:
+            month, day = next_day(month, day)
+        checkpoints.append(Checkpoint(
+            int(lengths[i]),
+            day,
+            month,
+            int(years[last]),
+            int(timestamps[last]),
+            fingerprint,
+        ))
+    return checkpoints
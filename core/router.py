@@ -0,0 +1,128 @@
+from orjson import dumps, loads
+
+from asyncio import IncompleteReadError, Lock, Server, StreamReader, StreamWriter, open_connection, start_server
+from inspect import isawaitable
+from os import environ
+from struct import Struct
+from subprocess import Popen, TimeoutExpired
+from sys import executable
+from time import monotonic
+from typing import Any, Callable, Optional
+
+from .partition import worker_of
+
+HOST = "127.0.0.1"
+# Payload length, then the orjson payload.
+FRAME = Struct(">I")
+
+
+async def read_frame(reader: StreamReader) -> Optional[bytes]:
+    try:
+        size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+        return await reader.readexactly(size)
+    except IncompleteReadError:
+        return None
+
+
+def write_frame(writer: StreamWriter, payload: bytes) -> None:
+    writer.write(FRAME.pack(len(payload)) + payload)
+
+
+# Every request gets the handler's result back, awaited first if it is one.
+async def serve(port: int, handler: Callable[[Any], Any]) -> Server:
+    async def handle(reader: StreamReader, writer: StreamWriter) -> None:
+        try:
+            while (frame := await read_frame(reader)) is not None:
+                result = handler(loads(frame))
+                if isawaitable(result):
+                    result = await result
+                write_frame(writer, dumps(result))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return await start_server(handle, HOST, port)
+
+
+# The user whose partition serves this interaction, None to handle it here.
+# Malformed payloads stay local, raising here would stop the gateway parser.
+def routed_user(data: dict, names: set[str]) -> Optional[int]:
+    if data.get("type") in (2, 4):
+        name = data.get("data", {}).get("name")
+        user = (data.get("member") or data).get("user")
+    else:
+        # Components go back to the worker holding the view, the one that
+        # answered the command the message belongs to. In guilds the
+        # metadata's member is partial and has no user, its user is top level.
+        metadata = (data.get("message") or {}).get("interaction")
+        if metadata is None:
+            return None
+        name = (metadata.get("name") or "").split(" ")[0]
+        user = metadata.get("user")
+    if name not in names or user is None or "id" not in user:
+        return None
+    return int(user["id"])
+
+
+# Sends each request to the worker owning the user's partition, one
+# connection per worker and one request at a time on it.
+class Router:
+    def __init__(self, workers: int, port: int, partitions: int) -> None:
+        self.workers = workers
+        self.port = port
+        self.partitions = partitions
+        self.links: list[Optional[tuple[StreamReader, StreamWriter]]] = [None] * workers
+        self.locks = [Lock() for _ in range(workers)]
+
+    def worker_for(self, user_id: int) -> int:
+        return worker_of(user_id, self.partitions, self.workers)
+
+    async def forward(self, user_id: int, data: Any) -> Any:
+        index = self.worker_for(user_id)
+        async with self.locks[index]:
+            # Reconnect once, the worker may have restarted since the last request.
+            for attempt in range(2):
+                try:
+                    if self.links[index] is None:
+                        self.links[index] = await open_connection(HOST, self.port + index)
+                    reader, writer = self.links[index]
+                    write_frame(writer, dumps(data))
+                    await writer.drain()
+                    frame = await read_frame(reader)
+                    if frame is None:
+                        raise ConnectionError(f"worker {index} closed the connection")
+                    return loads(frame)
+                except OSError:
+                    self.drop(index)
+                    if attempt == 1:
+                        raise
+
+    def drop(self, index: int) -> None:
+        link, self.links[index] = self.links[index], None
+        if link is not None:
+            link[1].close()
+
+    def close(self) -> None:
+        for index in range(self.workers):
+            self.drop(index)
+
+
+def spawn_workers(count: int, args: list[str]) -> list[Popen]:
+    return [
+        Popen([executable, *args], env={**environ, "SSH_WORKER": str(index)})
+        for index in range(count)
+    ]
+
+
+# Workers drain on SIGTERM, the ones still running after `timeout` are killed.
+def stop_workers(processes: list[Popen], timeout: float) -> None:
+    deadline = monotonic() + timeout
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(max(deadline - monotonic(), 0))
+        except TimeoutExpired:
+            process.kill()
+            process.wait()
@@ -0,0 +1,181 @@
+from orjson import dumps, loads
+
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join
+from sqlite3 import Connection, Row, connect
+from typing import Any, Callable, Optional
+
+from .history import History, SSHHistory
+from .model import SSHData
+from .storage import StorageBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS records (
+    user_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    year TEXT NOT NULL,
+    month INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (user_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS records_user_timestamp ON records (user_id, timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (user_id, name)
+) WITHOUT ROWID;
+"""
+# Kept as constants so sqlite3's statement cache reuses the prepared forms.
+SELECT_COUNT = "SELECT count FROM users WHERE user_id = ?"
+SELECT_USERS = "SELECT user_id FROM users"
+SELECT_ALL = "SELECT type, year, month, day, timestamp FROM records WHERE user_id = ? ORDER BY seq"
+SELECT_LATEST = "SELECT type, year, month, day, timestamp FROM records WHERE user_id = ? ORDER BY timestamp DESC, seq DESC LIMIT 1"
+SELECT_SEQ = "SELECT type, year, month, day, timestamp FROM records WHERE user_id = ? AND seq >= ? AND seq < ? ORDER BY seq"
+SELECT_RANGE = "SELECT type, year, month, day, timestamp FROM records WHERE user_id = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp, seq"
+INSERT_RECORD = "INSERT INTO records (user_id, seq, type, year, month, day, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)"
+DELETE_RECORD = "DELETE FROM records WHERE user_id = ? AND seq = ?"
+DELETE_RECORDS = "DELETE FROM records WHERE user_id = ?"
+SELECT_META = "SELECT value FROM meta WHERE user_id = ? AND name = ?"
+UPSERT_META = "INSERT INTO meta (user_id, name, value) VALUES (?, ?, ?) ON CONFLICT (user_id, name) DO UPDATE SET value = excluded.value"
+DELETE_META = "DELETE FROM meta WHERE user_id = ? AND name = ?"
+UPSERT_COUNT = "INSERT INTO users (user_id, count) VALUES (?, ?) ON CONFLICT (user_id) DO UPDATE SET count = excluded.count"
+
+
+def to_row(user_id: int, seq: int, data: SSHData) -> tuple:
+    return (user_id, seq, data.type, data.year, data.month, data.day, data.timestamp)
+
+
+def from_row(row: Row) -> SSHData:
+    return SSHData.model_construct(
+        type=row[0],
+        year=row[1],
+        month=row[2],
+        day=row[3],
+        timestamp=row[4],
+    )
+
+
+class SQLiteStorage(StorageBackend):
+    appendable = True
+    seekable = True
+
+    def __init__(self, data_dir: str, file_name: str = "ssh.sqlite3") -> None:
+        self.path = join(data_dir, file_name)
+        # sqlite3 connections are bound to the thread that opened them, so every
+        # statement is funnelled through this single worker.
+        self.executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="ssh-sqlite"
+        )
+        self.connection: Optional[Connection] = None
+        self._call(self._connect)
+
+    def _call(self, func: Callable[..., Any], *args) -> Any:
+        return self.executor.submit(func, *args).result()
+
+    def _connect(self) -> None:
+        self.connection = connect(self.path, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def _count(self, user_id: int) -> Optional[int]:
+        row = self.connection.execute(SELECT_COUNT, (user_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def exists(self, user_id: int) -> bool:
+        return self._call(self._count, user_id) is not None
+
+    def count(self, user_id: int) -> int:
+        return self._call(self._count, user_id) or 0
+
+    def users(self) -> list[int]:
+        return self._call(lambda: [
+            row[0] for row in self.connection.execute(SELECT_USERS)
+        ])
+
+    def read(self, user_id: int) -> SSHHistory:
+        return self._call(lambda: SSHHistory.from_rows(
+            self.connection.execute(SELECT_ALL, (user_id,))
+        ))
+
+    def latest(self, user_id: int) -> Optional[SSHData]:
+        row = self._call(lambda: self.connection.execute(
+            SELECT_LATEST, (user_id,)
+        ).fetchone())
+        return None if row is None else from_row(row)
+
+    def tail(self, user_id: int, offset: int, count: int) -> SSHHistory:
+        def tail():
+            size = self._count(user_id) or 0
+            return SSHHistory.from_rows(self.connection.execute(
+                SELECT_SEQ,
+                (user_id, size - offset - count, size - offset)
+            ))
+        return self._call(tail)
+
+    def range(self, user_id: int, start: int, stop: int) -> SSHHistory:
+        return self._call(lambda: SSHHistory.from_rows(
+            self.connection.execute(SELECT_RANGE, (user_id, start, stop))
+        ))
+
+    def write(self, user_id: int, data: History) -> None:
+        def write():
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.execute(DELETE_RECORDS, (user_id,))
+                self.connection.executemany(INSERT_RECORD, (
+                    to_row(user_id, seq, record)
+                    for seq, record in enumerate(data)
+                ))
+                self.connection.execute(UPSERT_COUNT, (user_id, len(data)))
+        self._call(write)
+
+    def append(self, user_id: int, data: History) -> None:
+        def append():
+            with self.connection:
+                self.connection.execute("BEGIN")
+                seq = self._count(user_id) or 0
+                self.connection.execute(INSERT_RECORD, to_row(user_id, seq, data[-1]))
+                self.connection.execute(UPSERT_COUNT, (user_id, seq + 1))
+        self._call(append)
+
+    def pop(self, user_id: int, data: History) -> None:
+        def pop():
+            with self.connection:
+                self.connection.execute("BEGIN")
+                seq = self._count(user_id) or 0
+                if seq == 0:
+                    return
+                self.connection.execute(DELETE_RECORD, (user_id, seq - 1))
+                self.connection.execute(UPSERT_COUNT, (user_id, seq - 1))
+        self._call(pop)
+
+    def read_meta(self, user_id: int, name: str) -> Optional[dict]:
+        row = self._call(lambda: self.connection.execute(
+            SELECT_META, (user_id, name)
+        ).fetchone())
+        return None if row is None else loads(row[0])
+
+    def write_meta(self, user_id: int, name: str, value: dict) -> None:
+        self._call(lambda: self.connection.execute(
+            UPSERT_META, (user_id, name, dumps(value))
+        ))
+
+    def delete_meta(self, user_id: int, name: str) -> None:
+        self._call(lambda: self.connection.execute(
+            DELETE_META, (user_id, name)
+        ))
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self._call(self.connection.close)
+            self.connection = None
+        self.executor.shutdown(wait=True)
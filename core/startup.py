@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Iterator
+
+BEGIN = perf_counter()
+# (depth, label, seconds) in the order the steps started.
+timings: list[tuple[int, str, float]] = []
+depth = 0
+
+
+@contextmanager
+def timed(label: str) -> Iterator[None]:
+    global depth
+    index = len(timings)
+    timings.append((depth, label, 0.0))
+    depth += 1
+    begin = perf_counter()
+    try:
+        yield
+    finally:
+        depth -= 1
+        timings[index] = (timings[index][0], label, perf_counter() - begin)
+
+
+def report(title: str = "Startup") -> str:
+    lines = [f"{title}: {(perf_counter() - BEGIN) * 1000:.0f} ms since launch"]
+    for level, label, seconds in timings:
+        lines.append(f"{'  ' * (level + 1)}{label:<{40 - 2 * level}}{seconds * 1000:>8.1f} ms")
+    return "\n".join(lines)
@@ -0,0 +1,103 @@
+from math import sqrt
+from typing import Optional
+
+from .history import TYPE_INDEX, History, SSHHistory
+
+SLEEP = TYPE_INDEX["SLEEP"]
+# Days longer than this break the streak.
+STREAK_LIMIT = 24 * 3600
+
+
+class RunningStat:
+    __slots__ = ("count", "total", "squares", "minimum", "maximum")
+
+    def __init__(
+        self,
+        count: int = 0,
+        total: int = 0,
+        squares: int = 0,
+        minimum: Optional[int] = None,
+        maximum: Optional[int] = None,
+    ) -> None:
+        self.count = count
+        self.total = total
+        self.squares = squares
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def add(self, value: int) -> None:
+        self.count += 1
+        self.total += value
+        self.squares += value * value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count > 0 else 0
+
+    @property
+    def stdev(self) -> float:
+        if self.count < 2:
+            return 0
+        return sqrt(max(self.squares - self.total * self.total / self.count, 0) / (self.count - 1))
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class UserStats:
+    def __init__(
+        self,
+        records: int = 0,
+        last_type: Optional[int] = None,
+        last_timestamp: int = 0,
+        day: Optional[dict] = None,
+        sleep: Optional[dict] = None,
+        streak: int = 0,
+        best_streak: int = 0,
+    ) -> None:
+        self.records = records
+        self.last_type = last_type
+        self.last_timestamp = last_timestamp
+        self.day = RunningStat(**(day or {}))
+        self.sleep = RunningStat(**(sleep or {}))
+        self.streak = streak
+        self.best_streak = best_streak
+
+    @classmethod
+    def scan(cls, history: SSHHistory) -> "UserStats":
+        stats = cls()
+        for type_, timestamp in zip(history.types, history.timestamps):
+            stats.add(type_, timestamp)
+        return stats
+
+    # `tail` skips that many freshly appended records at the end of `data`.
+    def matches(self, data: History, tail: int = 0) -> bool:
+        if self.records != len(data) - tail:
+            return False
+        return self.records == 0 or self.last_timestamp == data[-1 - tail].timestamp
+
+    def add(self, type_: int, timestamp: int) -> None:
+        if self.last_type is not None and self.last_type != type_:
+            delta = timestamp - self.last_timestamp
+            if type_ == SLEEP:
+                self.day.add(delta)
+                self.streak = self.streak + 1 if delta <= STREAK_LIMIT else 0
+                self.best_streak = max(self.best_streak, self.streak)
+            else:
+                self.sleep.add(delta)
+        self.records += 1
+        self.last_type = type_
+        self.last_timestamp = timestamp
+
+    def to_dict(self) -> dict:
+        return {
+            "records": self.records,
+            "last_type": self.last_type,
+            "last_timestamp": self.last_timestamp,
+            "day": self.day.to_dict(),
+            "sleep": self.sleep.to_dict(),
+            "streak": self.streak,
+            "best_streak": self.best_streak,
+        }
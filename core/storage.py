@@ -0,0 +1,368 @@
+from orjson import dumps, loads, OPT_INDENT_2
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from os import fsync, listdir, remove, replace
+from os.path import isfile, join
+from threading import Lock
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+
+from .history import History, SSHHistory, to_dicts
+from .model import SSHData
+
+TOMBSTONE = b'{"type":"CANCEL"}\n'
+
+
+def atomic_write(file_path: str, content: bytes) -> None:
+    with open(f"{file_path}.tmp", "wb") as f:
+        f.write(content)
+        f.flush()
+        fsync(f.fileno())
+    replace(f"{file_path}.tmp", file_path)
+
+
+def reverse_lines(file_path: str, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+    with open(file_path, "rb") as f:
+        position = f.seek(0, 2)
+        buffer = b""
+        trailing = True
+        while position > 0:
+            size = min(chunk_size, position)
+            position -= size
+            f.seek(position)
+            buffer = f.read(size) + buffer
+            lines = buffer.split(b"\n")
+            buffer = lines[0]
+            for line in reversed(lines[1:]):
+                if trailing:
+                    # Whatever follows the last newline is empty or a torn append.
+                    trailing = False
+                    continue
+                yield line
+        if len(buffer) > 0 and not trailing:
+            yield buffer
+
+
+# Where the last complete line ends, anything after it is a torn append.
+def complete_end(f: BinaryIO, chunk_size: int = 1 << 12) -> int:
+    position = f.seek(0, 2)
+    while position > 0:
+        size = min(chunk_size, position)
+        f.seek(position - size)
+        newline = f.read(size).rfind(b"\n")
+        if newline >= 0:
+            return position - size + newline + 1
+        position -= size
+    return 0
+
+
+def dump_record(data: Union[SSHData, dict]) -> bytes:
+    return dumps(data if isinstance(data, dict) else data.model_dump()) + b"\n"
+
+
+class StorageBackend(ABC):
+    appendable = False
+    # count and tail read only what they return instead of the whole history.
+    seekable = False
+    # Set on backends opened over another process's files, reads then never
+    # migrate, repair or cache anything.
+    readonly = False
+
+    @abstractmethod
+    def exists(self, user_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    def users(self) -> list[int]:
+        ...
+
+    @abstractmethod
+    def read(self, user_id: int) -> SSHHistory:
+        ...
+
+    @abstractmethod
+    def write(self, user_id: int, data: History) -> None:
+        ...
+
+    # `data` is always the full history after the change, backends that can
+    # persist only the delta are free to ignore the rest of it.
+    def append(self, user_id: int, data: History) -> None:
+        self.write(user_id, data)
+
+    def pop(self, user_id: int, data: History) -> None:
+        self.write(user_id, data)
+
+    def latest(self, user_id: int) -> Optional[SSHData]:
+        return self.read(user_id).latest
+
+    def count(self, user_id: int) -> int:
+        return len(self.read(user_id))
+
+    # The `count` records that precede the newest `offset` ones, oldest first.
+    def tail(self, user_id: int, offset: int, count: int) -> SSHHistory:
+        data = self.read(user_id)
+        return data[max(len(data) - offset - count, 0):max(len(data) - offset, 0)]
+
+    def range(self, user_id: int, start: int, stop: int) -> SSHHistory:
+        return SSHHistory(filter(
+            lambda d: start <= d.timestamp < stop,
+            self.read(user_id)
+        ))
+
+    # Small per-user documents kept next to the history (checkpoints, aggregates).
+    @abstractmethod
+    def read_meta(self, user_id: int, name: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def write_meta(self, user_id: int, name: str, value: dict) -> None:
+        ...
+
+    @abstractmethod
+    def delete_meta(self, user_id: int, name: str) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class JsonStorage(StorageBackend):
+    suffix = ".json"
+
+    def __init__(self, data_dir: str) -> None:
+        self.data_dir = data_dir
+
+    def get_path(self, user_id: int) -> str:
+        return join(self.data_dir, f"{user_id}{self.suffix}")
+
+    def exists(self, user_id: int) -> bool:
+        return isfile(self.get_path(user_id))
+
+    def users(self) -> list[int]:
+        return [
+            int(file_name[:-len(self.suffix)])
+            for file_name in listdir(self.data_dir)
+            if file_name.endswith(self.suffix)
+            and file_name[:-len(self.suffix)].isdecimal()
+        ]
+
+    def read(self, user_id: int) -> SSHHistory:
+        file_path = self.get_path(user_id)
+        if not isfile(file_path):
+            return SSHHistory()
+        with open(file_path, "rb") as f:
+            data: list[dict] = loads(f.read())
+        return SSHHistory.from_dicts(data)
+
+    def write(self, user_id: int, data: History) -> None:
+        atomic_write(self.get_path(user_id), dumps(
+            to_dicts(data),
+            option=OPT_INDENT_2
+        ))
+
+    def get_meta_path(self, user_id: int, name: str) -> str:
+        return join(self.data_dir, f"{user_id}.{name}.json")
+
+    def read_meta(self, user_id: int, name: str) -> Optional[dict]:
+        file_path = self.get_meta_path(user_id, name)
+        if not isfile(file_path):
+            return None
+        with open(file_path, "rb") as f:
+            return loads(f.read())
+
+    def write_meta(self, user_id: int, name: str, value: dict) -> None:
+        atomic_write(self.get_meta_path(user_id, name), dumps(value))
+
+    def delete_meta(self, user_id: int, name: str) -> None:
+        file_path = self.get_meta_path(user_id, name)
+        if isfile(file_path):
+            remove(file_path)
+
+
+class LogStorage(JsonStorage):
+    suffix = ".jsonl"
+    appendable = True
+    seekable = True
+
+    def __init__(
+        self,
+        data_dir: str,
+        compact_ratio: float = 2,
+        compact_min: int = 64,
+    ) -> None:
+        super().__init__(data_dir)
+        self.legacy = JsonStorage(data_dir)
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        # user_id -> (lines in file, live records)
+        self.counts: dict[int, tuple[int, int]] = {}
+        self.locks: dict[int, Lock] = {}
+        self.compactor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="ssh-compact"
+        )
+
+    def get_lock(self, user_id: int) -> Lock:
+        return self.locks.setdefault(user_id, Lock())
+
+    def exists(self, user_id: int) -> bool:
+        return isfile(self.get_path(user_id)) or self.legacy.exists(user_id)
+
+    def users(self) -> list[int]:
+        return list(set(super().users() + self.legacy.users()))
+
+    def migrate(self, user_id: int) -> bool:
+        if self.readonly or isfile(self.get_path(user_id)) or not self.legacy.exists(user_id):
+            return False
+        data = self.legacy.read(user_id)
+        self._rewrite(user_id, data)
+        remove(self.legacy.get_path(user_id))
+        return True
+
+    def read(self, user_id: int) -> SSHHistory:
+        with self.get_lock(user_id):
+            return self._load(user_id)
+
+    def write(self, user_id: int, data: History) -> None:
+        with self.get_lock(user_id):
+            self._rewrite(user_id, data)
+
+    def append(self, user_id: int, data: History) -> None:
+        self._append_line(user_id, dump_record(data[-1]), len(data))
+
+    def pop(self, user_id: int, data: History) -> None:
+        self._append_line(user_id, TOMBSTONE, len(data))
+
+    def count(self, user_id: int) -> int:
+        with self.get_lock(user_id):
+            if user_id in self.counts:
+                return self.counts[user_id][1]
+            self.migrate(user_id)
+            file_path = self.get_path(user_id)
+            if not isfile(file_path):
+                return self.legacy.count(user_id)
+            with open(file_path, "rb") as f:
+                lines, live = count_lines(f.read())
+            if not self.readonly:
+                self.counts[user_id] = (lines, live)
+            return live
+
+    def tail(self, user_id: int, offset: int, count: int) -> SSHHistory:
+        records: list[dict] = []
+        with self.get_lock(user_id):
+            self.migrate(user_id)
+            file_path = self.get_path(user_id)
+            if not isfile(file_path):
+                return self.legacy.tail(user_id, offset, count)
+            if count <= 0:
+                return SSHHistory()
+            # Walking backwards, each tombstone cancels the nearest live record before it.
+            cancelled = 0
+            for line in reverse_lines(file_path):
+                record: dict = loads(line)
+                if record["type"] == "CANCEL":
+                    cancelled += 1
+                elif cancelled > 0:
+                    cancelled -= 1
+                elif offset > 0:
+                    offset -= 1
+                else:
+                    records.append(record)
+                    if len(records) == count:
+                        break
+        return SSHHistory.from_dicts(reversed(records))
+
+    def compact(self, user_id: int) -> None:
+        with self.get_lock(user_id):
+            self._rewrite(user_id, self._load(user_id))
+
+    def _load(self, user_id: int) -> SSHHistory:
+        self.migrate(user_id)
+        file_path = self.get_path(user_id)
+        if not isfile(file_path):
+            return self.legacy.read(user_id)
+        with open(file_path, "rb" if self.readonly else "rb+") as f:
+            content = f.read()
+            end = content.rfind(b"\n") + 1
+            if end != len(content) and not self.readonly:
+                # Drop the torn tail left behind by an interrupted append.
+                f.truncate(end)
+        data = SSHHistory()
+        lines = content[:end].splitlines()
+        for line in lines:
+            record: dict = loads(line)
+            if record["type"] == "CANCEL":
+                data.truncate(max(len(data) - 1, 0))
+                continue
+            data.append_values(
+                record["type"],
+                record["year"],
+                record["month"],
+                record["day"],
+                record["timestamp"],
+            )
+        if not self.readonly:
+            self.counts[user_id] = (len(lines), len(data))
+        return data
+
+    def _rewrite(self, user_id: int, data: History) -> None:
+        atomic_write(self.get_path(user_id), b"".join(map(dump_record, to_dicts(data))))
+        self.counts[user_id] = (len(data), len(data))
+
+    def _append_line(self, user_id: int, line: bytes, live: int) -> None:
+        with self.get_lock(user_id):
+            self.migrate(user_id)
+            file_path = self.get_path(user_id)
+            with open(file_path, "rb+" if isfile(file_path) else "wb") as f:
+                # Appending after a torn line would join the two into one bad record.
+                f.seek(complete_end(f))
+                f.truncate()
+                f.write(line)
+            if user_id not in self.counts:
+                return
+            lines = self.counts[user_id][0] + 1
+            self.counts[user_id] = (lines, live)
+        if lines >= self.compact_min and lines > live * self.compact_ratio:
+            self.compactor.submit(self.compact, user_id)
+
+    def close(self) -> None:
+        self.compactor.shutdown(wait=True)
+
+
+# Lines and live records of a jsonl log, counted without decoding a record.
+def count_lines(content: bytes) -> tuple[int, int]:
+    end = content.rfind(b"\n") + 1
+    lines = live = start = 0
+    position = content.find(TOMBSTONE, 0, end)
+    while position >= 0:
+        records = content.count(b"\n", start, position)
+        lines += records + 1
+        live = max(live + records - 1, 0)
+        start = position + len(TOMBSTONE)
+        position = content.find(TOMBSTONE, start, end)
+    records = content.count(b"\n", start, end)
+    return lines + records, live + records
+
+
+def storage_type(mode: str) -> type[StorageBackend]:
+    if mode == "jsonl":
+        return LogStorage
+    if mode == "sqlite":
+        from .sqlite import SQLiteStorage
+        return SQLiteStorage
+    if mode == "binary":
+        from .binary import BinaryStorage
+        return BinaryStorage
+    return JsonStorage
+
+
+def get_storage(
+    mode: str,
+    data_dir: str,
+    partitions: int = 0,
+    owned: Optional[Iterable[int]] = None,
+) -> StorageBackend:
+    if partitions > 0:
+        from .partition import PartitionedStorage
+        return PartitionedStorage(storage_type(mode), data_dir, partitions, owned)
+    return storage_type(mode)(data_dir)
@@ -0,0 +1,116 @@
+from asyncio import (
+    Future,
+    Lock,
+    Task,
+    get_running_loop,
+    sleep,
+)
+from copy import copy
+from typing import Any, Literal, Optional
+
+from .chain import ChainStore
+from .history import History
+from .metrics import metrics
+from .storage import StorageBackend
+
+WRITE_OP = Literal["write", "append", "pop", "write_meta", "delete_meta"]
+HISTORY_OPS = ("write", "append", "pop")
+
+
+class StorageWriter:
+    def __init__(
+        self,
+        storage: StorageBackend,
+        interval: float = 0.05,
+        chain: Optional[ChainStore] = None
+    ) -> None:
+        self.storage = storage
+        self.interval = interval
+        self.chain = chain
+        self.locks: dict[int, Lock] = {}
+        self.pending: dict[int, list[tuple[WRITE_OP, tuple]]] = {}
+        # History ops as submitted, so the chain can extend by one link per append
+        # even when the backend itself gets a collapsed write.
+        self.chained: dict[int, list[tuple[WRITE_OP, History]]] = {}
+        self.waiters: dict[int, list[Future]] = {}
+        self.flusher: Optional[Task] = None
+        self.batches = 0
+        self.operations = 0
+
+    def lock(self, user_id: int) -> Lock:
+        return self.locks.setdefault(user_id, Lock())
+
+    def peek(self, user_id: int) -> Optional[History]:
+        # Every history operation carries the full history after the change.
+        for op, args in reversed(self.pending.get(user_id, [])):
+            if op in HISTORY_OPS:
+                return copy(args[0])
+        return None
+
+    async def submit(self, user_id: int, op: WRITE_OP, *args: Any) -> None:
+        ops = self.pending.setdefault(user_id, [])
+        if op in HISTORY_OPS:
+            args = (copy(args[0]),)
+            if self.chain is not None:
+                chained = self.chained.setdefault(user_id, [])
+                if op == "write":
+                    chained.clear()
+                chained.append((op, args[0]))
+            if op == "write" or not self.storage.appendable:
+                ops[:] = [entry for entry in ops if entry[0] not in HISTORY_OPS]
+                op = "write"
+        ops.append((op, args))
+        future = get_running_loop().create_future()
+        self.waiters.setdefault(user_id, []).append(future)
+        if self.flusher is None:
+            self.flusher = get_running_loop().create_task(self._run())
+        await future
+
+    async def flush(self) -> None:
+        pending, self.pending = self.pending, {}
+        chained, self.chained = self.chained, {}
+        waiters, self.waiters = self.waiters, {}
+        if len(pending) == 0:
+            return
+        with metrics.timer("ssh_writer_flush_seconds"):
+            errors = await get_running_loop().run_in_executor(None, self._apply, pending, chained)
+        self.batches += 1
+        for user_id, futures in waiters.items():
+            for future in futures:
+                if future.done():
+                    continue
+                if user_id in errors:
+                    future.set_exception(errors[user_id])
+                else:
+                    future.set_result(None)
+
+    async def close(self) -> None:
+        while self.flusher is not None:
+            await self.flusher
+
+    async def _run(self) -> None:
+        try:
+            while len(self.pending) > 0:
+                await sleep(self.interval)
+                await self.flush()
+        finally:
+            self.flusher = None
+
+    def _apply(
+        self,
+        pending: dict[int, list[tuple[WRITE_OP, tuple]]],
+        chained: dict[int, list[tuple[WRITE_OP, History]]]
+    ) -> dict[int, Exception]:
+        errors: dict[int, Exception] = {}
+        for user_id, ops in pending.items():
+            try:
+                for op, args in ops:
+                    with metrics.timer("ssh_storage_seconds", op=op):
+                        getattr(self.storage, op)(user_id, *args)
+                    self.operations += 1
+                for op, data in chained.get(user_id, []):
+                    with metrics.timer("ssh_chain_seconds", op=op):
+                        getattr(self.chain, op)(user_id, data)
+            except Exception as e:
+                errors[user_id] = e
+        return errors
@@ -0,0 +1,20 @@
+from orjson import dumps
+
+from os import chdir
+from os.path import abspath, dirname, join
+from sys import path
+from tempfile import mkdtemp
+
+ROOT = dirname(dirname(abspath(__file__)))
+path.insert(0, ROOT)
+
+# config.py reads config.json from the working directory on import.
+WORK_DIR = mkdtemp(prefix="ssh-tests-")
+with open(join(WORK_DIR, "config.json"), "wb") as f:
+    f.write(dumps({
+        "token": "",
+        "data_dir": join(WORK_DIR, "data"),
+        "flush_interval": 0,
+        "loop_lag_threshold": 0,
+    }))
+chdir(WORK_DIR)
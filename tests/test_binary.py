@@ -0,0 +1,55 @@
+import pytest
+
+from core.binary import HEADER, RECORD, BinaryStorage, dump_binary, load_binary, unpack_record
+from core.calendar import YEARS
+from core.history import SSHHistory
+from core.model import SSHData
+
+RECORDS = [
+    SSHData(type="WAKE_UP", year=YEARS[0], month=1, day=1, timestamp=0),
+    SSHData(type="SLEEP", year=YEARS[-1], month=12, day=31, timestamp=1704067200),
+    SSHData(type="WAKE_UP", year=YEARS[len(YEARS) // 2], month=7, day=1 << 20, timestamp=-1),
+    SSHData(type="SLEEP", year=YEARS[-1], month=65535, day=2, timestamp=(1 << 63) - 1),
+]
+
+
+@pytest.mark.parametrize("records", [[], RECORDS[:1], RECORDS], ids=["empty", "single", "many"])
+def test_round_trip(records):
+    content = dump_binary(records)
+    assert len(content) == HEADER.size + RECORD.size * len(records)
+    assert load_binary(content).to_list() == records
+    assert load_binary(dump_binary(SSHHistory(records))) == SSHHistory(records)
+    for i, record in enumerate(records):
+        assert unpack_record(content, HEADER.size + RECORD.size * i) == record
+
+
+def test_torn_record_is_ignored():
+    content = dump_binary(RECORDS)
+    assert load_binary(content[:-1]).to_list() == RECORDS[:-1]
+
+
+def test_unknown_header():
+    with pytest.raises(ValueError):
+        load_binary(b"SSHJ" + dump_binary(RECORDS)[4:])
+
+
+@pytest.mark.parametrize("records", [[], RECORDS[:1], RECORDS], ids=["empty", "single", "many"])
+def test_storage_round_trip(tmp_path, records):
+    storage = BinaryStorage(str(tmp_path))
+    storage.write(1, records)
+    assert storage.read(1).to_list() == records
+    assert storage.count(1) == len(records)
+    assert storage.latest(1) == (records[-1] if records else None)
+    storage.append(1, records + RECORDS[:1])
+    assert storage.read(1).to_list() == records + RECORDS[:1]
+
+
+def test_tail_past_history_maps_nothing(tmp_path, monkeypatch):
+    storage = BinaryStorage(str(tmp_path))
+    storage.write(1, RECORDS)
+
+    def fail(user_id):
+        raise AssertionError("tail mapped the file for an empty page")
+    monkeypatch.setattr(storage, "_map", fail)
+    assert storage.tail(1, len(RECORDS), 10) == SSHHistory()
+    assert storage.tail(1, 0, 0) == SSHHistory()
@@ -0,0 +1,157 @@
+import pytest
+
+from asyncio import new_event_loop, set_event_loop
+from sys import addaudithook
+from threading import get_ident
+from types import SimpleNamespace
+
+import cogs.ssh as ssh
+import cogs.system as system
+from cogs.base import DrainingBot, GroupCog
+from cogs.lazy import LazyGroup
+from core import handoff
+from core.drain import Drain
+from core.model import SSHData
+
+# Audit events that mean disk or process work, each one stalls every
+# interaction when it happens on the loop thread.
+BLOCKING = {
+    "open",
+    "os.listdir",
+    "os.mkdir",
+    "os.remove",
+    "os.rename",
+    "os.scandir",
+    "os.truncate",
+    "shutil.rmtree",
+    "sqlite3.connect",
+    "subprocess.Popen",
+    "time.sleep",
+}
+# Audit hooks stay for the life of the process, this one only watches the
+# loop thread of whichever test is running.
+watched = SimpleNamespace(thread=None, calls=[])
+
+
+def audit(event: str, args: tuple) -> None:
+    if event in BLOCKING and get_ident() == watched.thread:
+        watched.calls.append((event, args[:1]))
+
+
+addaudithook(audit)
+
+
+def fake_context(user_id: int) -> SimpleNamespace:
+    return SimpleNamespace(author=SimpleNamespace(id=user_id))
+
+
+@pytest.fixture
+def loop():
+    loop = new_event_loop()
+    set_event_loop(loop)
+    yield loop
+    loop.run_until_complete(ssh.writer.close())
+    set_event_loop(None)
+    loop.close()
+
+
+@pytest.fixture
+def run_on_loop(loop):
+    def run(coroutine):
+        async def watch():
+            watched.thread = get_ident()
+            try:
+                return await coroutine
+            finally:
+                watched.thread = None
+        return loop.run_until_complete(watch())
+    yield run
+    assert watched.calls == []
+
+
+@pytest.fixture
+def bot(loop):
+    bot = DrainingBot()
+    yield bot
+    for path in list(bot.extensions):
+        cogs = [cog for cog in bot.cogs.values() if isinstance(cog, GroupCog) and cog.__module__ == path]
+        bot.unload_extension(path)
+        for cog in cogs:
+            loop.run_until_complete(cog.shutdown())
+    handoff.stashed.clear()
+
+
+def test_ssh_command_paths(run_on_loop):
+    ctx = fake_context(1001)
+    signed = ssh.check_signed(SimpleNamespace(mention="/ssh sign_up"))
+
+    async def commands():
+        # sign_up, ohiyo and oyasumi, then cancel the last one.
+        assert not await ssh.run_storage(ssh.storage.exists, ctx.author.id)
+        await ssh.write_user_data(ctx, ssh.SSHHistory([SSHData(type="WAKE_UP", timestamp=1704038400)]))
+        assert await signed(ctx)
+        for i, type_name in enumerate(("SLEEP", "WAKE_UP", "SLEEP")):
+            data = await ssh.read_user_data(ctx)
+            data.append(SSHData(type=type_name, timestamp=1704067200 + i * 36000))
+            await ssh.append_user_data(ctx, data)
+        data = await ssh.read_user_data(ctx)
+        await ssh.pop_user_data(ctx, data[:-1])
+        # Cold reads, the way /ssh log and status start after an eviction.
+        await ssh.writer.flush()
+        ssh.cache.invalidate(ctx.author.id)
+        ssh.stats_cache.clear()
+        page, total = await ssh.read_page(ctx.author.id, 1)
+        assert total == 3 and len(page) == 3
+        # json has no native tail, the one full read it takes is kept.
+        assert ssh.storage.seekable or ctx.author.id in ssh.cache
+        assert (await ssh.read_latest(ctx)).type == "WAKE_UP"
+        assert len(await ssh.read_range(ctx.author.id, 0, 1704067200)) == 1
+        stats = await ssh.read_stats(ctx.author.id, await ssh.read_user_data(ctx))
+        assert stats.sleep.count == 1
+    run_on_loop(commands())
+    assert ssh.leaderboard_index.entries[ctx.author.id].type_name == "WAKE_UP"
+
+
+def test_stop_bot(run_on_loop, monkeypatch, tmp_path):
+    monkeypatch.setattr(system, "drain", Drain())
+    monkeypatch.setattr(system, "RESTART_PATH", str(tmp_path / "restart.json"))
+    closed = []
+
+    async def stop():
+        async def close():
+            closed.append(True)
+        bot = SimpleNamespace(cogs={}, close=close, loop=ssh.get_running_loop())
+        await system.System.stop_bot(SimpleNamespace(bot=bot))
+    run_on_loop(stop())
+    assert closed == [True]
+    assert (tmp_path / "restart.json").exists()
+
+
+# The first /ssh command after a lazy start imports the cog.
+def test_lazy_load(run_on_loop, bot):
+    group = LazyGroup(bot, "SleepSleepHistory", "cogs.ssh", {"name": "ssh", "description": "Sleep Sleep History"})
+    bot.add_application_command(group)
+    real = run_on_loop(group.load())
+    assert real is not group and real.name == "ssh"
+    assert "cogs.ssh" in bot.extensions
+
+
+def system_cog(bot: DrainingBot) -> system.System:
+    cog = system.System.__new__(system.System)
+    cog.bot = bot
+    cog.cogs_data = {"SleepSleepHistory": {"path": "cogs.ssh", "description": "", "load_on_start": False}}
+    return cog
+
+
+def test_system_load_and_reload(run_on_loop, bot):
+    cog = system_cog(bot)
+    replies = []
+
+    async def respond(message: str) -> None:
+        replies.append(message)
+    ctx = SimpleNamespace(respond=respond)
+    run_on_loop(cog.load_cog.callback(cog, ctx, "SleepSleepHistory"))
+    loaded = bot.get_cog("SleepSleepHistory")
+    run_on_loop(cog.reload_cog.callback(cog, ctx, "SleepSleepHistory"))
+    assert bot.get_cog("SleepSleepHistory") not in (None, loaded)
+    assert replies == ["`SleepSleepHistory` loaded successfully.", "`SleepSleepHistory` reload successfully."]
@@ -0,0 +1,73 @@
+import pytest
+
+from asyncio import new_event_loop, set_event_loop, sleep
+from sys import modules
+from types import SimpleNamespace
+
+from cogs.base import DrainingBot
+from cogs.lazy import load_extension, reload_extension
+import core.storage
+from core import handoff
+from core.model import SSHData
+
+
+@pytest.fixture
+def bot():
+    loop = new_event_loop()
+    set_event_loop(loop)
+    bot = DrainingBot()
+    yield bot
+    cog = bot.get_cog("SleepSleepHistory")
+    if cog is not None:
+        bot.unload_extension("cogs.ssh")
+        loop.run_until_complete(cog.shutdown())
+    set_event_loop(None)
+    loop.close()
+
+
+def test_reload_keeps_state(bot, monkeypatch):
+    ctx = SimpleNamespace(author=SimpleNamespace(id=2001))
+    bot.loop.run_until_complete(load_extension(bot, "cogs.ssh"))
+    old = modules["cogs.ssh"]
+    opened = []
+    get_storage = core.storage.get_storage
+
+    def counted(*args):
+        opened.append(args)
+        return get_storage(*args)
+    monkeypatch.setattr(core.storage, "get_storage", counted)
+
+    async def reload():
+        await old.write_user_data(ctx, old.SSHHistory([SSHData(type="WAKE_UP", timestamp=1704038400)]))
+        data = await old.read_user_data(ctx)
+        data.append(SSHData(type="SLEEP", timestamp=1704067200))
+        # Held back so the append is still queued when the module is swapped.
+        old.writer.interval = 1
+        pending = bot.loop.create_task(old.append_user_data(ctx, data))
+        while ctx.author.id not in old.writer.pending:
+            await sleep(0.01)
+        await reload_extension(bot, "cogs.ssh")
+        return pending
+    pending = bot.loop.run_until_complete(reload())
+    new = modules["cogs.ssh"]
+    assert new is not old and opened == []
+    for name in ("storage", "chain", "writer", "cache", "stats_cache", "leaderboard_index", "members", "charts"):
+        assert getattr(new, name) is getattr(old, name)
+    assert bot.get_cog("SleepSleepHistory").writer is old.writer
+    assert ctx.author.id in new.writer.pending
+    assert ctx.author.id in new.cache
+    assert handoff.stashed == {} and handoff.reloading == {}
+
+    async def land():
+        await new.writer.flush()
+        await pending
+    bot.loop.run_until_complete(land())
+    assert len(new.storage.read(ctx.author.id)) == 2
+
+
+def test_unload_hands_nothing_over(bot):
+    bot.loop.run_until_complete(load_extension(bot, "cogs.ssh"))
+    cog = bot.get_cog("SleepSleepHistory")
+    bot.unload_extension("cogs.ssh")
+    bot.loop.run_until_complete(cog.shutdown())
+    assert handoff.stashed == {}
@@ -0,0 +1,26 @@
+import cogs.ssh as ssh
+from core.metrics import Registry
+
+
+def test_collectors_run_on_read():
+    registry = Registry()
+    calls = []
+
+    def collect():
+        calls.append(True)
+        registry.set_gauge("ssh_cache_hits", len(calls), cache="history")
+    registry.add_collector("ssh", collect)
+    assert registry.gauge_summary() == [{"name": "ssh_cache_hits", "labels": {"cache": "history"}, "value": 1}]
+    assert 'ssh_cache_hits{cache="history"} 2' in registry.to_prometheus()
+    registry.remove_collector("ssh")
+    registry.gauge_summary()
+    assert len(calls) == 2
+
+
+def test_cache_stats_published(monkeypatch):
+    registry = Registry()
+    monkeypatch.setattr(ssh, "metrics", registry)
+    ssh.publish_stats()
+    published = {(entry["name"], entry["labels"]["cache"]) for entry in registry.gauge_summary()}
+    for name, cache in (("history", ssh.cache), ("members", ssh.members), ("charts", ssh.charts.cache)):
+        assert {(f"ssh_cache_{key}", name) for key in cache.stats()} <= published
@@ -0,0 +1,48 @@
+from os import makedirs
+
+from core.legacy import NAME_DIR, NAME_LIST, write_legacy
+from core.model import SSHData
+from core.stats import UserStats
+from core.storage import get_storage
+from tools.migrate import migrate
+
+NAMES = ["kept", "fresh"]
+MAPPING = {"kept": 1, "fresh": 2}
+STORED = [SSHData(type="WAKE_UP", timestamp=1704067200)]
+
+
+def setup_dirs(tmp_path):
+    legacy_dir = tmp_path / "legacy"
+    makedirs(legacy_dir / NAME_DIR)
+    for name in NAMES:
+        write_legacy(str(legacy_dir), name, [12 * 3600] * 5)
+    (legacy_dir / NAME_LIST).write_text("".join(name + "\n" for name in NAMES), encoding="utf-8")
+    data_dir = tmp_path / "data"
+    makedirs(data_dir)
+    storage = get_storage("json", str(data_dir))
+    storage.write(MAPPING["kept"], STORED)
+    return str(legacy_dir), storage
+
+
+def test_existing_history_is_kept(tmp_path):
+    legacy_dir, storage = setup_dirs(tmp_path)
+    result = migrate(legacy_dir, storage, MAPPING, str(tmp_path / "checkpoint"), workers=1, progress=False)
+    assert result["users"] == 1
+    assert result["existing"] == ["kept"]
+    assert storage.read(MAPPING["kept"]).to_list() == STORED
+    fresh = storage.read(MAPPING["fresh"])
+    assert len(fresh) > 0
+    assert UserStats(**storage.read_meta(MAPPING["fresh"], "stats")).matches(fresh)
+
+
+def test_force_overwrites(tmp_path):
+    legacy_dir, storage = setup_dirs(tmp_path)
+    storage.write_meta(MAPPING["kept"], "stats", UserStats.scan(storage.read(MAPPING["kept"])).to_dict())
+    result = migrate(
+        legacy_dir, storage, MAPPING, str(tmp_path / "checkpoint"), workers=1, progress=False, force=True
+    )
+    assert result["users"] == 2
+    assert result["existing"] == []
+    kept = storage.read(MAPPING["kept"])
+    assert kept.to_list() != STORED
+    assert UserStats(**storage.read_meta(MAPPING["kept"], "stats")).matches(kept)
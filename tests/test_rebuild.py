@@ -0,0 +1,84 @@
+import pytest
+
+from random import Random
+
+from core.calendar import YEAR_STARTS, YEARS
+from core.history import SSHHistory
+from core.model import SSHData
+from core.rebuild import bulk_rebuild, rebuild, rebuild_history, rebuild_user
+from core.storage import get_storage
+
+
+def random_history(rng: Random, size: int) -> SSHHistory:
+    history = SSHHistory()
+    timestamp = YEAR_STARTS[0] - rng.randint(0, 10 ** 6)
+    for _ in range(size):
+        # Mostly increasing, with the occasional out-of-order entry.
+        timestamp += rng.randint(600, 20 * 3600) if rng.random() > 0.02 else -rng.randint(0, 20 * 3600)
+        history.append(SSHData(
+            type=rng.choice(("WAKE_UP", "SLEEP")),
+            year=rng.choice(YEARS[:2]),
+            timestamp=timestamp,
+        ))
+    return history
+
+
+def reference(history: SSHHistory) -> SSHHistory:
+    return SSHHistory(rebuild(history.to_list()))
+
+
+def test_matches_reference():
+    rng = Random(8)
+    histories = [random_history(rng, rng.randint(0, 1500)) for _ in range(40)]
+    expected = list(map(reference, histories))
+
+    sequential = list(map(lambda h: h.copy(), histories))
+    for history in sequential:
+        rebuild_history(history)
+    assert sequential == expected
+
+    bulk = list(map(lambda h: h.copy(), histories))
+    checkpoints = bulk_rebuild(bulk)
+    assert bulk == expected
+
+    # Resume from a checkpoint taken part way through, then append the rest.
+    for history, checkpoint in zip(expected, checkpoints):
+        if len(history) < 2:
+            continue
+        cut = rng.randint(1, len(history) - 1)
+        partial = history[:cut]
+        resume = rebuild_history(partial)
+        partial.extend(history[cut:])
+        assert rebuild_history(partial, resume) == checkpoint
+        assert partial == history
+
+
+@pytest.mark.parametrize("mode", ["json", "jsonl", "sqlite", "binary"])
+def test_rebuild_user_writes_only_changes(tmp_path, monkeypatch, mode):
+    storage = get_storage(mode, str(tmp_path))
+    history = random_history(Random(6), 300)
+    storage.write(1, history)
+    assert rebuild_user(storage, 1) == reference(history)
+
+    def fail(*args):
+        raise AssertionError("rebuild rewrote the whole history")
+    # Already rebuilt, nothing to store.
+    monkeypatch.setattr(storage, "write", fail)
+    monkeypatch.setattr(storage, "write_meta", fail)
+    monkeypatch.setattr(storage, "append", fail)
+    monkeypatch.setattr(storage, "pop", fail)
+    rebuild_user(storage, 1)
+    monkeypatch.undo()
+
+    # Appended without the derived fields, only the new records are redone.
+    rebuilt = storage.read(1)
+    for i in range(3):
+        rebuilt.append(SSHData(type="SLEEP", year=YEARS[0], timestamp=rebuilt.timestamps[-1] + 3600))
+        storage.append(1, rebuilt)
+    assert rebuilt != reference(rebuilt)
+    if storage.appendable:
+        monkeypatch.setattr(storage, "write", fail)
+    assert rebuild_user(storage, 1) == reference(rebuilt)
+    monkeypatch.undo()
+    assert storage.read(1) == reference(rebuilt)
+    storage.close()
@@ -0,0 +1,123 @@
+import pytest
+
+from core.model import SSHData
+from core.partition import PartitionError, owned_partitions, worker_of
+from core.router import routed_user
+from core.storage import get_storage
+
+NAMES = {"ssh"}
+USER = {"id": "123", "username": "someone", "discriminator": "0", "avatar": None}
+MEMBER = {"user": USER, "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False}
+
+
+def guild_command(name: str = "ssh") -> dict:
+    return {
+        "id": "1",
+        "application_id": "2",
+        "type": 2,
+        "token": "token",
+        "guild_id": "3",
+        "channel_id": "4",
+        "member": MEMBER,
+        "data": {"id": "5", "name": name, "type": 1, "options": [{"name": "log", "type": 1}]},
+    }
+
+
+def guild_component(command: str = "ssh log") -> dict:
+    return {
+        "id": "10",
+        "application_id": "2",
+        "type": 3,
+        "token": "token",
+        "guild_id": "3",
+        "channel_id": "4",
+        # The user who clicked, not the one who ran the command.
+        "member": {**MEMBER, "user": {**USER, "id": "999"}},
+        "data": {"custom_id": "next", "component_type": 2},
+        "message": {
+            "id": "11",
+            "channel_id": "4",
+            "interaction": {
+                "id": "1",
+                "type": 2,
+                "name": command,
+                "user": USER,
+                # Partial member, Discord leaves the user out of it.
+                "member": {"roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False},
+            },
+        },
+    }
+
+
+def test_guild_command():
+    assert routed_user(guild_command(), NAMES) == 123
+
+
+def test_dm_command():
+    data = guild_command()
+    del data["member"], data["guild_id"]
+    data["user"] = USER
+    assert routed_user(data, NAMES) == 123
+
+
+def test_other_command_stays_local():
+    assert routed_user(guild_command("system"), NAMES) is None
+
+
+def test_guild_component_routes_to_command_user():
+    assert routed_user(guild_component(), NAMES) == 123
+
+
+def test_component_of_other_command_stays_local():
+    assert routed_user(guild_component("system show"), NAMES) is None
+
+
+def test_component_without_metadata_stays_local():
+    data = guild_component()
+    del data["message"]["interaction"]
+    assert routed_user(data, NAMES) is None
+    del data["message"]
+    assert routed_user(data, NAMES) is None
+
+
+def test_component_without_user_stays_local():
+    data = guild_component()
+    del data["message"]["interaction"]["user"]
+    assert routed_user(data, NAMES) is None
+
+
+# /ssh current <user> runs on the invoker's worker and reads the target from
+# a partition that worker does not own.
+def test_current_routes_by_invoker():
+    data = guild_command()
+    data["data"]["options"] = [{"name": "current", "type": 1, "options": [{"name": "使用者id", "type": 3, "value": "456"}]}]
+    assert routed_user(data, NAMES) == 123
+
+
+@pytest.mark.parametrize("mode", ["json", "jsonl", "sqlite", "binary"])
+def test_current_reads_other_partition(tmp_path, mode):
+    invoker, target = 123, next(u for u in range(124, 10000) if worker_of(u, 4, 2) != worker_of(123, 4, 2))
+    owner = get_storage(mode, str(tmp_path), 4, owned_partitions(4, 2, worker_of(target, 4, 2)))
+    here = get_storage(mode, str(tmp_path), 4, owned_partitions(4, 2, worker_of(invoker, 4, 2)))
+    records = [SSHData(type="WAKE_UP", timestamp=1704067200), SSHData(type="SLEEP", timestamp=1704110400)]
+    owner.write(target, records[:1])
+    owner.append(target, records)
+    owner.write_meta(target, "stats", {"records": 2})
+    try:
+        assert here.exists(target)
+        assert here.latest(target) == records[-1]
+        assert here.count(target) == 2
+        assert here.tail(target, 0, 10).to_list() == records
+        assert here.read(target).to_list() == records
+        assert here.read_meta(target, "stats") == {"records": 2}
+        with pytest.raises(PartitionError):
+            here.append(target, records)
+        with pytest.raises(PartitionError):
+            here.write_meta(target, "stats", {})
+        # The owner's later appends show up, nothing was cached on this side.
+        owner.pop(target, records[:1])
+        assert here.latest(target) == records[0]
+        assert here.count(target) == 1
+    finally:
+        owner.close()
+        here.close()
@@ -0,0 +1,57 @@
+from core.model import SSHData
+from core.storage import LogStorage
+
+RECORDS = [
+    SSHData(type="WAKE_UP", timestamp=1704067200),
+    SSHData(type="SLEEP", timestamp=1704110400),
+    SSHData(type="WAKE_UP", timestamp=1704153600),
+]
+
+
+def tear(storage: LogStorage, user_id: int) -> None:
+    with open(storage.get_path(user_id), "ab") as f:
+        f.write(b'{"type":"SLEEP","ye')
+
+
+def test_append_after_torn_line(tmp_path):
+    storage = LogStorage(str(tmp_path))
+    storage.write(1, RECORDS[:2])
+    tear(storage, 1)
+    storage.append(1, RECORDS)
+    assert storage.read(1).to_list() == RECORDS
+    assert storage.tail(1, 0, 2).to_list() == RECORDS[1:]
+
+
+def test_pop_after_torn_line(tmp_path):
+    storage = LogStorage(str(tmp_path))
+    storage.write(1, RECORDS)
+    tear(storage, 1)
+    storage.pop(1, RECORDS[:2])
+    assert storage.read(1).to_list() == RECORDS[:2]
+
+
+def test_append_to_torn_first_line(tmp_path):
+    storage = LogStorage(str(tmp_path))
+    tear(storage, 1)
+    storage.append(1, RECORDS[:1])
+    assert storage.read(1).to_list() == RECORDS[:1]
+
+
+def test_count_without_decoding(tmp_path, monkeypatch):
+    storage = LogStorage(str(tmp_path))
+    # A tombstone with nothing left to cancel is a no-op, like in _load.
+    storage.pop(1, [])
+    storage.append(1, RECORDS[:1])
+    storage.append(1, RECORDS[:2])
+    storage.pop(1, RECORDS[:1])
+    storage.append(1, RECORDS[:2])
+    storage.append(1, RECORDS)
+    expected = LogStorage(str(tmp_path)).read(1)
+    tear(storage, 1)
+
+    def fail(content):
+        raise AssertionError("count decoded a record")
+    monkeypatch.setattr("core.storage.loads", fail)
+    counted = LogStorage(str(tmp_path))
+    assert counted.count(1) == len(expected) == 3
+    assert counted.counts[1] == (6, 3)
@@ -0,0 +1,49 @@
+from argparse import ArgumentParser
+from time import perf_counter
+from typing import Optional
+
+from core.leaderboard import LeaderboardIndex, index_path, scan_summaries
+from core.partition import worker_of
+from core.storage import get_storage
+
+
+# Returns how many of how many stored users ended up in the index.
+def rebuild_indexes(
+    mode: str,
+    data_dir: str,
+    workers: Optional[int] = None,
+    partitions: int = 0,
+    bot_workers: int = 0,
+) -> tuple[int, int]:
+    storage = get_storage(mode, data_dir, partitions)
+    user_ids = storage.users()
+    storage.close()
+    summaries = scan_summaries(mode, data_dir, user_ids, workers, partitions=partitions)
+    for worker in range(bot_workers) if bot_workers > 0 else [-1]:
+        index = LeaderboardIndex(index_path(data_dir, worker))
+        index.replace([
+            summary for summary in summaries
+            if worker < 0 or worker_of(summary.user_id, partitions, bot_workers) == worker
+        ])
+        index.save()
+    return len(summaries), len(user_ids)
+
+
+def main():
+    parser = ArgumentParser(description="Rebuild the leaderboard index from every stored history.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--storage", default="json", choices=["json", "jsonl", "sqlite", "binary"])
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--partitions", type=int, default=0)
+    parser.add_argument("--bot-workers", type=int, default=0, help="write one index per bot worker process")
+    args = parser.parse_args()
+    if args.bot_workers > 0 and args.partitions < args.bot_workers:
+        parser.error("--partitions must be at least --bot-workers")
+
+    begin = perf_counter()
+    indexed, users = rebuild_indexes(args.storage, args.data_dir, args.workers, args.partitions, args.bot_workers)
+    print(f"Indexed {indexed} of {users} users in {perf_counter() - begin:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
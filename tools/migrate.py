@@ -0,0 +1,148 @@
+from orjson import loads
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from os import fsync, makedirs
+from os.path import isfile, join
+from sys import stderr
+from time import perf_counter
+from typing import Optional
+
+from core.chain import ChainStore
+from core.legacy import DEFAULT_SLEEP, get_legacy_path, load_legacy, read_names
+from core.stats import UserStats
+from core.storage import StorageBackend, get_storage
+
+from .leaderboard import rebuild_indexes
+
+
+def read_checkpoint(file_path: str) -> set[str]:
+    if not isfile(file_path):
+        return set()
+    with open(file_path, "r", encoding="utf-8") as f:
+        # A torn last line means that user was not fully recorded, so it is redone.
+        return {line[:-1] for line in f if line.endswith("\n")}
+
+
+def migrate(
+    legacy_dir: str,
+    storage: StorageBackend,
+    mapping: dict[str, int],
+    checkpoint_path: str,
+    workers: Optional[int] = None,
+    sleep: int = DEFAULT_SLEEP,
+    chunk_size: int = 16,
+    progress: bool = True,
+    chain: Optional[ChainStore] = None,
+    force: bool = False,
+) -> dict:
+    done = read_checkpoint(checkpoint_path)
+    names = read_names(legacy_dir)
+    missing = [name for name in names if name not in mapping]
+    todo = [name for name in names if name in mapping and name not in done]
+    # Users who already have a history keep it unless the import is forced.
+    existing = set() if force else {name for name in todo if storage.exists(mapping[name])}
+    todo = [name for name in todo if name not in existing]
+    records = users = skipped = 0
+    begin = perf_counter()
+    with (
+        ProcessPoolExecutor(workers) as pool,
+        open(checkpoint_path, "a", encoding="utf-8") as checkpoint,
+    ):
+        results = pool.map(
+            partial(load_legacy, sleep=sleep),
+            [get_legacy_path(legacy_dir, name) for name in todo],
+            chunksize=chunk_size,
+        )
+        for result in results:
+            user_id = mapping[result.name]
+            storage.write(user_id, result.history)
+            if chain is not None:
+                chain.write(user_id, result.history)
+            storage.write_meta(user_id, "stats", UserStats.scan(result.history).to_dict())
+            if result.checkpoint is not None:
+                storage.write_meta(user_id, "rebuild", result.checkpoint._asdict())
+            elif force:
+                storage.delete_meta(user_id, "rebuild")
+            checkpoint.write(result.name + "\n")
+            users += 1
+            records += len(result.history)
+            skipped += result.skipped
+            if users % chunk_size == 0 or users == len(todo):
+                checkpoint.flush()
+                fsync(checkpoint.fileno())
+                if progress:
+                    elapsed = perf_counter() - begin
+                    print(
+                        f"\r[{users}/{len(todo)}] {records} records, "
+                        f"{records / elapsed:.0f} records/s",
+                        end="",
+                        file=stderr,
+                    )
+    if progress and users > 0:
+        print(file=stderr)
+    elapsed = perf_counter() - begin
+    return {
+        "users": users,
+        "records": records,
+        "skipped_lines": skipped,
+        "already_done": len(done & set(names)),
+        "unmapped": missing,
+        "existing": sorted(existing),
+        "seconds": elapsed,
+        "records_per_second": records / elapsed if elapsed > 0 else 0,
+    }
+
+
+def main():
+    parser = ArgumentParser(description="Import notokenhere.py history files into the current storage.")
+    parser.add_argument("legacy_dir", help="directory holding namelist.txt and name/")
+    parser.add_argument("mapping", help="JSON file mapping legacy names to Discord user IDs")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--storage", default="json", choices=["json", "jsonl", "sqlite", "binary"])
+    parser.add_argument("--partitions", type=int, default=0)
+    parser.add_argument("--bot-workers", type=int, default=0, help="write one leaderboard index per bot worker process")
+    parser.add_argument("--force", action="store_true", help="overwrite users who already have a history")
+    parser.add_argument("--checkpoint", help="defaults to <data-dir>/migrate.checkpoint")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--sleep-hours", type=float, default=DEFAULT_SLEEP / 3600,
+                        help="assumed length of every night, legacy files only kept awake time")
+    args = parser.parse_args()
+    if args.bot_workers > 0 and args.partitions < args.bot_workers:
+        parser.error("--partitions must be at least --bot-workers")
+
+    with open(args.mapping, "rb") as f:
+        mapping = {name: int(user_id) for name, user_id in loads(f.read()).items()}
+    makedirs(args.data_dir, exist_ok=True)
+    storage = get_storage(args.storage, args.data_dir, args.partitions)
+    try:
+        result = migrate(
+            args.legacy_dir,
+            storage,
+            mapping,
+            args.checkpoint or join(args.data_dir, "migrate.checkpoint"),
+            workers=args.workers,
+            sleep=int(args.sleep_hours * 3600),
+            chain=ChainStore(args.data_dir, args.partitions),
+            force=args.force,
+        )
+    finally:
+        storage.close()
+    print(
+        f"Migrated {result['users']} users ({result['records']} records) in {result['seconds']:.2f}s, "
+        f"{result['records_per_second']:.0f} records/s. "
+        f"{result['already_done']} already done, {result['skipped_lines']} unreadable lines."
+    )
+    if result["unmapped"]:
+        print(f"No user ID for: {', '.join(result['unmapped'])}")
+    if result["existing"]:
+        print(f"Kept the stored history of: {', '.join(result['existing'])}, --force overwrites it")
+    if result["users"] > 0:
+        # Rankings would otherwise show the migrated users as they were before.
+        indexed, users = rebuild_indexes(args.storage, args.data_dir, args.workers, args.partitions, args.bot_workers)
+        print(f"Leaderboard rebuilt, {indexed} of {users} users indexed.")
+
+
+if __name__ == "__main__":
+    main()
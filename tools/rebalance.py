@@ -0,0 +1,108 @@
+from argparse import ArgumentParser
+from os import listdir, makedirs, replace, rmdir
+from os.path import isdir, isfile, join
+from sqlite3 import connect
+from time import perf_counter
+from typing import Iterator
+
+from core.partition import PARTITION_DIR, user_dir
+from core.sqlite import SQLiteStorage
+
+SQLITE_FILE = "ssh.sqlite3"
+TABLES = ["users", "records", "meta"]
+
+
+def layout_dirs(data_dir: str) -> list[str]:
+    root = join(data_dir, PARTITION_DIR)
+    if not isdir(root):
+        return [data_dir]
+    return [data_dir] + [join(root, name) for name in sorted(listdir(root)) if isdir(join(root, name))]
+
+
+# History, meta and chain files all start with the user id.
+def user_files(directory: str) -> Iterator[tuple[int, str]]:
+    for file_name in listdir(directory):
+        prefix, _, rest = file_name.partition(".")
+        if rest and prefix.isdecimal() and isfile(join(directory, file_name)):
+            yield int(prefix), file_name
+
+
+def move_files(data_dir: str, partitions: int) -> int:
+    moved = 0
+    for directory in layout_dirs(data_dir):
+        for user_id, file_name in list(user_files(directory)):
+            target = user_dir(data_dir, partitions, user_id)
+            if target == directory:
+                continue
+            makedirs(target, exist_ok=True)
+            replace(join(directory, file_name), join(target, file_name))
+            moved += 1
+    return moved
+
+
+# Rows are copied before they are deleted, an interrupted run leaves
+# duplicates that the next run overwrites instead of losing anything.
+def move_rows(data_dir: str, partitions: int) -> int:
+    moved = 0
+    for directory in layout_dirs(data_dir):
+        source = join(directory, SQLITE_FILE)
+        if not isfile(source):
+            continue
+        connection = connect(source, isolation_level=None)
+        connection.create_function(
+            "target_dir", 1, lambda user_id: user_dir(data_dir, partitions, user_id), deterministic=True
+        )
+        targets = [
+            row[0] for row in connection.execute("SELECT DISTINCT target_dir(user_id) FROM users")
+            if row[0] != directory
+        ]
+        for target in targets:
+            makedirs(target, exist_ok=True)
+            # Creates the schema if the partition is new.
+            SQLiteStorage(target).close()
+            connection.execute("ATTACH DATABASE ? AS target", (join(target, SQLITE_FILE),))
+            connection.execute("BEGIN")
+            for table in TABLES:
+                connection.execute(
+                    f"INSERT OR REPLACE INTO target.{table} SELECT * FROM main.{table} WHERE target_dir(user_id) = ?",
+                    (target,)
+                )
+            moved += connection.execute(
+                "SELECT COUNT(*) FROM main.users WHERE target_dir(user_id) = ?", (target,)
+            ).fetchone()[0]
+            for table in TABLES:
+                connection.execute(f"DELETE FROM main.{table} WHERE target_dir(user_id) = ?", (target,))
+            connection.execute("COMMIT")
+            connection.execute("DETACH DATABASE target")
+        connection.close()
+    return moved
+
+
+def remove_empty(data_dir: str) -> None:
+    for directory in layout_dirs(data_dir)[1:]:
+        if not listdir(directory):
+            rmdir(directory)
+    root = join(data_dir, PARTITION_DIR)
+    if isdir(root) and not listdir(root):
+        rmdir(root)
+
+
+def main():
+    parser = ArgumentParser(description="Move every user into the partition layout for --partitions. Stop the bot first.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--storage", default="json", choices=["json", "jsonl", "sqlite", "binary"])
+    parser.add_argument("--partitions", type=int, required=True, help="0 for the flat layout")
+    args = parser.parse_args()
+
+    begin = perf_counter()
+    # Chain files live next to the histories for every backend.
+    moved = move_files(args.data_dir, args.partitions)
+    if args.storage == "sqlite":
+        moved += move_rows(args.data_dir, args.partitions)
+    remove_empty(args.data_dir)
+    print(f"Moved {moved} files and users in {perf_counter() - begin:.2f}s.")
+    print("Set partitions in config.json and rebuild the leaderboard with python -m tools.leaderboard.")
+
+
+if __name__ == "__main__":
+    main()
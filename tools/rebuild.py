@@ -0,0 +1,36 @@
+from argparse import ArgumentParser
+from time import perf_counter
+
+from core.chain import ChainStore
+from core.rebuild import bulk_rebuild, rebuild_user
+from core.storage import get_storage
+
+
+def main():
+    parser = ArgumentParser(description="Re-derive year/month/day of every stored history.")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--storage", default="json", choices=["json", "jsonl", "sqlite", "binary"])
+    parser.add_argument("--partitions", type=int, default=0)
+    parser.add_argument("--bulk", action="store_true", help="recompute everything at once with NumPy")
+    args = parser.parse_args()
+
+    storage = get_storage(args.storage, args.data_dir, args.partitions)
+    chain = ChainStore(args.data_dir, args.partitions)
+    users = storage.users()
+    begin = perf_counter()
+    if args.bulk:
+        histories = list(map(storage.read, users))
+        for user_id, history, checkpoint in zip(users, histories, bulk_rebuild(histories)):
+            storage.write(user_id, history)
+            chain.write(user_id, history)
+            if checkpoint is not None:
+                storage.write_meta(user_id, "rebuild", checkpoint._asdict())
+    else:
+        for user_id in users:
+            chain.write(user_id, rebuild_user(storage, user_id))
+    storage.close()
+    print(f"Rebuilt {len(users)} users in {perf_counter() - begin:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
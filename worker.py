@@ -0,0 +1,54 @@
+from core.startup import report, timed
+
+with timed("import discord"):
+    from discord import Bot
+from orjson import loads
+
+from asyncio import get_running_loop
+from signal import SIGINT, SIGTERM
+
+with timed("import config"):
+    from config import DRAIN_TIMEOUT, TOKEN, WORKER, WORKER_PORT, WORKERS
+
+from cogs.base import DrainingBot, GroupCog
+from core.drain import drain
+from core.router import serve
+
+# Never connects to the gateway, the router forwards the raw interactions of
+# the users this worker owns and responses go straight to Discord over HTTP.
+# Syncing from here would unregister every command the worker does not load.
+bot = DrainingBot(auto_sync_commands=False)
+
+
+def load_routed_cogs(bot: Bot) -> None:
+    with open("cogs/cogs.json", "rb") as cogs_file:
+        cogs_data: dict[str] = loads(cogs_file.read())
+    for cog_name, data in cogs_data.items():
+        if data.get("routed", False):
+            with timed(f"cog {cog_name}"):
+                bot.load_extension(data["path"])
+
+
+async def run_worker() -> None:
+    await bot.login(TOKEN)
+    server = await serve(WORKER_PORT + WORKER, bot._connection.parse_interaction_create)
+    print(report(f"Worker {WORKER}"))
+    stopped = get_running_loop().create_future()
+    for signal in (SIGINT, SIGTERM):
+        try:
+            get_running_loop().add_signal_handler(signal, lambda: stopped.done() or stopped.set_result(None))
+        except NotImplementedError:
+            pass
+    await stopped
+    server.close()
+    cogs = [cog for cog in bot.cogs.values() if isinstance(cog, GroupCog)]
+    abandoned = await drain.shutdown(DRAIN_TIMEOUT, [cog.shutdown for cog in cogs])
+    print(f"Worker {WORKER} stopped, {abandoned} commands abandoned.")
+    await bot.close()
+
+
+if __name__ == "__main__":
+    if not 0 <= WORKER < WORKERS:
+        raise RuntimeError("worker.py is started by bot.py with SSH_WORKER set")
+    load_routed_cogs(bot)
+    bot.loop.run_until_complete(run_worker())